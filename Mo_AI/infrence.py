@@ -1,36 +1,38 @@
+import os
+import sys
 import serial
 import pandas as pd
 import numpy as np
-from sklearn.decomposition import FastICA
 from pycaret.classification import load_model
 import time
 
+# Shared acquisition helpers live next to the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'backend'))
+from serial_source import SerialSampleSource, make_decoder
+from unmixing import load_unmixing
+
+# Wire format sent by the amplifier: 'ascii' (one value per line) or 'binary' (framed int16)
+SAMPLE_FORMAT = 'ascii'
+
 # Load the saved model
 model = load_model('jbest')
+unmixing = load_unmixing('jbest', fallback=True)
 
 # Function to read EMG data and make predictions
 def predict_emg(port, sample_rate=1000):
     # Open serial connection
     ser = serial.Serial(port, 9600, timeout=1)
     time.sleep(2)  # Wait for the connection to establish
+    source = SerialSampleSource(ser, make_decoder(SAMPLE_FORMAT, n_channels=1))
 
     print("Starting real-time EMG predictions...")
     try:
         while True:
-            raw_data = []
-            # Read raw EMG data
-            for _ in range(sample_rate):  # Collect data for 1 second
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    raw_data.append(int(line))
-
-            # Prepare the data for prediction
-            raw_data = np.array(raw_data).reshape(-1, 1)
+            # Read raw EMG data, one second worth of samples as an (n, 1) array
+            raw_data = source.read_samples(sample_rate)
 
-            # Apply ICA (same setup as during training)
-            ica = FastICA(n_components=1)
-            independent_components = ica.fit_transform(raw_data)
-            independent_components -= np.mean(independent_components)  # Center around zero
+            # Apply the model's ICA unmixing, refitted per window if none was saved
+            independent_components = unmixing.transform(raw_data)
 
             # Create a DataFrame for prediction
             timestamps = np.linspace(0, sample_rate / 1000, len(independent_components))  # Create timestamps
@@ -60,6 +62,9 @@ def predict_emg(port, sample_rate=1000):
 
     except KeyboardInterrupt:
         print("Stopping real-time predictions.")
+    except TimeoutError as e:
+        # The amplifier stopped sending (unplugged or reset)
+        print(f"{e}, stopping real-time predictions.")
     finally:
         ser.close()
 
@@ -1,15 +1,23 @@
+import os
+import sys
 import serial
 import pandas as pd
 import numpy as np
-from sklearn.decomposition import FastICA
 from pycaret.classification import load_model
 import time
-import asyncio
-import websockets
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from threading import Thread
 
+# Shared acquisition helpers live next to the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'backend'))
+from serial_source import SerialSampleSource, make_decoder
+from unmixing import load_unmixing
+from device_client import DeviceClient
+
+# Wire format sent by the amplifier: 'ascii' (one value per line) or 'binary' (framed int16)
+SAMPLE_FORMAT = 'ascii'
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
@@ -24,22 +32,21 @@ previous_prediction = "NO"  # Added to track previous state
 
 # Load the saved model
 model = load_model('best')
+unmixing = load_unmixing('best', fallback=True)
+
+def report_sent(device, command, rtt):
+    print(f"Sent command via WebSocket: {command} ({rtt * 1000:.1f} ms round trip)")
 
-async def send_command_via_websocket(command):
-    try:        
-        async with websockets.connect(ESP32_URI) as websocket:
-            await websocket.send(command)
-            print(f"Sent command via WebSocket: {command}")
-    except Exception as e:
-        print(f"Failed to send command via WebSocket: {e}")
+# One persistent connection to the ESP32, commands are queued without blocking
+esp32 = DeviceClient({'esp32': ESP32_URI}, on_sent=report_sent)
 
 def MOVE():
     print("Function MOVE: Prediction is YES")
-    asyncio.run(send_command_via_websocket('MOVE'))
+    esp32.send('MOVE')
 
 def STAY():
     print("Function STAY: Prediction is NO")
-    asyncio.run(send_command_via_websocket('STAY'))
+    esp32.send('STAY')
 
 @app.route('/get_prediction', methods=['GET'])
 def get_prediction():
@@ -54,24 +61,16 @@ def predict_emg(port, sample_rate=1000):
     # Open serial connection
     ser = serial.Serial(port, 9600, timeout=1)
     time.sleep(2)  # Wait for the connection to establish
+    source = SerialSampleSource(ser, make_decoder(SAMPLE_FORMAT, n_channels=1))
 
     print("Starting real-time EMG predictions...")
     try:
         while True:
-            raw_data = []
-            # Read raw EMG data
-            for _ in range(sample_rate):  # Collect data for 1 second
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    raw_data.append(int(line))
+            # Read raw EMG data, one second worth of samples as an (n, 1) array
+            raw_data = source.read_samples(sample_rate)
 
-            # Prepare the data for prediction
-            raw_data = np.array(raw_data).reshape(-1, 1)
-
-            # Apply ICA
-            ica = FastICA(n_components=1)
-            independent_components = ica.fit_transform(raw_data)
-            independent_components -= np.mean(independent_components)
+            # Apply the model's ICA unmixing, refitted per window if none was saved
+            independent_components = unmixing.transform(raw_data)
 
             # Create DataFrame for prediction
             timestamps = np.linspace(0, sample_rate / 1000, len(independent_components))
@@ -108,6 +107,9 @@ def predict_emg(port, sample_rate=1000):
 
     except KeyboardInterrupt:
         print("Stopping real-time predictions.")
+    except TimeoutError as e:
+        # The amplifier stopped sending (unplugged or reset)
+        print(f"{e}, stopping real-time predictions.")
     finally:
         ser.close()
 
@@ -117,6 +119,9 @@ def main():
     flask_thread.daemon = True
     flask_thread.start()
 
+    # Connect to the ESP32 before predictions start
+    esp32.start()
+
     # Start EMG prediction
     predict_emg('COM10')  # Update with your Arduino's COM port
 
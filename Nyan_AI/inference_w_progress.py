@@ -1,13 +1,19 @@
+import os
+import sys
 import serial
 import pandas as pd
 import numpy as np
-from sklearn.decomposition import FastICA
 from pycaret.classification import load_model
 import time
 from tqdm import tqdm
 
+# Shared acquisition helpers live next to the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'backend'))
+from unmixing import load_unmixing
+
 # Load the saved model
 model = load_model('nbest')
+unmixing = load_unmixing('nbest', fallback=True)
 
 # Function to read EMG data and make predictions
 def predict_emg(port, sample_rate=1000):
@@ -38,10 +44,8 @@ def predict_emg(port, sample_rate=1000):
             # Prepare the data for prediction
             raw_data = np.array(raw_data).reshape(-1, 1)
 
-            # Apply ICA (same setup as during training)
-            ica = FastICA(n_components=1)
-            independent_components = ica.fit_transform(raw_data)
-            independent_components -= np.mean(independent_components)  # Center around zero
+            # Apply the model's ICA unmixing, refitted per window if none was saved
+            independent_components = unmixing.transform(raw_data)
 
             # Create a DataFrame for prediction
             timestamps = np.linspace(0, sample_rate / 1000, len(independent_components))
@@ -1,48 +1,58 @@
+import os
+import sys
+import time
+
+# Shared acquisition helpers live next to the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'backend'))
+from startup import StartupTimer
+startup = StartupTimer('infrence.py')
+
+# Only what the first prediction needs: no pandas, no PyCaret (see load_classifier)
 import serial
-import pandas as pd
 import numpy as np
-from sklearn.decomposition import FastICA
-from pycaret.classification import load_model
-import time
+from serial_source import SerialSampleSource, make_decoder
+from unmixing import load_unmixing
+from predictor import load_classifier, predict_labels
+startup.mark('imports')
 
-# Load the saved model
-model = load_model('nbest')
+# Wire format sent by the amplifier: 'ascii' (one value per line) or 'binary' (framed int16)
+SAMPLE_FORMAT = 'ascii'
+# The board resets when the port opens and takes this long to start sending
+PORT_SETTLE_SECONDS = 2
+MODEL_NAME = 'nbest'
+FEATURES = ['Timestamp', 'Raw_EMG', 'Independent_Component']
 
 # Function to read EMG data and make predictions
 def predict_emg(port, sample_rate=1000):
     # Open serial connection
-    ser = serial.Serial(port, 9600, timeout=1)
-    time.sleep(2)  # Wait for the connection to establish
+    ser = serial.serial_for_url(port, 9600, timeout=1)
+    opened = time.time()
+    # Load the saved model while the board starts up
+    model = load_classifier(MODEL_NAME)
+    unmixing = load_unmixing(MODEL_NAME, fallback=True)
+    startup.mark('model')
+    time.sleep(max(0.0, opened + PORT_SETTLE_SECONDS - time.time()))  # Wait for the connection to establish
+    startup.mark('port')
+    source = SerialSampleSource(ser, make_decoder(SAMPLE_FORMAT, n_channels=1))
 
     print("Starting real-time EMG predictions...")
+    first = True
     try:
         while True:
-            raw_data = []
-            # Read raw EMG data
-            for _ in range(sample_rate):  # Collect data for 1 second
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    raw_data.append(int(line))
-
-            # Prepare the data for prediction
-            raw_data = np.array(raw_data).reshape(-1, 1)
+            # Read raw EMG data, one second worth of samples as an (n, 1) array
+            raw_data = source.read_samples(sample_rate)
+            if first:
+                startup.mark('first window')
 
-            # Apply ICA (same setup as during training)
-            ica = FastICA(n_components=1)
-            independent_components = ica.fit_transform(raw_data)
-            independent_components -= np.mean(independent_components)  # Center around zero
+            # Apply the model's ICA unmixing, refitted per window if none was saved
+            independent_components = unmixing.transform(raw_data)
 
-            # Create a DataFrame for prediction
+            # One row per sample, in the model's column order
             timestamps = np.linspace(0, sample_rate / 1000, len(independent_components))  # Create timestamps
-            df_pred = pd.DataFrame({
-                'Timestamp': timestamps,
-                'Raw_EMG': raw_data.flatten(),
-                'Independent_Component': independent_components.flatten(),
-                'Label': [''] * len(independent_components)  # Placeholder for Label
-            })
+            X = np.column_stack((timestamps, raw_data[:, 0], independent_components[:, 0]))
 
             # Predict using the loaded model
-            predictions = model.predict(df_pred[['Timestamp', 'Raw_EMG', 'Independent_Component']])
+            predictions = predict_labels(model, X, FEATURES)
             # print(f"Predictions: {predictions.values}")
 
             # Count occurrences of "YES" and "NO" in the predictions
@@ -54,15 +64,23 @@ def predict_emg(port, sample_rate=1000):
                 print("YES")
             else:
                 print("NO")
+            if first:
+                startup.mark('first prediction')
+                startup.report()
+                first = False
 
             print(type(predictions))
             print(predictions.shape)
 
     except KeyboardInterrupt:
         print("Stopping real-time predictions.")
+    except TimeoutError as e:
+        # The amplifier stopped sending (unplugged or reset)
+        print(f"{e}, stopping real-time predictions.")
     finally:
         ser.close()
 
 # Call the prediction function
 if __name__ == "__main__":
-    predict_emg('/dev/cu.usbmodem11201')  # Updated to use Mac port
\ No newline at end of file
+    # Mac port, or pass one (e.g. an emg_simulator.py pty)
+    predict_emg(sys.argv[1] if len(sys.argv) > 1 else '/dev/cu.usbmodem11201')
\ No newline at end of file
@@ -1,124 +1,153 @@
-import serial
-import pandas as pd
-import numpy as np
-from sklearn.decomposition import FastICA
-from pycaret.classification import load_model
+import os
+import sys
 import time
-import asyncio
-import websockets
-from flask import Flask, request, jsonify
-from flask_cors import CORS
 from threading import Thread
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
+# Shared acquisition helpers live next to the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'backend'))
+from startup import StartupTimer
+startup = StartupTimer('integrated_subvocal_wheelchair.py')
+
+# Only what the first prediction needs: no pandas, no PyCaret (see load_classifier)
+import serial
+import numpy as np
+from serial_source import SerialSampleSource, make_decoder
+from unmixing import load_unmixing
+from predictor import load_classifier, predict_labels
+from device_client import DeviceClient
+from decisions import DecisionPolicy
+startup.mark('imports')
+
+# Wire format sent by the amplifier: 'ascii' (one value per line) or 'binary' (framed int16)
+SAMPLE_FORMAT = 'ascii'
+# The board resets when the port opens and takes this long to start sending
+PORT_SETTLE_SECONDS = 2
+FEATURES = ['Timestamp', 'Raw_EMG', 'Independent_Component']
+# Samples are voted over windows this long, the decision layer (decisions.py) keeps
+# the short windows from flapping the motors and stops at once on a clear NO
+WINDOW_SECONDS = 0.25
+SMOOTHING = {"stop_label": "NO"}
+# The stop command is sent again this often while it holds, so an ESP32 that rebooted
+# picks it up. Motion is only sent when the decision switches to it, never repeated.
+RESEND_SECONDS = 1.0
 
 # WebSocket URI for ESP32
 ESP32_URI = "ws://192.168.43.53:80"
 
 # Global variables
-last_function_call_time = time.time()
 latest_prediction = "NO"
-previous_prediction = "NO"  # Added to track previous state
 
-# Load the saved model
-model = load_model('best')
+# Loaded by predict_emg while the port settles
+MODEL_NAME = 'best'
+model = None
+unmixing = None
 
-async def send_command_via_websocket(command):
-    try:        
-        async with websockets.connect(ESP32_URI) as websocket:
-            await websocket.send(command)
-            print(f"Sent command via WebSocket: {command}")
-    except Exception as e:
-        print(f"Failed to send command via WebSocket: {e}")
+def report_sent(device, command, rtt):
+    print(f"Sent command via WebSocket: {command} ({rtt * 1000:.1f} ms round trip)")
+
+# One persistent connection to the ESP32, commands are queued without blocking
+esp32 = DeviceClient({'esp32': ESP32_URI}, on_sent=report_sent)
 
 def MOVE():
     print("Function MOVE: Prediction is YES")
-    asyncio.run(send_command_via_websocket('MOVE'))
+    esp32.send('MOVE')
 
 def STAY():
     print("Function STAY: Prediction is NO")
-    asyncio.run(send_command_via_websocket('STAY'))
+    esp32.send('STAY')
 
-@app.route('/get_prediction', methods=['GET'])
 def get_prediction():
+    from flask import jsonify
     return jsonify({"prediction": latest_prediction}), 200
 
 def run_flask():
+    # Flask is only needed for this status route, imported on its own thread
+    from flask import Flask
+    from flask_cors import CORS
+    app = Flask(__name__)
+    CORS(app)
+    app.add_url_rule('/get_prediction', view_func=get_prediction, methods=['GET'])
     app.run(debug=False, port=5000)
 
+def start_services():
+    # Start Flask in a separate thread
+    flask_thread = Thread(target=run_flask)
+    flask_thread.daemon = True
+    flask_thread.start()
+
+    # Connect to the ESP32 before predictions start
+    esp32.start()
+
 def predict_emg(port, sample_rate=1000):
-    global latest_prediction, last_function_call_time, previous_prediction
+    global latest_prediction, model, unmixing
     
     # Open serial connection
-    ser = serial.Serial(port, 9600, timeout=1)
-    time.sleep(2)  # Wait for the connection to establish
+    ser = serial.serial_for_url(port, 9600, timeout=1)
+    opened = time.time()
+    # Load the model while the board starts up
+    model = load_classifier(MODEL_NAME)
+    unmixing = load_unmixing(MODEL_NAME, fallback=True)
+    startup.mark('model')
+    # Flask and the ESP32 connection import on their own threads, only once PyCaret
+    # (if the model needs it) has been imported: concurrent imports can deadlock
+    start_services()
+    time.sleep(max(0.0, opened + PORT_SETTLE_SECONDS - time.time()))  # Wait for the connection to establish
+    startup.mark('port')
+    source = SerialSampleSource(ser, make_decoder(SAMPLE_FORMAT, n_channels=1))
 
     print("Starting real-time EMG predictions...")
+    decisions = DecisionPolicy.from_settings(SMOOTHING).stream(['NO', 'YES'])
+    window_samples = int(sample_rate * WINDOW_SECONDS)
+    samples_read = 0
+    last_sent = None
+    first = True
     try:
         while True:
-            raw_data = []
-            # Read raw EMG data
-            for _ in range(sample_rate):  # Collect data for 1 second
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    raw_data.append(int(line))
-
-            # Prepare the data for prediction
-            raw_data = np.array(raw_data).reshape(-1, 1)
-
-            # Apply ICA
-            ica = FastICA(n_components=1)
-            independent_components = ica.fit_transform(raw_data)
-            independent_components -= np.mean(independent_components)
-
-            # Create DataFrame for prediction
+            # Read raw EMG data, one window of samples as an (n, 1) array
+            raw_data = source.read_samples(window_samples)
+            samples_read += len(raw_data)
+            if first:
+                startup.mark('first window')
+
+            # Apply the model's ICA unmixing, refitted per window if none was saved
+            independent_components = unmixing.transform(raw_data)
+
+            # One row per sample, in the model's column order
             timestamps = np.linspace(0, sample_rate / 1000, len(independent_components))
-            df_pred = pd.DataFrame({
-                'Timestamp': timestamps,
-                'Raw_EMG': raw_data.flatten(),
-                'Independent_Component': independent_components.flatten(),
-                'Label': [''] * len(independent_components)
-            })
+            X = np.column_stack((timestamps, raw_data[:, 0], independent_components[:, 0]))
 
             # Make predictions
-            predictions = model.predict(df_pred[['Timestamp', 'Raw_EMG', 'Independent_Component']])
-
-            # Count occurrences of "YES" and "NO"
-            yes_count = (predictions == "YES").sum()
-            no_count = (predictions == "NO").sum()
-
-            # Update latest prediction and send command
-            current_time = time.time()
-            if current_time - last_function_call_time >= 1:  # Rate limiting to 1 second
-                current_prediction = "YES" if yes_count > no_count else "NO"
-                
-                # Only update and send command if:
-                # 1. Current prediction is NO (always allow STAY commands)
-                # 2. OR if previous prediction was NO (allow first MOVE after STAY)
-                if current_prediction == "NO" or previous_prediction == "NO":
-                    latest_prediction = current_prediction
-                    if current_prediction == "YES":
-                        MOVE()
-                    else:
-                        STAY()
-                    previous_prediction = current_prediction
-                    last_function_call_time = current_time
+            predictions = predict_labels(model, X, FEATURES)
+
+            if first:
+                startup.mark('first prediction')
+                startup.report()
+                first = False
+
+            # The share of samples voting YES is the window's probability of YES
+            now = samples_read / sample_rate
+            decision, switched = decisions.update('YES', (predictions == "YES").mean(), now)
+            resend = decision == SMOOTHING["stop_label"] and (last_sent is None or now - last_sent >= RESEND_SECONDS)
+            if switched or resend:
+                latest_prediction = decision
+                last_sent = now
+                if decision == "YES":
+                    MOVE()
+                else:
+                    STAY()
 
     except KeyboardInterrupt:
         print("Stopping real-time predictions.")
+    except TimeoutError as e:
+        # The amplifier stopped sending (unplugged or reset)
+        print(f"{e}, stopping real-time predictions.")
     finally:
         ser.close()
 
 def main():
-    # Start Flask in a separate thread
-    flask_thread = Thread(target=run_flask)
-    flask_thread.daemon = True
-    flask_thread.start()
-
     # Start EMG prediction
-    predict_emg('COM10')  # Update with your Arduino's COM port
+    # Update with your Arduino's COM port, or pass one (e.g. an emg_simulator.py pty)
+    predict_emg(sys.argv[1] if len(sys.argv) > 1 else 'COM10')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,8 @@
-from flask import Flask, jsonify, request, make_response
+from flask import Flask, jsonify, request, make_response, Response
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-from sklearn.decomposition import FastICA
-from pycaret.classification import setup, compare_models, finalize_model, save_model, load_model, predict_model
 import serial
 import time
 import threading
-import queue
 import os
 import subprocess
 from pathlib import Path
@@ -15,6 +10,20 @@ import sys
 import glob
 import asyncio
 import websockets
+from serial_source import SerialSampleSource, make_decoder
+from replay_source import ReplaySource, ReplayFinished, is_replay
+from ring_buffer import SampleRingBuffer, AcquisitionThread
+from metrics import LatencyTracker, MetricsText, PipelineMetrics
+from features import StreamingFeatures, emg_signals
+from predictor import LeanPredictor
+from decisions import make_policy, model_classes
+from status_feed import StatusFeed
+from broadcast_hub import BroadcastHub
+from training_jobs import TrainingJobRunner
+from recording_store import RecordingWriter, add_ics, recover_recordings
+from dataset_catalog import DatasetCatalog
+from model_registry import ModelRegistry, ModelSlot, load_bundle, validate_user
+from session_manager import SessionManager
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -30,23 +39,38 @@ CORS(app, resources={
 # Global variables
 recording_thread = None
 inference_thread = None
-data_queue = queue.Queue()
-stop_event = threading.Event()
+status_feed = StatusFeed()
 model = None
-current_thread = None
-connected_clients = set()
+# pandas and PyCaret are only imported by the training processes, see TrainingJobRunner
+training_jobs = TrainingJobRunner('training:train_model_with_features', on_finished=lambda job: _serve_trained(job))
+TRAINING_OPTIONS = ('candidates', 'time_budget', 'latency_budget_ms', 'user', 'labels', 'since', 'filters')
+dataset_catalog = DatasetCatalog()
+model_registry = ModelRegistry()
+active_model = ModelSlot()
+connected_clients = BroadcastHub(queue_size=8, policy='coalesce', send_timeout=1.0)
 websocket_loop = None
 
+# Wire format sent by the amplifier: 'ascii' ("a,b" lines) or 'binary' (framed int16)
+SAMPLE_FORMAT = 'ascii'
+N_CHANNELS = 2
+RING_BUFFER_SAMPLES = 60000  # ~60 s of history at 1 kHz
+# Boards that reset when their port opens (Arduino) take this long to start sending,
+# 0 for amplifiers that stream straight away
+PORT_SETTLE_SECONDS = 2
+
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', 'http://localhost:3000')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,DELETE,OPTIONS')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
     return response
 
 def get_port():
     """Determine the appropriate port based on operating system"""
+    # e.g. EMG_PORT=/dev/pts/4 or socket://localhost:7000 for emg_simulator.py
+    if os.environ.get('EMG_PORT'):
+        return os.environ['EMG_PORT']
     if sys.platform.startswith('darwin'):  # macOS
         ports = glob.glob('/dev/cu.usbserial*') + glob.glob('/dev/tty.usbserial*')
         if ports:
@@ -67,6 +91,9 @@ def cleanup_port(port):
                 for line in output.split('\n')[1:]:
                     if line:
                         pid = line.split()[1]
+                        if pid == str(os.getpid()):
+                            # Another session of this server, or a simulated device
+                            continue
                         print(f"Killing process {pid} using {port}")
                         os.system(f"kill -9 {pid}")
             except subprocess.CalledProcessError:
@@ -79,22 +106,35 @@ def cleanup_port(port):
     
     time.sleep(1)
 
-def record_emg_data(port, duration, feature, data_queue, stop_event):
+def open_source(port, settle=True, **serial_options):
+    """The samples behind a port: an amplifier, socket://host:port or replay://<recording>.
+    With settle=False the caller waits out PORT_SETTLE_SECONDS itself."""
+    if is_replay(port):
+        return ReplaySource.from_url(port)
+    ser = serial.serial_for_url(port, baudrate=115200, timeout=1, **serial_options)
+    if settle:
+        time.sleep(PORT_SETTLE_SECONDS)
+    return SerialSampleSource(ser, make_decoder(SAMPLE_FORMAT, N_CHANNELS))
+
+def recording_name(feature, user=None):
+    """data_<feature> in the working directory, or under sessions/<user>/ for a named operator.
+    Raises ValueError for users that aren't plain names, an existing recording gets replaced"""
+    name = f'data_{feature.lower()}'
+    if os.path.basename(name) != name or (os.altsep and os.altsep in name):
+        raise ValueError(f"Invalid feature {feature!r}, it can't contain a path separator")
+    return os.path.join('sessions', validate_user(user), name) if user else name
+
+def record_emg_data(port, duration, feature, status_feed, stop_event, on_saved=None, user=None, metrics=None):
     try:
         print(f"Starting recording for feature: {feature}")
-        cleanup_port(port)
+        replay = is_replay(port)
+        if not replay:
+            cleanup_port(port)
         
         max_attempts = 3
         for attempt in range(max_attempts):
             try:
-                ser = serial.Serial(
-                    port=port,
-                    baudrate=115200,
-                    timeout=1,
-                    rtscts=True,
-                    dsrdtr=True
-                )
-                time.sleep(2)
+                source = open_source(port, rtscts=True, dsrdtr=True)
                 break
             except serial.SerialException as e:
                 if attempt < max_attempts - 1:
@@ -104,219 +144,305 @@ def record_emg_data(port, duration, feature, data_queue, stop_event):
                 else:
                     raise
 
-        raw_data_1 = []
-        raw_data_2 = []
-        
-        start_time = time.time()
-        while (time.time() - start_time) < duration and not stop_event.is_set():
-            try:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line and ',' in line:
-                    values = line.split(',')
-                    if len(values) == 2:
-                        raw_data_1.append(int(values[0]))
-                        raw_data_2.append(int(values[1]))
-            except (ValueError, UnicodeDecodeError) as e:
-                continue
-
-        ser.close()
-        cleanup_port(port)
-
-        if not raw_data_1 or not raw_data_2:
+        # Chunks go to disk as they arrive, memory use doesn't grow with the session length
+        if metrics is not None:
+            metrics.attach(source)
+        # Each operator's sessions get their own folder, see recording_name()
+        writer = RecordingWriter(recording_name(feature, user), source.n_channels, label=feature, user=user)
+        try:
+            source.stream_for(duration, writer.append, stop_event)
+        except ReplayFinished as e:
+            print(e)
+        finally:
+            source.close()
+            if not replay:
+                cleanup_port(port)
+            # Keep whatever arrived, even if the port failed halfway
+            filename = writer.finalize() if writer.n_samples else writer.abort()
+
+        if filename is None:
             raise Exception("No data was recorded!")
+        if writer.meta['status'] == 'unusable':
+            raise Exception(f"Too few samples to measure the sample rate, {filename} can't be used")
 
-        # Process the recorded data
-        raw_data_1 = np.array(raw_data_1).reshape(-1, 1)
-        raw_data_2 = np.array(raw_data_2).reshape(-1, 1)
-        combined_data = np.hstack((raw_data_1, raw_data_2))
-        
-        # Apply ICA
-        ica = FastICA(n_components=2)
-        independent_components = ica.fit_transform(combined_data)
-        independent_components -= np.mean(independent_components, axis=0)
-        
-        # Create timestamps and DataFrame
-        timestamps = np.linspace(0, duration, len(independent_components))
-        df = pd.DataFrame({
-            'Timestamp': timestamps,
-            'Raw_EMG1': raw_data_1.flatten(),
-            'Raw_EMG2': raw_data_2.flatten(),
-            'IC1': independent_components[:, 0],
-            'IC2': independent_components[:, 1],
-            'Label': [feature] * len(independent_components)
-        })
-        
-        # Save to CSV with feature name
-        filename = f'data_{feature.lower()}.csv'
-        df.to_csv(filename, index=False)
+        # ICA over the file on disk (preview for this recording, training refits it over all sessions)
+        add_ics(filename, n_components=2)
+        dataset_catalog.add(filename, user)
         print(f"Saved data for feature '{feature}' to {filename}")
+
+        if on_saved is not None:
+            on_saved(filename)
         
         return True
 
     except Exception as e:
         print(f"Error in record_emg_data: {e}")
-        data_queue.put({"status": "error", "message": str(e)})
+        status_feed.publish({"status": "error", "message": str(e)})
         return False
 
-def train_model_with_features():
-    try:
-        # Combine all feature data files
-        all_data = []
-        data_files = glob.glob('data_*.csv')
-        
-        if not data_files:
-            raise Exception("No training data files found!")
-            
-        print(f"Found {len(data_files)} data files: {data_files}")
-        
-        for file in data_files:
-            print(f"Reading file: {file}")
-            df = pd.read_csv(file)
-            print(f"Shape of data from {file}: {df.shape}")
-            all_data.append(df)
-        
-        combined_df = pd.concat(all_data, ignore_index=True)
-        print(f"Combined data shape: {combined_df.shape}")
-        print(f"Unique labels: {combined_df['Label'].unique()}")
-        
-        # Setup pycaret with simplified parameters
-        print("Setting up PyCaret...")
-        exp = setup(
-            data=combined_df,
-            target='Label',
-            verbose=False,
-            fold=3,
-            normalize=True,
-            session_id=123,
-            html=False,
-            preprocess=True
-        )
-        
-        # Train and save model
-        print("Training model...")
-        best_model = compare_models(n_select=1)
-        print("Finalizing model...")
-        final_model = finalize_model(best_model)
-        print("Saving model...")
-        save_model(final_model, 'nbest')
-        
-        print("Model training completed successfully!")
-        return True
-        
-    except Exception as e:
-        print(f"Error in train_model_with_features: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
+def _predict_window(model, extractor, features):
+    """Classify one window's feature vector with a single model call"""
+    if isinstance(model, LeanPredictor):
+        labels, scores = model.predict(features)
+        return labels[0], scores[0]
+    
+    # Models trained before the lean predictor existed, PyCaret is imported on first use
+    import pandas as pd
+    from pycaret.classification import predict_model
 
-def inference_loop(port, data_queue, stop_event):
+    df_pred = pd.DataFrame([features], columns=extractor.feature_names())
+    predictions = predict_model(model, data=df_pred)
+    pred_col = [col for col in predictions.columns if 'prediction' in col.lower()][0]
+    score = predictions['prediction_score'].iloc[0] if 'prediction_score' in predictions else None
+    return predictions[pred_col].iloc[0], score
+
+def _publish_prediction(status_feed, prediction_data, hub=None, metrics=None):
+    """Hand a prediction to REST/SSE clients and WebSocket clients"""
+    if "timing" in prediction_data:
+        prediction_data["timing"]["dispatch"] = time.time()
+    if metrics is not None:
+        metrics.observe_decision(prediction_data["prediction"], prediction_data.get("timing"))
+    status_feed.publish(prediction_data)
+    hub = hub if hub is not None else connected_clients
+    
+    # Send to WebSocket clients
+    if hub and websocket_loop is not None:
+        # Send "1" for "GO" and "0" for "STOP"
+        ws_message = "1" if prediction_data["prediction"].upper() == "GO" else "0"
+        asyncio.run_coroutine_threadsafe(_send_to_all(ws_message, hub), websocket_loop)
+
+def inference_loop(port, status_feed, stop_event, window_seconds=1.0, hop_seconds=None, slot=None, hub=None,
+                   metrics=None, smoothing=None):
+    """Classify the EMG stream.
+
+    With hop_seconds unset each non-overlapping window is classified on its own. With a
+    hop the window slides forward every hop_seconds, reusing the feature statistics of
+    the samples it overlaps with. Either way each decision is a single model call, made
+    with whatever model is in slot at the time, so the model can be swapped mid-run.
+    The command sent is the decision layer's (decisions.py, smoothing settings).
+    """
+    source = None
     try:
-        print("Loading model...")
-        model = load_model('nbest')
-        
+        slot = slot or ModelSlot()
+        policy = make_policy(smoothing)
         print(f"Connecting to port {port}...")
-        ser = serial.Serial(
-            port=port,
-            baudrate=115200,
-            timeout=1
-        )
-        time.sleep(2)
+        started = time.time()
+        source = open_source(port, settle=False)
+        # Load the model while the board starts up
+        if slot.bundle is None:
+            print("Loading model...")
+            slot.swap(load_bundle('nbest'))
+        loaded = time.time()
+        if not is_replay(port):
+            time.sleep(max(0.0, started + PORT_SETTLE_SECONDS - loaded))
+        print(f"Model ready in {loaded - started:.2f} s, port in {time.time() - started:.2f} s")
+
+        # Acquisition runs on its own thread so the port is drained while we predict
+        buffer = SampleRingBuffer(RING_BUFFER_SAMPLES, source.n_channels)
+        acquisition = AcquisitionThread(source, buffer, stop_event)
+        metrics = metrics if metrics is not None else PipelineMetrics()
+        metrics.attach(source, buffer)
+        replay = source if isinstance(source, ReplaySource) else None
+        if replay is not None:
+            replay.follow(buffer, window_seconds)
+        acquisition.start()
         
         print("Starting real-time predictions...")
-        while not stop_event.is_set():
-            raw_data_1 = []
-            raw_data_2 = []
-            
-            start_time = time.time()
-            while (time.time() - start_time) < 1.0:
-                try:
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line and ',' in line:
-                        values = line.split(',')
-                        if len(values) == 2:
-                            raw_data_1.append(int(values[0]))
-                            raw_data_2.append(int(values[1]))
-                except (ValueError, UnicodeDecodeError):
-                    continue
-
-            if not raw_data_1 or not raw_data_2:
-                data_queue.put({
-                    "status": "waiting",
-                    "message": "No data received"
-                })
-                continue
-
-            # Process the data
-            raw_data_1 = np.array(raw_data_1).reshape(-1, 1)
-            raw_data_2 = np.array(raw_data_2).reshape(-1, 1)
-            combined_data = np.hstack((raw_data_1, raw_data_2))
-            
-            # Apply ICA
-            ica = FastICA(n_components=2)
-            independent_components = ica.fit_transform(combined_data)
-            independent_components -= np.mean(independent_components, axis=0)
-            
-            # Prepare for prediction
-            timestamps = np.linspace(0, 1.0, len(independent_components))
-            df_pred = pd.DataFrame({
-                'Timestamp': timestamps,
-                'Raw_EMG1': raw_data_1.flatten(),
-                'Raw_EMG2': raw_data_2.flatten(),
-                'IC1': independent_components[:, 0],
-                'IC2': independent_components[:, 1]
-            })
-            
-            # Make prediction
-            predictions = predict_model(model, data=df_pred)
-            pred_col = [col for col in predictions.columns if 'prediction' in col.lower()][0]
-            prediction_counts = predictions[pred_col].value_counts()
-            majority_prediction = prediction_counts.index[0]
-            
-            # Send prediction to both WebSocket clients and REST clients
-            prediction_data = {
-                "status": "prediction",
-                "prediction": str(majority_prediction),
-                "counts": {str(k): int(v) for k, v in prediction_counts.to_dict().items()},
-                "samples": len(raw_data_1)
-            }
-            
-            # Clear the queue before putting new prediction
-            while not data_queue.empty():
-                try:
-                    data_queue.get_nowait()
-                except queue.Empty:
-                    break
-                    
-            data_queue.put(prediction_data)
-            
-            # Send to WebSocket clients
-            if connected_clients:
-                # Send "1" for "GO" and "0" for "STOP"
-                ws_message = "1" if majority_prediction.upper() == "GO" else "0"
-                asyncio.run_coroutine_threadsafe(_send_to_all(ws_message), websocket_loop)
+        if hop_seconds:
+            _streaming_inference(slot, buffer, status_feed, stop_event, window_seconds, hop_seconds, hub, metrics,
+                                 replay, policy)
+        else:
+            _block_inference(slot, buffer, status_feed, stop_event, window_seconds, hub, metrics, replay, policy)
             
-        ser.close()
+        acquisition.join()
+        if isinstance(acquisition.error, ReplayFinished):
+            print(acquisition.error)
+            status_feed.publish({"status": "finished", "message": str(acquisition.error)})
+        elif acquisition.error:
+            raise acquisition.error
     except Exception as e:
         print(f"Inference error: {e}")
-        data_queue.put({"status": "error", "message": str(e)})
+        status_feed.publish({"status": "error", "message": str(e)})
+    finally:
+        # Also when the model fails to load, or the port stays busy until the server restarts
+        if source is not None:
+            source.close()
+
+def _filter_stream(bundle):
+    """Fresh filter state for a model's filters, None for models trained without any"""
+    return bundle.filters.stream() if bundle.filters is not None else None
+
+def _decide(decisions, prediction, score, end, sample_rate):
+    """Fields of a window's decision, the window ending at sample index end"""
+    decision, switched = decisions.update(prediction, score, end / sample_rate)
+    return {
+        "prediction": decision,
+        "raw_prediction": str(prediction),
+        "score": None if score is None else float(score),
+        "confidence": decisions.confidence,
+        "switched": switched,
+        "reason": decisions.reason,
+    }
+
+def _next_samples(buffer, stop_event, n_samples):
+    """Wait for n_samples unread samples, None once stopped"""
+    while buffer.write_index - buffer.read_index < n_samples:
+        if stop_event.wait(0.0005):
+            return None
+    return buffer.read_new(n_samples)
+
+def _block_inference(slot, buffer, status_feed, stop_event, window_seconds, hub=None, metrics=None, replay=None,
+                     policy=None):
+    policy = policy or make_policy()
+    bundle = None
+    decisions = None
+    next_window = time.time()
+    while not stop_event.is_set():
+        if replay is not None:
+            # Replays are classified by sample count, whatever their speed, so a replay
+            # at N x real time gets N times as many windows and they repeat exactly
+            read = _next_samples(buffer, stop_event, int(round(window_seconds * replay.sample_rate)))
+            if read is None:
+                break
+            start, combined_data, stamps = read
+        else:
+            # Pull the next window of samples without ever pausing the reader
+            next_window = max(next_window + window_seconds, time.time())
+            if stop_event.wait(next_window - time.time()):
+                break
+            start, combined_data, stamps = buffer.read_new()
+        # Wall clock time each stage finished, from the newest sample's arrival on
+        timing = {"arrival": float(stamps[-1]) if len(stamps) else None, "read": time.time()}
+
+        # Windows only share the filter and decision state. A swapped in model starts its own
+        # filters with the next one, and carries on from the current decision
+        if slot.bundle is not bundle:
+            bundle = slot.bundle
+            filters = _filter_stream(bundle)
+            decisions = policy.stream(model_classes(bundle.model), previous=decisions)
+        if filters is not None:
+            combined_data = filters.process(combined_data)
+        timing["filter"] = time.time()
+        signals = emg_signals(combined_data, bundle.unmixing)
+        timing["unmix"] = time.time()
+        features = bundle.extractor.transform(signals)
+        timing["features"] = time.time()
+        if features is None:
+            if metrics is not None:
+                metrics.skipped_windows += 1
+            status_feed.publish({
+                "status": "waiting",
+                "message": "No data received"
+            })
+            continue
+        
+        # Make prediction
+        prediction, score = _predict_window(bundle.model, bundle.extractor, features)
+        timing["predict"] = time.time()
+        
+        # Send prediction to both WebSocket clients and REST clients
+        _publish_prediction(status_feed, {
+            "status": "prediction",
+            **_decide(decisions, prediction, score, start + len(combined_data), bundle.extractor.sample_rate),
+            "samples": len(combined_data),
+            "model": bundle.name,
+            "buffer": buffer.metrics(),
+            "timing": timing
+        }, hub, metrics)
+
+def _streaming_inference(slot, buffer, status_feed, stop_event, window_seconds, hop_seconds, hub=None,
+                         metrics=None, replay=None, policy=None):
+    policy = policy or make_policy()
+    bundle = None
+    decisions = None
+    latency = LatencyTracker()
+
+    next_hop = time.time()
+    while not stop_event.is_set():
+        if replay is not None:
+            read = _next_samples(buffer, stop_event, int(round(hop_seconds * replay.sample_rate)))
+            if read is None:
+                break
+            start, combined_data, stamps = read
+        else:
+            next_hop = max(next_hop + hop_seconds, time.time())
+            if stop_event.wait(next_hop - time.time()):
+                break
+            start, combined_data, stamps = buffer.read_new()
+        timing = {"arrival": float(stamps[-1]) if len(stamps) else None, "read": time.time()}
+        end = start + len(combined_data)
+
+        if slot.bundle is not bundle:
+            # New model: its filters, unmixing and blocks differ, so rebuild the window state
+            # from the samples still in the ring buffer rather than waiting for a fresh window
+            bundle = slot.bundle
+            extractor = bundle.extractor
+            filters = _filter_stream(bundle)
+            # The command holds until the new model's windows overturn it like any others
+            decisions = policy.stream(model_classes(bundle.model), previous=decisions)
+            # Block statistics of the overlapping part of the window are kept, not recomputed
+            window_blocks = max(1, int(round(window_seconds * extractor.sample_rate / extractor.block_samples)))
+            stream = StreamingFeatures(extractor, window_blocks)
+            history = buffer.read_window(window_blocks * extractor.block_samples, end=end)
+            if history is not None:
+                combined_data = history[1]
+
+        if filters is not None:
+            combined_data = filters.process(combined_data)
+        timing["filter"] = time.time()
+        signals = emg_signals(combined_data, bundle.unmixing)
+        timing["unmix"] = time.time()
+        if not stream.push(signals) or not stream.ready:
+            continue
+        features = stream.features()
+        timing["features"] = time.time()
+
+        prediction, score = _predict_window(bundle.model, extractor, features)
+        timing["predict"] = time.time()
+        latency.add(timing["predict"] - stamps[-1])
+
+        _publish_prediction(status_feed, {
+            "status": "prediction",
+            **_decide(decisions, prediction, score, end, extractor.sample_rate),
+            "samples": window_blocks * extractor.block_samples,
+            "model": bundle.name,
+            "buffer": buffer.metrics(),
+            "latency": latency.summary(),
+            "timing": timing
+        }, hub, metrics)
+
+    summary = latency.summary()
+    print(f"Decision latency over run: {summary}")
+    status_feed.publish({"status": "stopped", "latency": summary})
 
 # Add WebSocket handling functions
-async def _send_to_all(message: str):
-    """Asynchronously send 'message' to all connected WebSocket clients."""
-    if connected_clients:
-        await asyncio.wait([ws.send(message) for ws in connected_clients])
+async def _send_to_all(message: str, hub=None):
+    """Queue 'message' for every connected WebSocket client without waiting on any of them."""
+    (hub if hub is not None else connected_clients).broadcast(message)
 
 async def handle_client(websocket):
-    """Handle WebSocket client connections."""
-    print(f"Client connected: {websocket.remote_address}")
-    connected_clients.add(websocket)
+    """Handle WebSocket client connections.
+
+    Devices connecting to /sessions/<id> get that session's decisions, any other path
+    gets the default session's.
+    """
+    path = websocket.request.path if websocket.request else '/'
+    hub = connected_clients
+    if path.startswith('/sessions/'):
+        session = sessions.find(path[len('/sessions/'):].strip('/'))
+        if session is None:
+            await websocket.close(code=1008, reason='Unknown session')
+            return
+        hub = session.hub
+    print(f"Client connected: {websocket.remote_address} ({path})")
+    hub.register(websocket)
     try:
         async for message in websocket:
             print(f"Received from client: {message}")
     except websockets.ConnectionClosed:
         print(f"Client disconnected: {websocket.remote_address}")
     finally:
-        connected_clients.remove(websocket)
+        hub.unregister(websocket)
 
 async def start_websocket_server():
     """Start the WebSocket server."""
@@ -332,89 +458,342 @@ def run_websocket_server():
     websocket_loop.run_until_complete(start_websocket_server())
     websocket_loop.run_forever()
 
+def _start_model_update(session, data_file, replace=False, user=None):
+    """Run an incremental update of the session's model as a training job, its progress shows
+    up under /api/train/<job_id>. A user's model is updated into a new version, like a retrain"""
+    bundle = session.model.bundle
+    if bundle is not None:
+        base_model, user = bundle.name, bundle.user
+    elif user and model_registry.latest(user):
+        base_model = model_registry.model_name(user, model_registry.latest(user))
+    else:
+        base_model, user = 'nbest', None
+    options = {"model_name": base_model}
+    if user:
+        options = {"model_name": model_registry.next_model_name(user), "base_model": base_model, "user": user}
+    try:
+        job_id = training_jobs.submit(target='online_update:update_model', data_file=data_file, replace=replace,
+                                      **options)
+        session.status_feed.publish({"status": "updating", "job_id": job_id, "file": data_file})
+    except RuntimeError as e:
+        session.status_feed.publish({"status": "error", "message": f"Model not updated: {e}"})
+
+def _serve_trained(job):
+    """Swap a model a training or update job just saved into the slots serving its previous
+    version, so running and restarted inference doesn't keep the stale one"""
+    if job.state != 'succeeded':
+        return
+    user = job.options.get('user')
+    model_name = job.options.get('model_name', 'nbest')
+    feeds = {id(active_model): (active_model, status_feed)}
+    for session in sessions.list():
+        feeds[id(session.model)] = (session.model, session.status_feed)
+    stale = [(slot, feed) for slot, feed in feeds.values() if slot.bundle is not None and
+             (slot.bundle.name == model_name or (user is not None and slot.bundle.user == user))]
+    if not stale:
+        return
+    try:
+        bundle = model_registry.load(user) if user else load_bundle(model_name)
+    except Exception as e:
+        print(f"Trained model not loaded, inference keeps the previous one: {e}")
+        return
+    for slot, feed in stale:
+        slot.swap(bundle)
+        feed.publish({"status": "model", "model": bundle.describe()})
+
+sessions = SessionManager(record_emg_data, inference_loop)
+default_session_lock = threading.Lock()
+
+def _default_session():
+    """The session behind the original single-device routes, on get_port()"""
+    # Two first requests at once must not both create it
+    with default_session_lock:
+        session = sessions.find('default')
+        if session is None:
+            session = sessions.create(get_port(), session_id='default', status_feed=status_feed, hub=connected_clients)
+            session.model = active_model
+        return session
+
+def _start_recording(session, options):
+    feature = options.get('feature')
+    if not feature:
+        return jsonify({"status": "error", "message": "Feature name is required"})
+    
+    if session.busy():
+        return jsonify({"status": "error", "message": "Recording already in progress"})
+    
+    try:
+        recording_name(feature, options.get('user'))
+    except ValueError as e:
+        return make_response(jsonify({"status": "error", "message": str(e)}), 400)
+
+    # Sessions can run for hours, the frontend's calibration timer uses the default
+    duration = float(options.get('duration', 15))
+
+    # {"update": true} folds the new session into the current model as soon as it is saved,
+    # {"replace": true} lets that swap a model without partial_fit for an SGD one
+    replace = bool(options.get('replace'))
+    user = options.get('user') or session.user
+    on_saved = (lambda data_file: _start_model_update(session, data_file, replace, user)) if options.get('update') else None
+    session.start_recording(feature, duration, on_saved, user=options.get('user'))
+    return jsonify({"status": "success"})
+
+def _start_inference(session, options):
+    if session.busy():
+        return jsonify({"status": "error", "message": "Inference already running"})
+    
+    # Optional sliding window, e.g. {"window_ms": 500, "hop_ms": 50}
+    window_seconds = options.get('window_ms', 1000) / 1000
+    hop_seconds = options['hop_ms'] / 1000 if options.get('hop_ms') else None
+    # Optional decision settings (decisions.py), e.g. {"smoothing": {"time_constant": 0.5}}, false for none
+    smoothing = options.get('smoothing')
+    try:
+        make_policy(smoothing)
+    except (TypeError, ValueError) as e:
+        return make_response(jsonify({"status": "error", "message": f"Invalid smoothing: {e}"}), 400)
+    # {"user": "zj"} starts with that operator's latest model instead of nbest
+    user = options.get('user') or session.user
+    if user:
+        try:
+            bundle = model_registry.load(user, options.get('version'))
+        except ValueError as e:
+            return make_response(jsonify({"status": "error", "message": str(e)}), 400)
+        session.model.swap(bundle)
+    
+    session.start_inference(window_seconds, hop_seconds, smoothing)
+    return jsonify({"status": "success"})
+
+def _activate_model(session, options):
+    """Switch the model a session decides with, also while its inference is running"""
+    user = options.get('user') or session.user
+    if not user:
+        return make_response(jsonify({"status": "error", "message": "user is required"}), 400)
+    try:
+        started = time.time()
+        bundle = model_registry.load(user, options.get('version'))
+        session.model.swap(bundle)
+        session.status_feed.publish({"status": "model", "model": bundle.describe()})
+        return jsonify({"status": "success", "model": bundle.describe(),
+                        "switch_ms": round((time.time() - started) * 1000, 1)})
+    except FileNotFoundError as e:
+        return make_response(jsonify({"status": "error", "message": str(e)}), 404)
+    except ValueError as e:
+        return make_response(jsonify({"status": "error", "message": str(e)}), 400)
+
 @app.route('/api/record/start', methods=['POST'])
 def start_recording():
-    global current_thread, stop_event
-    
     try:
-        feature = request.json.get('feature')
-        if not feature:
-            return jsonify({"status": "error", "message": "Feature name is required"})
-        
-        if current_thread and current_thread.is_alive():
-            return jsonify({"status": "error", "message": "Recording already in progress"})
-        
-        stop_event.clear()
-        current_thread = threading.Thread(
-            target=record_emg_data,
-            args=(get_port(), 15, feature, data_queue, stop_event)
-        )
-        current_thread.start()
-        
-        return jsonify({"status": "success"})
+        return _start_recording(_default_session(), request.json)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
 @app.route('/api/record/stop', methods=['POST'])
 def stop_recording():
-    global stop_event
     try:
-        stop_event.set()
+        _default_session().stop()
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
 @app.route('/api/train', methods=['POST'])
 def train_model():
+    """Start training in the background and return its job id.
+
+    Optional JSON body {"candidates": ["lr", "lda"], "time_budget": 60, "latency_budget_ms": 5}
+    runs the fast search over just those estimators instead of comparing all of them.
+    """
     try:
-        success = train_model_with_features()
-        if success:
-            return jsonify({"status": "success"})
-        else:
-            return jsonify({"status": "error", "message": "Failed to train model"})
+        options = request.get_json(silent=True) or {}
+        options = {key: options[key] for key in TRAINING_OPTIONS if key in options}
+        try:
+            validate_user(options.get('user'))
+        except ValueError as e:
+            return make_response(jsonify({"status": "error", "message": str(e)}), 400)
+        # A user's model goes into a new version in the registry, swapped in when done
+        if options.get('user'):
+            options['model_name'] = model_registry.next_model_name(options['user'])
+        job_id = training_jobs.submit(**options)
+        return jsonify({"status": "success", "job_id": job_id})
+    except RuntimeError as e:
+        return jsonify({"status": "error", "message": str(e)})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
+@app.route('/api/train/<job_id>')
+def train_status(job_id):
+    """State, current estimator and elapsed time of a training job"""
+    try:
+        return jsonify({"status": "success", **training_jobs.status(job_id)})
+    except KeyError:
+        return make_response(jsonify({"status": "error", "message": "Unknown training job"}), 404)
+
+@app.route('/api/train/<job_id>/cancel', methods=['POST'])
+def cancel_training(job_id):
+    try:
+        return jsonify({"status": "success", **training_jobs.cancel(job_id)})
+    except KeyError:
+        return make_response(jsonify({"status": "error", "message": "Unknown training job"}), 404)
+
 @app.route('/api/inference/start', methods=['POST'])
 def start_inference():
-    global current_thread, stop_event
     try:
-        if current_thread and current_thread.is_alive():
-            return jsonify({"status": "error", "message": "Inference already running"})
-        
-        stop_event.clear()
-        current_thread = threading.Thread(
-            target=inference_loop,
-            args=(get_port(), data_queue, stop_event)
-        )
-        current_thread.start()
-        
-        return jsonify({"status": "success"})
+        return _start_inference(_default_session(), request.get_json(silent=True) or {})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
+@app.route('/api/models')
+def list_models():
+    """Trained versions per user, the models held in memory and the active one"""
+    active = active_model.bundle.describe() if active_model.bundle else None
+    return jsonify({"status": "success", "active": active, "swaps": active_model.swaps, **model_registry.summary()})
+
+@app.route('/api/models/activate', methods=['POST'])
+def activate_model():
+    """Switch the model used for decisions, also while inference is running.
+
+    Body {"user": "zj", "version": 3}, version defaults to the latest.
+    """
+    return _activate_model(_default_session(), request.get_json(silent=True) or {})
+
 @app.route('/api/inference/stop', methods=['POST'])
 def stop_inference():
-    global stop_event
     try:
-        stop_event.set()
+        _default_session().stop()
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
+@app.route('/api/sessions', methods=['GET', 'POST'])
+def device_sessions():
+    """List sessions, or open one for another amplifier with {"port": ..., "user": ...}"""
+    if request.method == 'GET':
+        return jsonify({"status": "success", "sessions": [session.describe() for session in sessions.list()]})
+    options = request.get_json(silent=True) or {}
+    if not options.get('port'):
+        return make_response(jsonify({"status": "error", "message": "port is required"}), 400)
+    try:
+        validate_user(options.get('user'))
+    except ValueError as e:
+        return make_response(jsonify({"status": "error", "message": str(e)}), 400)
+    try:
+        session = sessions.create(options['port'], options.get('user'), options.get('id'))
+    except ValueError as e:
+        return make_response(jsonify({"status": "error", "message": str(e)}), 409)
+    return jsonify({"status": "success", "session": session.describe()})
+
+def _session_or_404(session_id):
+    session = sessions.find(session_id)
+    if session is None:
+        return None, make_response(jsonify({"status": "error", "message": "Unknown session"}), 404)
+    return session, None
+
+@app.route('/api/sessions/<session_id>', methods=['GET', 'DELETE'])
+def device_session(session_id):
+    session, error = _session_or_404(session_id)
+    if error:
+        return error
+    if request.method == 'DELETE':
+        sessions.remove(session_id)
+    return jsonify({"status": "success", "session": session.describe()})
+
+@app.route('/api/sessions/<session_id>/record/start', methods=['POST'])
+def session_start_recording(session_id):
+    session, error = _session_or_404(session_id)
+    return error or _start_recording(session, request.get_json(silent=True) or {})
+
+@app.route('/api/sessions/<session_id>/inference/start', methods=['POST'])
+def session_start_inference(session_id):
+    session, error = _session_or_404(session_id)
+    if error:
+        return error
+    try:
+        return _start_inference(session, request.get_json(silent=True) or {})
+    except FileNotFoundError as e:
+        return make_response(jsonify({"status": "error", "message": str(e)}), 404)
+
+@app.route('/api/sessions/<session_id>/stop', methods=['POST'])
+def session_stop(session_id):
+    """Stop whatever the session is doing, recording or inference"""
+    session, error = _session_or_404(session_id)
+    if error:
+        return error
+    session.stop()
+    return jsonify({"status": "success"})
+
+@app.route('/api/sessions/<session_id>/model/activate', methods=['POST'])
+def session_activate_model(session_id):
+    session, error = _session_or_404(session_id)
+    return error or _activate_model(session, request.get_json(silent=True) or {})
+
+@app.route('/api/sessions/<session_id>/status')
+def session_status(session_id):
+    session, error = _session_or_404(session_id)
+    if error:
+        return error
+    return jsonify(session.status_feed.latest() or {"status": "waiting"})
+
+@app.route('/api/sessions/<session_id>/stream')
+def session_stream(session_id):
+    """Server-Sent Events for one session, like /api/stream"""
+    session, error = _session_or_404(session_id)
+    if error:
+        return error
+    return Response(
+        session.status_feed.subscribe(request.headers.get('Last-Event-ID', type=int)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/status')
 def get_status():
+    """Latest state, returned immediately without consuming it"""
     try:
-        data = data_queue.get(timeout=0.1)
+        data = status_feed.latest()
+        if data is None:
+            return make_response(jsonify({"status": "waiting"}), 200)
         return make_response(jsonify(data), 200)
-    except queue.Empty:
-        return make_response(jsonify({"status": "waiting"}), 200)
     except Exception as e:
         return make_response(jsonify({
             "status": "error",
             "message": str(e)
         }), 500)
 
+@app.route('/api/stream')
+def stream_status():
+    """Server-Sent Events stream of every status message, numbered by seq"""
+    last_seq = request.headers.get('Last-Event-ID', type=int)
+    return Response(
+        status_feed.subscribe(last_seq),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/clients')
+def get_clients():
+    """Connected WebSocket clients and dropped/coalesced/evicted counters"""
+    return jsonify(connected_clients.summary())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text format: per session sample, error and decision counters, stage and
+    WebSocket send latency histograms. Rates (samples/s, windows/s) are rate() of the totals."""
+    _default_session()
+    text = MetricsText()
+    for session in sessions.list():
+        session.metrics.collect(text, {"session": session.id})
+    return Response(text.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/datasets')
+def list_datasets():
+    """Catalogued sessions, filtered by ?user=, ?label= (repeatable) and ?days="""
+    days = request.args.get('days', type=float)
+    sessions = dataset_catalog.query(
+        user=request.args.get('user'),
+        label=request.args.getlist('label') or None,
+        since=time.time() - days * 86400 if days else None
+    )
+    return jsonify({"status": "success", "sessions": sessions})
+
 @app.route('/api/verify-data')
 def verify_data():
     results = {}
@@ -422,6 +801,7 @@ def verify_data():
     for motion in ['GO', 'STOP']:
         filename = f'n{motion.lower()}.csv'
         if os.path.exists(filename):
+            import pandas as pd
             df = pd.read_csv(filename)
             results[motion] = {
                 'exists': True,
@@ -459,6 +839,11 @@ def handle_exception(e):
     }), 500)
 
 if __name__ == '__main__':
+    # Recordings cut short by a crash are kept up to their last flush
+    for pattern in ('data_*', os.path.join('sessions', '*', 'data_*')):
+        for path in recover_recordings(pattern):
+            dataset_catalog.add(path)
+
     # Start WebSocket server in a separate thread
     websocket_thread = threading.Thread(target=run_websocket_server)
     websocket_thread.daemon = True
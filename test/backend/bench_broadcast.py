@@ -0,0 +1,74 @@
+"""Load test for BroadcastHub with hundreds of simulated clients, some of them stalled.
+
+Run from test/backend:
+    python bench_broadcast.py --clients 500 --stalled 25 --messages 100
+"""
+import argparse
+import asyncio
+import itertools
+
+import numpy as np
+
+from broadcast_hub import BroadcastHub
+
+
+class SimulatedClient:
+    """Stands in for a websocket: send() takes `delay` seconds to complete"""
+
+    def __init__(self, index, delay):
+        self.remote_address = ('simulated', index)
+        self.delay = delay
+        self.received = []
+
+    async def send(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append((message, asyncio.get_running_loop().time()))
+
+    async def close(self):
+        pass
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    hub = BroadcastHub(queue_size=8, policy=args.policy, send_timeout=args.send_timeout)
+    clients = [SimulatedClient(i, 60.0 if i < args.stalled else 0.0) for i in range(args.clients)]
+    for client in clients:
+        hub.register(client)
+
+    sent_at = {}
+    messages = itertools.cycle(['1', '0'])
+    for seq in range(args.messages):
+        message = f"{next(messages)}:{seq}"
+        sent_at[message] = loop.time()
+        start = loop.time()
+        hub.broadcast(message)
+        blocked = loop.time() - start
+        await asyncio.sleep(args.interval)
+    await asyncio.sleep(args.send_timeout * 2)
+
+    latencies = [received_at - sent_at[message]
+                 for client in clients[args.stalled:]
+                 for message, received_at in client.received]
+    ms = np.array(latencies) * 1000
+    delivered = len(latencies) / (args.messages * (args.clients - args.stalled))
+    print(f"{args.clients} clients ({args.stalled} stalled), {args.messages} broadcasts, policy {args.policy}")
+    print(f"healthy clients: delivered {delivered:.1%}, latency p50 {np.percentile(ms, 50):.3f} ms, "
+          f"p99 {np.percentile(ms, 99):.3f} ms, max {ms.max():.3f} ms")
+    print(f"broadcast() itself took {blocked * 1e6:.0f} us for the last message")
+    print(f"hub: {hub.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--stalled', type=int, default=25)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--send-timeout', type=float, default=1.0)
+    parser.add_argument('--policy', default='coalesce')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Per-command latency of a new connection per command versus the pooled DeviceClient.
+
+Runs a local websockets server standing in for the ESP32. Run from test/backend:
+    python bench_device_client.py --commands 200
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+import websockets
+
+from device_client import DeviceClient
+
+
+def start_fake_device(port):
+    """Accept connections and consume commands like the ESP32 firmware does"""
+    received = []
+    ready = threading.Event()
+
+    async def handler(websocket):
+        try:
+            async for message in websocket:
+                received.append(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def serve():
+        async with websockets.serve(handler, '127.0.0.1', port):
+            ready.set()
+            await asyncio.Future()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+    return received
+
+
+async def send_command_via_websocket(uri, command):
+    """What the integrated scripts used to do for every command"""
+    async with websockets.connect(uri) as websocket:
+        await websocket.send(command)
+
+
+def bench_per_command_connection(uri, commands):
+    latencies = []
+    for command in commands:
+        start = time.perf_counter()
+        asyncio.run(send_command_via_websocket(uri, command))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies)
+
+
+def bench_pooled(uri, commands):
+    latencies = []
+    done = threading.Event()
+
+    def on_sent(name, command, rtt):
+        latencies.append(rtt)
+        done.set()
+
+    client = DeviceClient({'esp32': uri}, on_sent=on_sent).start()
+    try:
+        for command in commands:
+            done.clear()
+            client.send(command)
+            done.wait(timeout=5)
+    finally:
+        client.stop()
+    # The first command also pays for the initial connection
+    return np.array(latencies[1:])
+
+
+def report(name, latencies):
+    ms = latencies * 1000
+    print(f"{name:<26} p50 {np.percentile(ms, 50):7.3f} ms   p95 {np.percentile(ms, 95):7.3f} ms   "
+          f"p99 {np.percentile(ms, 99):7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    received = start_fake_device(args.port)
+    uri = f'ws://127.0.0.1:{args.port}'
+    commands = ['MOVE' if i % 2 else 'STAY' for i in range(args.commands)]
+
+    report('connection per command', bench_per_command_connection(uri, commands))
+    report('pooled DeviceClient (acked)', bench_pooled(uri, commands))
+    print(f"Device received {len(received)} commands")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Per-chunk cost of the streaming filter bank (dsp.py).
+
+For each sample rate, channel count and chunk length, filters a synthetic signal chunk
+by chunk with the carried state and reports the time per chunk and its share of the
+chunk's real time duration. For comparison, "refilter" is the stateless alternative:
+zero-phase filtering the whole 1 s window again on every chunk. Also checks that the
+chunked output equals filtering the recording whole, and the start-up transient with
+and without the steady state initial conditions.
+
+Run from test/backend:
+    python bench_filters.py --rates 1000,10000 --channels 1,2,8
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from dsp import FilterBank, DEFAULT_FILTERS
+from emg_simulator import synthetic_emg
+
+
+def time_chunks(process, signal, chunk, repeats=3):
+    """Best of repeats: mean seconds per chunk. process returns how many chunks it handled."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        n_chunks = process(signal, chunk)
+        best = min(best, (time.perf_counter() - start) / n_chunks)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rates', default='1000,5000,10000')
+    parser.add_argument('--channels', default='1,2,8')
+    parser.add_argument('--chunks-ms', default='10,50,250', help='chunk lengths to time')
+    parser.add_argument('--seconds', type=float, default=20.0, help='length of the synthetic signal')
+    parser.add_argument('--envelope-ms', type=float, default=50, help='also time rectify + RMS envelope')
+    args = parser.parse_args()
+    from scipy.signal import sosfilt, sosfiltfilt
+
+    rng = np.random.default_rng(123)
+    print(f"filters {DEFAULT_FILTERS}, envelope {args.envelope_ms} ms")
+    print(f"{'rate':>6} {'ch':>3} {'chunk':>6} {'stream us':>10} {'% of rt':>8} {'+envelope us':>13} "
+          f"{'refilter us':>12} {'speedup':>8}")
+    for rate, n_channels in itertools.product(map(int, args.rates.split(',')), map(int, args.channels.split(','))):
+        signal = synthetic_emg(rng, int(rate * args.seconds), n_channels, 'GO').astype(np.float64)
+        t = np.arange(len(signal)) / rate
+        signal += 150 * np.sin(2 * np.pi * 50 * t)[:, None]
+        bank = FilterBank.from_settings(rate)
+        envelope_bank = FilterBank(rate, rectify=True, envelope_ms=args.envelope_ms, **DEFAULT_FILTERS)
+        window = rate  # 1 s
+
+        def streamed(samples, chunk, bank=bank):
+            stream = bank.stream()
+            ends = range(chunk, len(samples) + 1, chunk)
+            for end in ends:
+                stream.process(samples[end - chunk:end])
+            return len(ends)
+
+        def refiltered(samples, chunk):
+            ends = range(window, len(samples) + 1, chunk)
+            for end in ends:
+                sosfiltfilt(bank.sos, samples[end - window:end], axis=0)
+            return len(ends)
+
+        for chunk_ms in map(float, args.chunks_ms.split(',')):
+            chunk = max(1, int(rate * chunk_ms / 1000))
+            stream_s = time_chunks(streamed, signal, chunk)
+            envelope_s = time_chunks(lambda samples, size: streamed(samples, size, envelope_bank), signal, chunk)
+            refilter_s = time_chunks(refiltered, signal, chunk, repeats=1)
+            print(f"{rate:>6} {n_channels:>3} {chunk_ms:>4.0f}ms {stream_s * 1e6:>10.1f} "
+                  f"{stream_s / (chunk / rate) * 100:>7.3f}% {envelope_s * 1e6:>13.1f} "
+                  f"{refilter_s * 1e6:>12.1f} {refilter_s / stream_s:>7.0f}x")
+
+        whole = bank.apply(signal)
+        stream = bank.stream()
+        sizes = rng.integers(1, rate // 10, size=len(signal))
+        bounds = np.concatenate(([0], np.cumsum(sizes)))
+        bounds = bounds[bounds < len(signal)]
+        chunked = np.vstack([stream.process(signal[a:b]) for a, b in zip(bounds, np.append(bounds[1:], len(signal)))])
+        settle = rate // 10
+        cold = sosfilt(bank.sos, signal[:settle], axis=0)
+        print(f"{'':>10} chunked vs whole max diff {np.abs(chunked - whole).max():.2e}, "
+              f"first 100 ms peak {np.abs(whole[:settle]).max():.0f} (vs {np.abs(cold).max():.0f} from zero state), "
+              f"steady peak {np.abs(whole[settle:]).max():.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""End-to-end latency benchmark: simulated amplifier -> inference -> WebSocket client.
+
+For every configuration (sample rate, channels, wire format, inference mode, window,
+hop) a synthetic GO/STOP signal from emg_simulator.py is fed on a pty to a real backend
+session, and a WebSocket client connected to that session plays the ESP32. Each
+decision carries the wall clock time every stage finished (see "timing" in the
+prediction messages), so we report p50/p95/p99 per stage:
+
+    acquire   newest sample read off the port -> picked up by the inference thread
+    filter    bandpass/notch filtering of the new samples (dsp.py)
+    unmix     fixed ICA unmixing of the new samples
+    features  window feature update and extraction
+    predict   model call
+    publish   building and publishing the decision
+    deliver   queued for WebSocket clients -> received by the client
+    total     newest sample read off the port -> received by the client
+
+plus throughput and the switch latency from the start of a GO/STOP segment on the
+wire to the first matching "1"/"0" at the client. Results are written as JSON;
+--compare prints the change against an earlier run, e.g. one from the previous commit.
+
+Run from test/backend:
+    python bench_latency.py --seconds 10 --output latency.json
+    python bench_latency.py --rates 1000,5000 --formats ascii,binary --hops 0.05,0.1 \\
+        --compare latency.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+
+import websockets
+
+from emg_simulator import EmgSimulator, PtyDevice
+from metrics import LatencyTracker, STAGE_BOUNDS as SERVER_STAGES
+
+# (stage, from, to) over the timestamps of a decision, 'receipt' is stamped by the client
+STAGE_BOUNDS = SERVER_STAGES + [('deliver', 'dispatch', 'receipt'), ('total', 'arrival', 'receipt')]
+STAGES = tuple(stage for stage, _, _ in STAGE_BOUNDS)
+STARTUP_SECONDS = 2  # inference_loop waits this long after opening the port
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class WebSocketServer:
+    """app.handle_client on a free local port, standing in for the server app.py starts"""
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait()
+        app.websocket_loop = self.loop
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+
+        async def serve():
+            server = await websockets.serve(self.app.handle_client, '127.0.0.1', 0)
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            await asyncio.Future()
+
+        self.loop.run_until_complete(serve())
+
+
+class CommandClient:
+    """Plays the ESP32: records when each "1"/"0" arrives"""
+
+    def __init__(self, url):
+        self.received = []
+        self.connected = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self._listen(url),),
+                                       daemon=True)
+        self.thread.start()
+        if not self.connected.wait(5):
+            raise RuntimeError(f"Couldn't connect to {url}")
+
+    async def _listen(self, url):
+        async with websockets.connect(url) as websocket:
+            self.connected.set()
+            try:
+                async for message in websocket:
+                    self.received.append((time.time(), message))
+            except (websockets.ConnectionClosed, asyncio.CancelledError):
+                pass
+
+    def close(self):
+        self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(self.loop)])
+        self.thread.join(2)
+
+
+def collect(status_feed, stop_event, decisions):
+    """Keep every prediction published, the feed itself only holds a short history"""
+    last_seq = 0
+    while not stop_event.is_set():
+        for message in status_feed.since(last_seq, timeout=0.2):
+            last_seq = message['seq']
+            if message.get('status') == 'prediction':
+                decisions.append(message)
+
+
+def match_receipts(decisions, received):
+    """Stamp each decision with the time its command reached the client, in order"""
+    j = 0
+    matched = 0
+    for decision in decisions:
+        expected = "1" if decision['prediction'].upper() == 'GO' else "0"
+        dispatch = decision['timing']['dispatch']
+        while j < len(received) and received[j][0] < dispatch:
+            j += 1
+        if j < len(received) and received[j][1] == expected:
+            decision['timing']['receipt'] = received[j][0]
+            matched += 1
+            j += 1
+    return matched
+
+
+def switch_latency(timeline, received, since, until):
+    """Per label, delay from each segment start on the wire to the first matching command,
+    over the segments that started and ended between since and until"""
+    commands = {'GO': "1", 'STOP': "0"}
+    trackers = {label: LatencyTracker() for label in commands}
+    missed = {label: 0 for label in commands}
+    for index, (start, _, label) in enumerate(timeline):
+        end = timeline[index + 1][0] if index + 1 < len(timeline) else float('inf')
+        if label not in commands or start < since or end > until:
+            continue
+        hit = next((t for t, message in received if start <= t < end and message == commands[label]), None)
+        if hit is None:
+            missed[label] += 1
+        else:
+            trackers[label].add(hit - start)
+    return {label: {**trackers[label].summary(), "missed": missed[label]} for label in commands}
+
+
+def run_config(app, server, bundle, config, seconds):
+    app.SAMPLE_FORMAT = config['format']
+    app.N_CHANNELS = config['channels']
+    simulator = EmgSimulator(config['rate'], config['channels'], config['format'], config['script'], seed=7)
+    device = PtyDevice(simulator).start()
+    session = app.sessions.create(device.path, session_id='bench')
+    session.model.swap(bundle)
+    client = CommandClient(f'ws://127.0.0.1:{server.port}/sessions/bench')
+
+    decisions = []
+    stop_collecting = threading.Event()
+    collector = threading.Thread(target=collect, args=(session.status_feed, stop_collecting, decisions), daemon=True)
+    collector.start()
+    hop = config['hop'] if config['mode'] == 'streaming' else None
+    session.start_inference(window_seconds=config['window'], hop_seconds=hop)
+    time.sleep(STARTUP_SECONDS)
+    started = time.time()
+    time.sleep(seconds)
+    elapsed = time.time() - started
+
+    app.sessions.remove('bench', timeout=5.0)
+    time.sleep(0.3)  # last commands in flight
+    stop_collecting.set()
+    collector.join()
+    client.close()
+    device.close()
+
+    decisions = [d for d in decisions if d['timing'].get('arrival') and d['timing']['predict'] >= started]
+    matched = match_receipts(decisions, client.received)
+    trackers = {stage: LatencyTracker() for stage in STAGES}
+    for decision in decisions:
+        timing = decision['timing']
+        for stage, begin, end in STAGE_BOUNDS:
+            if begin in timing and end in timing:
+                trackers[stage].add(timing[end] - timing[begin])
+    samples_per_s = 0.0
+    if len(decisions) > 1:
+        span = decisions[-1]['timing']['read'] - decisions[0]['timing']['read']
+        samples_per_s = (decisions[-1]['buffer']['written'] - decisions[0]['buffer']['written']) / span
+    return {
+        "config": config,
+        "seconds": elapsed,
+        "decisions": len(decisions),
+        "decisions_per_s": len(decisions) / elapsed,
+        "samples_per_s": samples_per_s,
+        "dropped_at_device": simulator.dropped,
+        "unmatched": len(decisions) - matched,
+        "stages": {stage: tracker.summary() for stage, tracker in trackers.items()},
+        "switch": switch_latency(simulator.timeline, client.received, started, started + elapsed)
+    }
+
+
+def print_result(result):
+    config = result['config']
+    print(f"\n{config['mode']} {config['rate']} Hz x {config['channels']} ch {config['format']}, "
+          f"window {config['window']} s" + (f", hop {config['hop']} s" if config['mode'] == 'streaming' else ''))
+    print(f"  {result['decisions']} decisions ({result['decisions_per_s']:.1f}/s), "
+          f"{result['samples_per_s']:,.0f} samples/s, {result['unmatched']} not delivered")
+    print(f"  {'stage':<9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for stage, summary in result['stages'].items():
+        if summary['count']:
+            print(f"  {stage:<9} {summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f} "
+                  f"{summary['p99_ms']:8.2f} {summary['max_ms']:8.2f}")
+    for label, summary in result['switch'].items():
+        if summary['count']:
+            print(f"  switch to {label:<4} p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, "
+                  f"{summary['missed']} missed of {summary['count'] + summary['missed']}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {json.dumps(r['config'], sort_keys=True): r for r in baseline['results']}
+    print(f"\nAgainst {baseline_path} (commit {baseline.get('commit')}):")
+    for result in results:
+        old = previous.get(json.dumps(result['config'], sort_keys=True))
+        if old is None:
+            continue
+        config = result['config']
+        print(f"  {config['mode']} {config['rate']} Hz x {config['channels']} ch {config['format']}:")
+        for stage in STAGES:
+            new, before = result['stages'][stage], old['stages'].get(stage, {})
+            if not new.get('count') or not before.get('count'):
+                continue
+            changes = [f"{key[:-3]} {before[key]:.2f} -> {new[key]:.2f} ms ({(new[key] / before[key] - 1) * 100:+.0f}%)"
+                       for key in ('p50_ms', 'p99_ms') if before[key] > 0]
+            print(f"    {stage:<9} " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', default='1000', help='comma separated sample rates')
+    parser.add_argument('--channels', default='2', help='comma separated channel counts')
+    parser.add_argument('--formats', default='ascii', help='ascii, binary or both')
+    parser.add_argument('--modes', default='streaming,block', help='streaming, block or both')
+    parser.add_argument('--windows', default='1.0', help='comma separated window lengths in seconds')
+    parser.add_argument('--hops', default='0.05', help='comma separated hops in seconds (streaming only)')
+    parser.add_argument('--script', default='GO:2,STOP:2', help='simulated segments, see emg_simulator.py')
+    parser.add_argument('--seconds', type=float, default=10.0, help='measured time per configuration')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    def values(text, kind=str):
+        return [kind(value) for value in text.split(',')]
+
+    configs = []
+    for rate, channels, sample_format, mode, window in itertools.product(
+            values(args.rates, int), values(args.channels, int), values(args.formats),
+            values(args.modes), values(args.windows, float)):
+        for hop in values(args.hops, float) if mode == 'streaming' else [None]:
+            configs.append({"rate": rate, "channels": channels, "format": sample_format, "mode": mode,
+                            "window": window, "hop": hop, "script": args.script})
+
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    output_path = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='bench_latency_')
+    os.chdir(workdir)
+    import app
+    from bench_sessions import train_model
+    from model_registry import load_bundle
+
+    server = WebSocketServer(app)
+    bundles = {}
+    results = []
+    for config in configs:
+        key = (config['rate'], config['channels'])
+        if key not in bundles:
+            print(f"Training a model for {key[0]} Hz x {key[1]} ch in {workdir}...")
+            train_model(key[0], key[1], model_name=f'bench_{key[0]}_{key[1]}')
+            bundles[key] = load_bundle(f'bench_{key[0]}_{key[1]}')
+        result = run_config(app, server, bundles[key], config, args.seconds)
+        print_result(result)
+        results.append(result)
+
+    report = {"commit": _commit(), "created": time.time(), "platform": platform.platform(),
+              "python": platform.python_version(), "results": results}
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output_path}")
+    if compare_path:
+        compare(results, compare_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Parity and latency of the exported LeanPredictor against PyCaret's predict_model.
+
+Trains a few models on window features of a recorded session file, exports each one and
+checks that both paths predict the same labels on every window. Run from test/backend:
+    python bench_predictor.py ../../ndata.csv --models lr,rf,et
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from features import FeatureExtractor, emg_signals, estimate_sample_rate
+from predictor import export_predictor
+from unmixing import FixedUnmixing
+
+
+def load_windows(path):
+    """Window features of every label segment in a recording CSV"""
+    df = pd.read_csv(path)
+    raw_columns = [col for col in df.columns if col.startswith('Raw_EMG')]
+    unmixing = FixedUnmixing.fit(df[raw_columns].to_numpy())
+    signal_names = raw_columns + [f'IC{i + 1}' for i in range(len(raw_columns))]
+
+    frames = []
+    segments = (df['Label'] != df['Label'].shift()).cumsum()
+    extractor = None
+    for _, segment in df.groupby(segments):
+        if extractor is None:
+            extractor = FeatureExtractor.for_rate(estimate_sample_rate(segment['Timestamp']), signal_names)
+        signals = emg_signals(segment[raw_columns].to_numpy(), unmixing)
+        features = pd.DataFrame(extractor.window_features(signals), columns=extractor.feature_names())
+        features['Label'] = segment['Label'].iloc[0]
+        frames.append(features)
+    return pd.concat(frames, ignore_index=True), extractor
+
+
+def time_per_call(fn, rows, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        fn(rows[i % len(rows)])
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv')
+    parser.add_argument('--models', default='lr,rf,et')
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    from pycaret.classification import setup, create_model, finalize_model, predict_model
+
+    data, extractor = load_windows(args.csv)
+    names = extractor.feature_names()
+    print(f"{len(data)} windows x {len(names)} features from {args.csv}")
+    setup(data=data, target='Label', verbose=False, fold=3, normalize=True, session_id=123, html=False)
+
+    X = data[names]
+    rows = X.to_numpy()
+    for model_id in args.models.split(','):
+        pipeline = finalize_model(create_model(model_id, verbose=False))
+        lean = export_predictor(pipeline, names)
+
+        expected = predict_model(pipeline, data=X, verbose=False)['prediction_label'].to_numpy()
+        labels, _ = lean.predict(rows)
+        parity = np.mean(labels == expected)
+
+        pycaret_ms = time_per_call(
+            lambda row: predict_model(pipeline, data=pd.DataFrame([row], columns=names), verbose=False),
+            rows, max(1, args.repeats // 10)) * 1000
+        lean_ms = time_per_call(lean.predict, rows, args.repeats) * 1000
+        print(f"{model_id:<6} parity {parity:7.2%}   predict_model {pycaret_ms:8.3f} ms   "
+              f"lean {lean_ms:7.3f} ms   speedup {pycaret_ms / lean_ms:6.0f}x")
+
+
+if __name__ == '__main__':
+    main()
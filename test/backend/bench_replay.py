@@ -0,0 +1,155 @@
+"""Soak test and throughput ceiling of the backend, replaying a recorded session.
+
+For each speed the recording is looped through a backend session as replay://
+(replay_source.py) with a model loaded and a WebSocket client playing the ESP32, so
+everything from the acquisition thread to the "1"/"0" on the socket is the live code.
+Per speed we report the speed actually achieved, decisions against the number the hop
+asks for, ring buffer overruns, commands delivered and decision latency. A speed is
+sustained when the replay kept its pace, no samples were overrun and every decision was
+made; the highest sustained speed is the throughput ceiling. "max" replays as fast as
+the pipeline consumes the samples and reports that rate.
+
+Run from test/backend:
+    python bench_replay.py nbest data_go.rec --speeds 1,10,100,max --seconds 20
+    python bench_replay.py nbest data_go.rec --speeds 1 --seconds 14400 --progress 60   # 4 h soak
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from bench_latency import WebSocketServer, CommandClient, collect, match_receipts, _commit
+from metrics import LatencyTracker
+
+STARTUP_TIMEOUT = 30
+SUSTAINED_PACE = 0.95  # fraction of the requested speed the replay has to keep
+
+
+def run_speed(app, server, bundle, recording, speed, seconds, window, hop, progress=None):
+    url = f"replay://{recording}?speed={speed}&loop=1"
+    session = app.sessions.create(url, session_id='replay')
+    session.model.swap(bundle)
+    client = CommandClient(f'ws://127.0.0.1:{server.port}/sessions/replay')
+
+    decisions = []
+    stop_collecting = threading.Event()
+    collector = threading.Thread(target=collect, args=(session.status_feed, stop_collecting, decisions), daemon=True)
+    collector.start()
+    session.start_inference(window_seconds=window, hop_seconds=hop)
+    # Measure from the first decision, once the window has filled
+    deadline = time.time() + STARTUP_TIMEOUT
+    while not decisions and session.busy() and time.time() < deadline:
+        time.sleep(0.01)
+    source = session.metrics.source
+    buffer = session.metrics.buffer
+    started = time.time()
+    samples_at_start = source.samples_read
+    overruns_at_start = buffer.overruns
+    consumed_at_start = buffer.read_index
+    next_report = started + progress if progress else float('inf')
+    while time.time() - started < seconds and session.busy():
+        time.sleep(min(0.5, max(0.0, seconds - (time.time() - started))))
+        if time.time() >= next_report:
+            next_report += progress
+            elapsed = time.time() - started
+            print(f"  {elapsed:7.0f} s: {len(decisions)} decisions, {buffer.overruns - overruns_at_start} overruns, "
+                  f"{len(client.received)} commands, {(source.samples_read - samples_at_start) / source.sample_rate / elapsed:.1f}x")
+    elapsed = time.time() - started
+    signal_seconds = (source.samples_read - samples_at_start) / source.sample_rate
+    overruns = buffer.overruns - overruns_at_start
+    consumed_seconds = (buffer.read_index - consumed_at_start) / source.sample_rate
+
+    app.sessions.remove('replay', timeout=5.0)
+    time.sleep(0.3)  # last commands in flight
+    stop_collecting.set()
+    collector.join()
+    client.close()
+
+    decisions = [d for d in decisions if d['timing'].get('arrival') and d['timing']['read'] >= started]
+    matched = match_receipts(decisions, client.received)
+    decision_latency = LatencyTracker()
+    delivery = LatencyTracker()
+    for decision in decisions:
+        timing = decision['timing']
+        decision_latency.add(timing['dispatch'] - timing['arrival'])
+        if 'receipt' in timing:
+            delivery.add(timing['receipt'] - timing['arrival'])
+    # One decision per hop (or window) of the samples inference took off the buffer
+    expected = int(consumed_seconds / (hop or window))
+    achieved = signal_seconds / elapsed
+    return {
+        "speed": speed,
+        "seconds": elapsed,
+        "signal_seconds": signal_seconds,
+        "achieved_speed": achieved,
+        "samples_per_s": signal_seconds * source.sample_rate / elapsed,
+        "passes": source.passes,
+        "decisions": len(decisions),
+        "expected_decisions": expected,
+        "decisions_per_s": len(decisions) / elapsed,
+        "overruns": overruns,
+        "delivered": matched,
+        "decision_latency": decision_latency.summary(),
+        "delivery_latency": delivery.summary(),
+        # A replay at max speed sets its own pace
+        "sustained": (speed == 'max' or achieved >= SUSTAINED_PACE * float(speed))
+                     and overruns == 0 and len(decisions) >= SUSTAINED_PACE * expected,
+    }
+
+
+def print_result(result):
+    latency = result['decision_latency']
+    delivery = result['delivery_latency']
+    print(f"speed {result['speed']:>5}: {result['achieved_speed']:7.1f}x achieved, "
+          f"{result['samples_per_s']:>10,.0f} samples/s, {result['decisions']}/{result['expected_decisions']} decisions "
+          f"({result['decisions_per_s']:.0f}/s), {result['overruns']} overruns, {result['delivered']} delivered"
+          + (f", decision p50 {latency['p50_ms']:.1f} / p99 {latency['p99_ms']:.1f} ms" if latency['count'] else '')
+          + (f", delivery p99 {delivery['p99_ms']:.1f} ms" if delivery['count'] else '')
+          + ('' if result['sustained'] else '  NOT SUSTAINED'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', help='model name, e.g. nbest')
+    parser.add_argument('recording', help='.rec folder or CSV to replay, looped')
+    parser.add_argument('--speeds', default='1,10,100,max', help='comma separated speeds, "max" for unpaced')
+    parser.add_argument('--seconds', type=float, default=20.0, help='wall time per speed')
+    parser.add_argument('--window', type=float, default=1.0, help='window in seconds of signal')
+    parser.add_argument('--hop', type=float, default=0.05, help='hop in seconds of signal, 0 for block inference')
+    parser.add_argument('--progress', type=float, help='print running totals every this many seconds')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    from model_registry import load_bundle
+    bundle = load_bundle(args.model)
+    recording = os.path.abspath(args.recording)
+    output_path = os.path.abspath(args.output) if args.output else None
+    # app.py keeps its catalog and model registry in the working directory
+    os.chdir(tempfile.mkdtemp(prefix='bench_replay_'))
+    import app
+
+    server = WebSocketServer(app)
+    results = []
+    for speed in args.speeds.split(','):
+        result = run_speed(app, server, bundle, recording, speed, args.seconds, args.window, args.hop or None,
+                           args.progress)
+        print_result(result)
+        results.append(result)
+
+    sustained = [result for result in results if result['sustained']]
+    if sustained:
+        best = max(sustained, key=lambda result: result['achieved_speed'])
+        print(f"\nHighest sustained: {best['achieved_speed']:.1f}x real time, {best['samples_per_s']:,.0f} samples/s")
+    else:
+        print("\nNo speed was sustained")
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump({"commit": _commit(), "model": args.model, "recording": args.recording,
+                       "window": args.window, "hop": args.hop, "results": results}, f, indent=2)
+        print(f"Results written to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Throughput benchmark for the serial sample readers against a pty backed fake device.
+
+Run from test/backend:
+    python bench_serial.py --samples 200000 --channels 2
+"""
+import argparse
+import os
+import pty
+import threading
+import time
+import tty
+
+import numpy as np
+import serial
+
+from serial_source import SerialSampleSource, make_decoder, encode_ascii, encode_frames
+
+
+def open_fake_device():
+    """Open a pty pair and return (master_fd, slave_fd, slave_path)"""
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    return master_fd, slave_fd, os.ttyname(slave_fd)
+
+
+def feed_device(master_fd, payload, block_size=4096):
+    """Write the payload to the device side of the pty as fast as the reader drains it"""
+    view = memoryview(payload)
+    for offset in range(0, len(view), block_size):
+        os.write(master_fd, view[offset:offset + block_size])
+
+
+def read_legacy(ser, n_samples, n_channels):
+    """The original readline/decode/split/int loop used by app.py and the Nyan_AI scripts"""
+    samples = []
+    while len(samples) < n_samples:
+        try:
+            line = ser.readline().decode('utf-8', errors='ignore').strip()
+            if line:
+                values = line.split(',')
+                if len(values) == n_channels:
+                    samples.append([int(v) for v in values])
+        except (ValueError, UnicodeDecodeError):
+            continue
+    return samples
+
+
+def read_chunked(ser, n_samples, sample_format, n_channels):
+    """Bulk chunked reading through SerialSampleSource"""
+    source = SerialSampleSource(ser, make_decoder(sample_format, n_channels))
+    return source.read_samples(n_samples)
+
+
+def run_case(name, payload, reader, n_samples):
+    master_fd, slave_fd, slave_path = open_fake_device()
+    ser = serial.Serial(slave_path, baudrate=115200, timeout=1)
+    writer = threading.Thread(target=feed_device, args=(master_fd, payload), daemon=True)
+    try:
+        start = time.perf_counter()
+        writer.start()
+        samples = reader(ser)
+        elapsed = time.perf_counter() - start
+    finally:
+        ser.close()
+        os.close(master_fd)
+        os.close(slave_fd)
+    print(f"{name:<28} {len(samples):>9} samples  {elapsed:8.3f} s  {n_samples / elapsed:12,.0f} samples/s")
+    return n_samples / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=200000)
+    parser.add_argument('--channels', type=int, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(123)
+    data = rng.integers(0, 1024, size=(args.samples, args.channels))
+    ascii_payload = encode_ascii(data)
+    binary_payload = encode_frames(data)
+    print(f"ASCII payload {len(ascii_payload):,} bytes, binary payload {len(binary_payload):,} bytes")
+
+    legacy = run_case('ascii readline (legacy)', ascii_payload,
+                      lambda ser: read_legacy(ser, args.samples, args.channels), args.samples)
+    chunked = run_case('ascii chunked', ascii_payload,
+                       lambda ser: read_chunked(ser, args.samples, 'ascii', args.channels), args.samples)
+    binary = run_case('binary frames chunked', binary_payload,
+                      lambda ser: read_chunked(ser, args.samples, 'binary', args.channels), args.samples)
+
+    print(f"ascii chunked speedup: {chunked / legacy:.1f}x, binary speedup: {binary / legacy:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Load test: several simulated amplifiers (emg_simulator.py) served by one backend process.
+
+Trains a small model on synthetic recordings in a scratch folder, opens one session per
+fake device, runs streaming inference on all of them at once (optionally recording on
+one more), and reports decisions, decision latency and ring buffer overruns per session.
+
+Run from test/backend:
+    python bench_sessions.py --devices 4 --rate 1000 --seconds 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from emg_simulator import EmgSimulator, PtyDevice, synthetic_emg
+
+
+def train_model(rate, n_channels, model_name='bench'):
+    """Train model_name on synthetic GO/STOP recordings in the working directory"""
+    from recording_store import write_recording
+    from training import train_model_with_features
+
+    rng = np.random.default_rng(123)
+    for label in ('GO', 'STOP'):
+        write_recording(f'data_{label.lower()}', synthetic_emg(rng, rate * 15, n_channels, label),
+                        sample_rate=rate, label=label)
+    if not train_model_with_features(model_name=model_name, candidates=['lr']):
+        raise RuntimeError("Training the benchmark model failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=4)
+    parser.add_argument('--rate', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--hop-ms', type=float, default=50)
+    parser.add_argument('--record', action='store_true', help='also record on one extra device meanwhile')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_sessions_')
+    os.chdir(workdir)
+    import app
+    from model_registry import load_bundle
+    from session_manager import SessionManager
+
+    print(f"Training benchmark model in {workdir}...")
+    train_model(args.rate, app.N_CHANNELS)
+    bundle = load_bundle('bench')
+
+    manager = SessionManager(app.record_emg_data, app.inference_loop)
+    devices = []
+    for index in range(args.devices + (1 if args.record else 0)):
+        simulator = EmgSimulator(args.rate, app.N_CHANNELS, app.SAMPLE_FORMAT, 'GO:2,STOP:2', seed=index)
+        device = PtyDevice(simulator).start()
+        devices.append(device)
+        session = manager.create(device.path, session_id=f'dev{index}')
+        if args.record and index == args.devices:
+            session.start_recording('GO', duration=args.seconds)
+        else:
+            session.model.swap(bundle)
+            session.start_inference(window_seconds=1.0, hop_seconds=args.hop_ms / 1000)
+
+    cpu_start = time.process_time()
+    time.sleep(args.seconds + 2)  # inference_loop waits 2 s after opening the port
+    cpu = time.process_time() - cpu_start
+    manager.stop_all(timeout=5.0)
+    for device in devices:
+        device.stop()
+
+    print(f"\n{args.devices} device(s) at {args.rate} Hz x {app.N_CHANNELS} ch, hop {args.hop_ms:.0f} ms, "
+          f"{args.seconds:.0f} s")
+    print(f"{'session':<8} {'decisions':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'samples':>9} {'overruns':>8}")
+    for session in manager.list():
+        messages = session.status_feed.since(0, timeout=0)
+        decisions = [m for m in messages if m.get('status') == 'prediction']
+        if session.mode == 'recording':
+            errors = [m for m in messages if m.get('status') == 'error']
+            print(f"{session.id:<8} recording, {'failed: ' + errors[-1]['message'] if errors else 'saved'}")
+            continue
+        if not decisions:
+            errors = [m.get('message') for m in messages if m.get('status') == 'error']
+            print(f"{session.id:<8} no decisions {errors[-1:] or ''}")
+            continue
+        latency = decisions[-1]['latency']
+        buffer = decisions[-1]['buffer']
+        # The feed keeps a bounded history, the latency tracker counts every decision
+        print(f"{session.id:<8} {latency['count']:>9} {latency['p50_ms']:>8.2f} {latency['p95_ms']:>8.2f} "
+              f"{latency['p99_ms']:>8.2f} {buffer['written']:>9} {buffer['overruns']:>8}")
+    print(f"process CPU {cpu / (args.seconds + 2) * 100:.0f}% of one core")
+
+    for device in devices:
+        device.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Time from process start to the first prediction, and where it goes.
+
+Starts each entry point in a fresh process against a simulated amplifier
+(emg_simulator.py on a pty) and collects the startup breakdown it prints (startup.py):
+
+    infrence.py, integrated_subvocal_car.py   the notebook model, voted over a window of samples
+    app.py                                    imports the backend and runs inference_loop
+                                              until its first decision
+
+once with the exported predictor (<model>_predictor.pkl) and, for the notebook model,
+once with only the PyCaret pipeline. The models are set up in a temporary folder: Nyan_AI/nbest.pkl with an
+unmixing fitted on ndata.csv, and a backend model trained on synthetic recordings.
+
+"port" waits out the board reset (PORT_SETTLE_SECONDS) and "first window" the first
+window of samples, neither of which depends on the software; the rest does.
+
+Run from test/backend:
+    python bench_startup.py --repeats 3
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from startup import StartupTimer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NYAN_AI = os.path.join(HERE, '..', '..', 'Nyan_AI')
+SCRIPTS = {'infrence.py': 'legacy', 'integrated_subvocal_car.py': 'legacy', 'app.py': 'backend'}
+# Training always exports the backend's predictor, its pipeline is never loaded on its own
+MODELS = {'legacy': ('lean', 'pycaret'), 'backend': ('lean',)}
+WAITING = ('port', 'first window')
+STEP = re.compile(r'([a-z ]+) ([0-9.]+) s')
+
+
+class _StepWatcher:
+    """stdout of the app.py child, marking the model and port steps as inference_loop logs them"""
+
+    def __init__(self, timer, stream):
+        self.timer = timer
+        self.stream = stream
+        self.connected = None
+
+    def write(self, text):
+        if text.startswith('Connecting to port'):
+            self.connected = time.time()
+        elif text.startswith('Model ready in'):
+            # "Model ready in X s, port in Y s", both counted from the port being opened
+            model_seconds, port_seconds = (float(seconds) for _, seconds in STEP.findall(text))
+            self.timer.mark('model', at=self.connected + model_seconds)
+            self.timer.mark('port', at=self.connected + port_seconds)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def child_app(port):
+    """Entry point of the app.py measurement, in its own process"""
+    timer = StartupTimer('app.py')
+    import app
+    timer.mark('imports')
+    sys.stdout = _StepWatcher(timer, sys.stdout)
+    stop = threading.Event()
+    feed = app.StatusFeed()
+    threading.Thread(target=app.inference_loop, args=(port, feed, stop), daemon=True).start()
+    seq = 0
+    prediction = None
+    while prediction is None:
+        messages = feed.since(seq, timeout=30)
+        if not messages:
+            raise RuntimeError("No prediction within 30 s")
+        seq = messages[-1]['seq']
+        prediction = next((message for message in messages if message.get('status') == 'prediction'), None)
+        if prediction is None and any(message.get('status') == 'error' for message in messages):
+            raise RuntimeError(messages[-1]['message'])
+    sys.stdout = sys.stdout.stream
+    # The first window has been read when the decision's timing starts
+    timer.mark('first window', at=prediction['timing']['read'])
+    timer.mark('first prediction')
+    timer.report()
+    stop.set()
+
+
+def set_up(workdir):
+    """Notebook and backend models with their exported predictors, in two folders"""
+    import numpy as np
+    import pandas as pd
+    from pycaret.classification import load_model
+    from bench_sessions import train_model
+    from predictor import export_predictor
+    from unmixing import FixedUnmixing
+
+    legacy = os.path.join(workdir, 'legacy')
+    backend = os.path.join(workdir, 'backend')
+    os.makedirs(legacy)
+    os.makedirs(backend)
+    shutil.copy(os.path.join(NYAN_AI, 'nbest.pkl'), legacy)
+    raw = pd.read_csv(os.path.join(NYAN_AI, 'ndata.csv'))[['Raw_EMG']].to_numpy(dtype=np.float64)
+    FixedUnmixing.fit(raw).save(os.path.join(legacy, 'nbest'))
+    pipeline = load_model(os.path.join(legacy, 'nbest'), verbose=False)
+    export_predictor(pipeline, list(pipeline.feature_names_in_[:-1])).save(os.path.join(legacy, 'nbest'))
+
+    cwd = os.getcwd()
+    os.chdir(backend)
+    try:
+        train_model(1000, 2, model_name='nbest')
+    finally:
+        os.chdir(cwd)
+    return {'legacy': legacy, 'backend': backend}
+
+
+def measure(script, folder, port):
+    """Steps and total of one start up, as reported by the process"""
+    if script == 'app.py':
+        command = [sys.executable, os.path.abspath(__file__), '--child-app', port]
+    else:
+        command = [sys.executable, os.path.join(NYAN_AI, script), port]
+    process = subprocess.Popen(command, cwd=folder, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                               env={**os.environ, 'PYTHONUNBUFFERED': '1', 'PYTHONWARNINGS': 'ignore'})
+    try:
+        for line in process.stdout:
+            if line.startswith('Startup of'):
+                steps = dict((step.strip(), float(seconds))
+                             for step, seconds in STEP.findall(line.split(':', 1)[1].split('=')[0]))
+                return steps, float(line.rsplit('=', 1)[1].split()[0])
+        raise RuntimeError(f"{script} exited without a prediction")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scripts', default=','.join(SCRIPTS), help='comma separated entry points')
+    parser.add_argument('--repeats', type=int, default=1, help='start ups per configuration, the best is kept')
+    parser.add_argument('--child-app', metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child_app:
+        child_app(args.child_app)
+        return
+
+    from emg_simulator import EmgSimulator, PtyDevice
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    print(f"Setting up the models in {workdir}...")
+    folders = set_up(workdir)
+    devices = {
+        'legacy': PtyDevice(EmgSimulator(1000, 1, 'ascii', 'YES:2,NO:2', seed=1)).start(),
+        'backend': PtyDevice(EmgSimulator(1000, 2, 'ascii', 'GO:2,STOP:2', seed=1)).start(),
+    }
+    print(f"\n{'entry point':<28} {'model':<8} {'total s':>8} {'software s':>11}  steps")
+    for script in args.scripts.split(','):
+        kind = SCRIPTS[script]
+        predictor = os.path.join(folders[kind], 'nbest_predictor.pkl')
+        for model in MODELS[kind]:
+            if model == 'pycaret':
+                os.rename(predictor, predictor + '.off')
+            try:
+                runs = [measure(script, folders[kind], devices[kind].path) for _ in range(args.repeats)]
+            finally:
+                if model == 'pycaret':
+                    os.rename(predictor + '.off', predictor)
+            steps, total = min(runs, key=lambda run: run[1])
+            software = total - sum(steps.get(step, 0.0) for step in WAITING)
+            print(f"{script:<28} {model:<8} {total:8.2f} {software:11.2f}  "
+                  + ', '.join(f"{step} {seconds:.2f}" for step, seconds in steps.items()))
+    for device in devices.values():
+        device.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Per-window cost of refitting FastICA versus applying the fixed calibration unmixing.
+
+Run from test/backend:
+    python bench_unmixing.py --windows 200 --window-samples 1000
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+from sklearn.decomposition import FastICA
+
+from unmixing import FixedUnmixing
+
+
+def time_per_window(fn, windows):
+    start = time.perf_counter()
+    for window in windows:
+        fn(window)
+    return (time.perf_counter() - start) / len(windows)
+
+
+def refit_ica(window):
+    """What the inference loops used to do on every window"""
+    ica = FastICA(n_components=window.shape[1])
+    independent_components = ica.fit_transform(window)
+    independent_components -= np.mean(independent_components, axis=0)
+    return independent_components
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--windows', type=int, default=200)
+    parser.add_argument('--window-samples', type=int, default=1000)
+    parser.add_argument('--channels', type=int, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(123)
+    mixing = rng.normal(size=(args.channels, args.channels))
+    sources = rng.laplace(size=(args.windows * args.window_samples, args.channels))
+    raw = (sources @ mixing.T * 100 + 500).astype(np.int32)
+    windows = raw.reshape(args.windows, args.window_samples, args.channels)
+
+    unmixing = FixedUnmixing.fit(raw)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        before = time_per_window(refit_ica, windows)
+    after = time_per_window(unmixing.transform, windows)
+
+    print(f"FastICA fit_transform per window: {before * 1000:8.3f} ms")
+    print(f"Fixed unmixing per window:        {after * 1000:8.3f} ms")
+    print(f"Speedup: {before / after:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Broadcast to WebSocket clients without letting one slow client hold up the rest.
+
+Every client gets its own bounded outbound queue drained by its own writer task, so
+broadcast() never awaits a socket. Control messages are state ("1"/"0"), so by default a
+client that falls behind only gets the latest one (coalesce); drop_oldest keeps up to
+queue_size messages instead. A send that doesn't finish within send_timeout evicts the
+client.
+"""
+import asyncio
+import time
+from collections import deque
+
+import websockets
+
+from metrics import Histogram
+
+POLICIES = ('coalesce', 'drop_oldest')
+
+
+class _Client:
+    def __init__(self, websocket, queue_size):
+        self.websocket = websocket
+        self.pending = deque(maxlen=queue_size)
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+
+class BroadcastHub:
+    def __init__(self, queue_size=8, policy='coalesce', send_timeout=1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {POLICIES}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._clients = {}
+        self.stats = {"broadcasts": 0, "sent": 0, "dropped": 0, "coalesced": 0, "evicted": 0}
+        # From broadcast() until the client's send completed, queueing included
+        self.send_latency = Histogram()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def register(self, websocket):
+        """Start delivering broadcasts to a client, must be called on the event loop"""
+        client = _Client(websocket, self.queue_size)
+        client.task = asyncio.get_running_loop().create_task(self._writer(client))
+        self._clients[websocket] = client
+
+    def unregister(self, websocket):
+        client = self._clients.pop(websocket, None)
+        if client is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def broadcast(self, message):
+        """Queue message for every client without waiting on any socket"""
+        self.stats["broadcasts"] += 1
+        # Iterate over a snapshot, clients may come and go while we queue
+        for client in list(self._clients.values()):
+            if self.policy == 'coalesce' and client.pending:
+                self.stats["coalesced"] += len(client.pending)
+                client.pending.clear()
+            elif len(client.pending) == self.queue_size:
+                self.stats["dropped"] += 1
+            client.pending.append((message, time.perf_counter()))
+            client.wakeup.set()
+
+    async def _writer(self, client):
+        websocket = client.websocket
+        try:
+            while True:
+                while not client.pending:
+                    client.wakeup.clear()
+                    await client.wakeup.wait()
+                message, queued = client.pending.popleft()
+                await asyncio.wait_for(websocket.send(message), self.send_timeout)
+                self.send_latency.observe(time.perf_counter() - queued)
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.TimeoutError, websockets.ConnectionClosed, OSError) as e:
+            print(f"Evicting client {getattr(websocket, 'remote_address', '')}: {e!r}")
+            self.stats["evicted"] += 1
+            self.unregister(websocket)
+            close = getattr(websocket, 'close', None)
+            if close is not None:
+                try:
+                    await asyncio.wait_for(close(), self.send_timeout)
+                except Exception:
+                    pass
+
+    def summary(self):
+        return {"clients": len(self._clients), **self.stats}
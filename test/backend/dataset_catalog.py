@@ -0,0 +1,216 @@
+"""SQLite index of recording sessions.
+
+Every recording (.rec folder or CSV) gets a row with its user, label, sample rate,
+channel count, duration, recording time and checksum, so a training set can be picked
+with a query ("GO and STOP for user nyan from the last week") instead of globbing and
+opening every file. Files are only read when they are new or have changed.
+
+    python dataset_catalog.py scan "../../Director's_AI" --user zj
+    python dataset_catalog.py query --user zj --label YES --days 7
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from recording_store import RECORDING_SUFFIX, Recording
+
+DEFAULT_CATALOG = 'sessions.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    path TEXT PRIMARY KEY,
+    session_id TEXT,
+    user TEXT,
+    label TEXT,
+    sample_rate REAL,
+    n_channels INTEGER,
+    n_samples INTEGER,
+    duration REAL,
+    recorded_at REAL,
+    checksum TEXT,
+    size INTEGER,
+    mtime REAL,
+    indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_user_label_time ON sessions (user, label, recorded_at);
+CREATE INDEX IF NOT EXISTS sessions_label_time ON sessions (label, recorded_at);
+"""
+
+
+def _data_file(path):
+    """The file whose bytes identify a recording"""
+    return os.path.join(path, 'raw.npy') if path.endswith(RECORDING_SUFFIX) else path
+
+
+def file_checksum(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(_data_file(path), 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe(path, user=None):
+    """Catalog row for one recording, reading only its metadata where possible"""
+    stat = os.stat(_data_file(path))
+    if path.endswith(RECORDING_SUFFIX):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        sample_rate = meta['sample_rate']
+        n_samples = meta['n_samples']
+        n_channels = len(meta['channels'])
+        label = meta.get('label')
+        session_id = meta.get('session_id')
+        recorded_at = meta.get('created', stat.st_mtime)
+        user = user or meta.get('user')
+    else:
+        import pandas as pd
+        df = pd.read_csv(path)
+        if 'Label' in df and df['Label'].nunique() > 1:
+            raise ValueError(f"{path} holds several labels, split it with recording_store.py first")
+        session = Recording.from_frame(df)
+        sample_rate = session.sample_rate
+        n_samples = len(session)
+        n_channels = session.n_channels
+        label = session.label
+        session_id = None
+        recorded_at = stat.st_mtime
+
+    return {
+        "path": os.path.abspath(path),
+        "session_id": session_id,
+        "user": user,
+        "label": label,
+        "sample_rate": sample_rate,
+        "n_channels": n_channels,
+        "n_samples": n_samples,
+        "duration": n_samples / sample_rate if sample_rate else None,
+        "recorded_at": recorded_at,
+        "checksum": file_checksum(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "indexed_at": time.time(),
+    }
+
+
+class DatasetCatalog:
+    def __init__(self, db_path=DEFAULT_CATALOG):
+        self.db_path = db_path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # One connection per call, recording and request threads share the catalog
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def add(self, path, user=None):
+        """Index one recording, replacing its previous row"""
+        row = describe(path.rstrip('/'), user)
+        columns = ', '.join(row)
+        placeholders = ', '.join(f':{key}' for key in row)
+        with self._connect() as db:
+            db.execute(f"INSERT OR REPLACE INTO sessions ({columns}) VALUES ({placeholders})", row)
+        return row
+
+    def scan(self, root='.', pattern='*', user=None, recursive=False):
+        """Index new or changed recordings under root, returns how many were (re)indexed"""
+        prefix = os.path.join(root, '**', pattern) if recursive else os.path.join(root, pattern)
+        recordings = glob.glob(prefix + RECORDING_SUFFIX, recursive=recursive)
+        # A converted CSV is the same session as its .rec
+        converted = {path[:-len(RECORDING_SUFFIX)] for path in recordings}
+        paths = [path for path in glob.glob(prefix + '.csv', recursive=recursive) if path[:-4] not in converted]
+        paths += recordings
+        with self._connect() as db:
+            known = {row['path']: (row['size'], row['mtime']) for row in db.execute("SELECT path, size, mtime FROM sessions")}
+
+        indexed = 0
+        for path in paths:
+            stat = os.stat(_data_file(path))
+            if known.get(os.path.abspath(path)) == (stat.st_size, stat.st_mtime):
+                continue
+            try:
+                self.add(path, user)
+                indexed += 1
+            except (ValueError, KeyError, OSError) as e:
+                print(f"Not indexing {path}: {e}")
+        return indexed
+
+    def query(self, user=None, label=None, since=None, until=None, min_duration=None, under=None):
+        """Sessions matching every given filter, oldest first. label may be a list.
+        Recordings without a sample rate are never returned, there's nothing to train on."""
+        clauses, params = ["sample_rate > 0"], []
+        if user is not None:
+            clauses.append("user = ?")
+            params.append(user)
+        if label is not None:
+            labels = [label] if isinstance(label, str) else list(label)
+            clauses.append(f"label IN ({', '.join('?' for _ in labels)})")
+            params.extend(labels)
+        if since is not None:
+            clauses.append("recorded_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("recorded_at < ?")
+            params.append(until)
+        if min_duration is not None:
+            clauses.append("duration >= ?")
+            params.append(min_duration)
+        if under is not None:
+            clauses.append("path LIKE ?")
+            params.append(os.path.join(os.path.abspath(under), '') + '%')
+        where = f"WHERE {' AND '.join(clauses)}"
+        with self._connect() as db:
+            rows = db.execute(f"SELECT * FROM sessions {where} ORDER BY recorded_at", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove_missing(self):
+        """Drop rows whose file is gone, returns how many"""
+        with self._connect() as db:
+            paths = [row['path'] for row in db.execute("SELECT path FROM sessions")]
+            missing = [(path,) for path in paths if not os.path.exists(path)]
+            db.executemany("DELETE FROM sessions WHERE path = ?", missing)
+        return len(missing)
+
+    def verify(self, path):
+        """True if the file still matches the checksum it was indexed with"""
+        with self._connect() as db:
+            row = db.execute("SELECT checksum FROM sessions WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        return row is not None and row['checksum'] == file_checksum(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DEFAULT_CATALOG)
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan = commands.add_parser('scan', help='index the recordings in a folder')
+    scan.add_argument('root', nargs='?', default='.')
+    scan.add_argument('--pattern', default='*')
+    scan.add_argument('--user')
+    scan.add_argument('--recursive', action='store_true')
+    query = commands.add_parser('query', help='list matching sessions')
+    query.add_argument('--user')
+    query.add_argument('--label', action='append')
+    query.add_argument('--days', type=float, help='only sessions from the last DAYS days')
+    commands.add_parser('prune', help='forget sessions whose file is gone')
+    args = parser.parse_args()
+
+    catalog = DatasetCatalog(args.db)
+    if args.command == 'scan':
+        print(f"Indexed {catalog.scan(args.root, args.pattern, args.user, args.recursive)} session(s)")
+    elif args.command == 'query':
+        since = time.time() - args.days * 86400 if args.days else None
+        for row in catalog.query(user=args.user, label=args.label, since=since):
+            print(f"{row['user'] or '-':10} {row['label'] or '-':8} {row['duration'] or 0:8.1f}s "
+                  f"{row['sample_rate'] or 0:8.1f}Hz {row['n_channels']}ch  {row['path']}")
+    else:
+        print(f"Removed {catalog.remove_missing()} missing session(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Decision layer between the classifier and the actuator.
+
+Every window's label and score go through a DecisionStream before they become a
+command, so windows can be shortened for latency without the command flapping:
+
+  smoothing    class probabilities are either averaged exponentially ("ema") or
+               filtered as a hidden state that may change between windows ("bayes").
+               time_constant (s) sets how fast old windows are forgotten or how
+               likely a change is, so the same settings work for any window or hop.
+  hysteresis   the decision only changes once another class's smoothed probability
+               reaches enter, until then the current command holds.
+  dwell        after a change the decision holds for at least min_dwell seconds.
+  stop         changes to stop_label skip the dwell, and a single window with
+               stop_threshold or more on stop_label stops at once, overriding both.
+
+Time is the signal's (samples / sample rate), not the wall clock's, so a replay at any
+speed decides the same as the live session. When the model is swapped mid-run, the new
+model's stream takes over the old one's (stream(previous=...)), so its first window has
+to pass enter and the dwell like any other instead of deciding alone. Settings are given with inference, e.g.
+{"smoothing": {"method": "ema", "time_constant": 0.2}} in the /api/inference/start
+body; missing keys take DEFAULT_SMOOTHING and false decides on every window's label.
+score_decisions.py compares settings on recorded sessions.
+"""
+import numpy as np
+
+DEFAULT_SMOOTHING = {"method": "bayes", "time_constant": 0.5, "enter": 0.7, "min_dwell": 0.5,
+                     "stop_label": "STOP", "stop_threshold": 0.9}
+METHODS = ('ema', 'bayes', 'none')
+MIN_LIKELIHOOD = 1e-3  # a single confident window can't rule a class out for good
+
+
+class DecisionPolicy:
+    """Decision settings. Use stream() for each live signal."""
+
+    def __init__(self, method='bayes', time_constant=0.5, enter=0.7, min_dwell=0.5, stop_label='STOP',
+                 stop_threshold=0.9):
+        if method not in METHODS:
+            raise ValueError(f"Unknown smoothing method {method!r}, expected one of {', '.join(METHODS)}")
+        self.method = method
+        self.time_constant = float(time_constant)
+        self.enter = float(enter)
+        self.min_dwell = float(min_dwell)
+        self.stop_label = None if stop_label is None else str(stop_label)
+        self.stop_threshold = None if stop_threshold is None else float(stop_threshold)
+
+    @classmethod
+    def from_settings(cls, settings=None):
+        """settings as given to inference: None for DEFAULT_SMOOTHING, keys override the defaults"""
+        return cls(**{**DEFAULT_SMOOTHING, **(settings or {})})
+
+    @classmethod
+    def raw(cls):
+        """Every window's label as it is: what inference did before this layer"""
+        return cls('none', time_constant=0, enter=0, min_dwell=0, stop_label=None, stop_threshold=None)
+
+    def settings(self):
+        return {"method": self.method, "time_constant": self.time_constant, "enter": self.enter,
+                "min_dwell": self.min_dwell, "stop_label": self.stop_label, "stop_threshold": self.stop_threshold}
+
+    def stream(self, classes=None, previous=None):
+        """A new signal's stream, or with previous the one carrying on from it for a new model"""
+        stream = DecisionStream(self, classes)
+        if previous is not None:
+            stream.take_over(previous)
+        return stream
+
+
+class DecisionStream:
+    """Smoothed probabilities and the current decision of one live signal, fed window by window"""
+
+    def __init__(self, policy, classes=None):
+        self.policy = policy
+        self.classes = [str(label) for label in classes] if classes is not None else []
+        # Known from the start so a binary model's score can be read as both probabilities
+        if policy.stop_label is not None and policy.stop_label not in self.classes:
+            self.classes.append(policy.stop_label)
+        self.reset()
+
+    def reset(self):
+        self.probabilities = None
+        self.decision = None
+        self.reason = None
+        self._last_time = None
+        self._since = None
+
+    def take_over(self, previous):
+        """Carry on from another stream's smoothed probabilities, decision and dwell"""
+        if previous.decision is None:
+            return
+        for label in previous.classes:
+            if label not in self.classes:
+                self.classes.append(label)
+        carried = dict(zip(previous.classes, previous.probabilities))
+        self.probabilities = np.array([carried.get(label, 0.0) for label in self.classes])
+        self.decision, self.reason = previous.decision, previous.reason
+        self._last_time, self._since = previous._last_time, previous._since
+
+    def update(self, label, score, t):
+        """Decide after a window classified as label with probability score (None if the
+        model has none), its last sample at signal time t. Returns (decision, switched)."""
+        label = str(label)
+        if label not in self.classes:
+            self.classes.append(label)
+            if self.probabilities is not None:
+                self.probabilities = np.append(self.probabilities, 0.0)
+        # The rest of the probability is shared by the other classes, exact for two
+        score = 1.0 if score is None or np.isnan(score) else float(score)
+        others = len(self.classes) - 1
+        window = np.full(len(self.classes), (1.0 - score) / others if others else 0.0)
+        window[self.classes.index(label)] = score if others else 1.0
+        return self.update_proba(window, t)
+
+    def update_proba(self, window, t):
+        """Decide after a window's probabilities over self.classes"""
+        policy = self.policy
+        window = np.asarray(window, dtype=np.float64)
+        dt = 0.0 if self._last_time is None else max(0.0, t - self._last_time)
+        self._last_time = t
+        if self.probabilities is None or policy.method == 'none' or policy.time_constant <= 0:
+            self.probabilities = window
+        else:
+            # Weight of the new window (ema) or chance the state changed (bayes) since the last one
+            change = 1.0 - np.exp(-dt / policy.time_constant)
+            if policy.method == 'ema':
+                self.probabilities = (1.0 - change) * self.probabilities + change * window
+            else:
+                prior = (1.0 - change) * self.probabilities + change / len(window)
+                posterior = prior * np.maximum(window, MIN_LIKELIHOOD)
+                self.probabilities = posterior / posterior.sum()
+
+        stop = self.classes.index(policy.stop_label) if policy.stop_label in self.classes else None
+        best = int(self.probabilities.argmax())
+        previous = self.decision
+        if self.decision is None:
+            self.decision, self.reason = self.classes[best], 'start'
+        elif (stop is not None and policy.stop_threshold is not None and window[stop] >= policy.stop_threshold
+              and self.decision != policy.stop_label):
+            # Safety override: stop now and make the other classes build up their evidence again
+            self.decision, self.reason = policy.stop_label, 'stop'
+            self.probabilities = window
+        elif self.classes[best] == self.decision or self.probabilities[best] < policy.enter:
+            self.reason = 'hold'
+        elif best != stop and t - self._since < policy.min_dwell:
+            self.reason = 'dwell'
+        else:
+            self.decision, self.reason = self.classes[best], 'switch'
+        if self.decision != previous:
+            self._since = t
+        return self.decision, previous is not None and self.decision != previous
+
+    @property
+    def confidence(self):
+        """Smoothed probability of the current decision"""
+        return float(self.probabilities[self.classes.index(self.decision)])
+
+
+def make_policy(settings=None):
+    """settings as given to /api/inference/start: None for DEFAULT_SMOOTHING, False for
+    every window's own label"""
+    if settings is False:
+        return DecisionPolicy.raw()
+    return DecisionPolicy.from_settings(settings)
+
+
+def model_classes(model):
+    """Class labels of a loaded model, None where they aren't known up front"""
+    classes = getattr(model, 'classes', None)
+    return list(classes) if classes is not None else None
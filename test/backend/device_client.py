@@ -0,0 +1,146 @@
+"""Long lived WebSocket connections to the ESP32 devices.
+
+Opening a new connection for every command costs an event loop, a TCP handshake and a
+WebSocket upgrade each time. DeviceClient keeps one connection per device open on a
+single background event loop, reconnects with exponential backoff, and lets the
+prediction loop queue commands without waiting for the network.
+
+Round-trip latency is measured by pinging right after each command: the pong can only
+come back after the device has received the command, so this works with firmware that
+never replies.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+import websockets
+
+from metrics import LatencyTracker
+
+
+class DeviceClient:
+    """Keep one WebSocket connection open per device and send commands to them"""
+
+    def __init__(self, devices, queue_size=100, min_backoff=0.1, max_backoff=5.0, ack_timeout=2.0, on_sent=None):
+        # devices maps a name to its ws:// URI
+        self.devices = dict(devices)
+        self.queue_size = queue_size
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.ack_timeout = ack_timeout
+        self.on_sent = on_sent
+        self.loop = None
+        self._thread = None
+        self._queues = {}
+        self._wakeups = {}
+        self._tasks = []
+        self._connections = {}
+        self.stats = {
+            name: {"connected": False, "sent": 0, "dropped": 0, "reconnects": 0,
+                   "last_rtt_ms": None, "latency": LatencyTracker()}
+            for name in self.devices
+        }
+
+    def start(self):
+        """Start the background event loop and connect to every device"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            for name in self.devices:
+                self._queues[name] = deque()
+                self._wakeups[name] = asyncio.Event()
+                self._tasks.append(self.loop.create_task(self._device_worker(name)))
+            ready.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """Close every connection and stop the event loop"""
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            for websocket in list(self._connections.values()):
+                await websocket.close()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self.loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop)
+        self._thread.join(timeout=5)
+
+    def send(self, command, device=None):
+        """Queue a command for one device (or all of them) without blocking"""
+        names = [device] if device else list(self.devices)
+        self.loop.call_soon_threadsafe(self._enqueue, names, command, time.perf_counter())
+
+    def _enqueue(self, names, command, queued_at):
+        for name in names:
+            queue = self._queues[name]
+            if len(queue) >= self.queue_size:
+                # Commands are state updates, the oldest one is the least useful
+                queue.popleft()
+                self.stats[name]["dropped"] += 1
+            queue.append((command, queued_at))
+            self._wakeups[name].set()
+
+    async def _next_command(self, name):
+        queue = self._queues[name]
+        while not queue:
+            self._wakeups[name].clear()
+            await self._wakeups[name].wait()
+        return queue.popleft()
+
+    async def _device_worker(self, name):
+        uri = self.devices[name]
+        stats = self.stats[name]
+        backoff = self.min_backoff
+        pending = None
+        while True:
+            try:
+                async with websockets.connect(uri, open_timeout=5) as websocket:
+                    self._connections[name] = websocket
+                    stats["connected"] = True
+                    backoff = self.min_backoff
+                    print(f"Connected to {name} at {uri}")
+                    while True:
+                        if pending is None:
+                            pending = await self._next_command(name)
+                        command, queued_at = pending
+                        await websocket.send(command)
+                        pending = None
+                        # A device that stops answering pings is treated as disconnected
+                        pong_waiter = await websocket.ping()
+                        await asyncio.wait_for(pong_waiter, self.ack_timeout)
+
+                        rtt = time.perf_counter() - queued_at
+                        stats["sent"] += 1
+                        stats["last_rtt_ms"] = rtt * 1000
+                        stats["latency"].add(rtt)
+                        if self.on_sent:
+                            self.on_sent(name, command, rtt)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                self._connections.pop(name, None)
+                stats["connected"] = False
+                stats["reconnects"] += 1
+                print(f"Connection to {name} lost ({e}), retrying in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def summary(self):
+        """Per device connection state, counters and latency distribution"""
+        return {
+            name: {**{k: v for k, v in stats.items() if k != "latency"},
+                   "latency": stats["latency"].summary()}
+            for name, stats in self.stats.items()
+        }
@@ -0,0 +1,141 @@
+"""Streaming signal conditioning: IIR bandpass, mains notch, rectification, RMS envelope.
+
+The bandpass and notch filters are cascaded into one array of second order sections,
+so a chunk of any length goes through all of them in a single sosfilt call for every
+channel at once. The filter state is carried from chunk to chunk, so filtering a
+recording chunk by chunk gives exactly the same samples as filtering it whole. The
+state starts out as the steady state for the first sample, so the ADC's DC offset
+doesn't ring through the first few hundred samples.
+
+The filters are settings of a model, like its features: training saves them as
+<model>_filters.json and inference and online updates load them from there.
+Recordings stay raw, so a retrain can pick different settings.
+"""
+import json
+import os
+
+import numpy as np
+
+DEFAULT_FILTERS = {"bandpass": [20, 450], "notch": 50}
+BANDPASS_ORDER = 4
+NOTCH_Q = 30
+
+
+class FilterBank:
+    """Filter settings and their design. Use stream() for a live signal, apply() for a whole recording."""
+
+    def __init__(self, sample_rate, bandpass=None, notch=None, rectify=False, envelope_ms=None,
+                 order=BANDPASS_ORDER, notch_q=NOTCH_Q):
+        self.sample_rate = float(sample_rate)
+        self.bandpass = list(bandpass) if bandpass else None
+        self.notch = notch
+        self.rectify = bool(rectify)
+        self.envelope_ms = envelope_ms
+        self.order = order
+        self.notch_q = notch_q
+        self.sos = self._design()
+        self.envelope_samples = max(1, int(round(envelope_ms * self.sample_rate / 1000))) if envelope_ms else None
+
+    def _design(self):
+        from scipy.signal import butter, iirnotch, tf2sos
+
+        nyquist = self.sample_rate / 2
+        sections = []
+        if self.bandpass:
+            low, high = self.bandpass
+            if high is not None and high >= nyquist:
+                high = None
+            if low and high:
+                sections.append(butter(self.order, [low, high], btype='bandpass', fs=self.sample_rate, output='sos'))
+            elif low:
+                sections.append(butter(self.order, low, btype='highpass', fs=self.sample_rate, output='sos'))
+            elif high:
+                sections.append(butter(self.order, high, btype='lowpass', fs=self.sample_rate, output='sos'))
+        notches = self.notch if isinstance(self.notch, (list, tuple)) else [self.notch] if self.notch else []
+        for frequency in notches:
+            if frequency < nyquist:
+                sections.append(tf2sos(*iirnotch(frequency, self.notch_q, fs=self.sample_rate)))
+        return np.vstack(sections) if sections else None
+
+    @classmethod
+    def from_settings(cls, sample_rate, settings=None):
+        """settings as given to training: None for DEFAULT_FILTERS, {} for no filtering"""
+        return cls(sample_rate, **(DEFAULT_FILTERS if settings is None else settings))
+
+    def settings(self):
+        return {"bandpass": self.bandpass, "notch": self.notch, "rectify": self.rectify,
+                "envelope_ms": self.envelope_ms, "order": self.order, "notch_q": self.notch_q}
+
+    def stream(self):
+        return StreamingFilter(self)
+
+    def apply(self, samples):
+        """Filter a whole recording, as if it had been streamed from its first sample"""
+        return self.stream().process(samples)
+
+    def save(self, model_name):
+        with open(filters_path(model_name), 'w') as f:
+            json.dump({"sample_rate": self.sample_rate, **self.settings()}, f, indent=2)
+
+
+class StreamingFilter:
+    """Filter state of one live signal, fed chunk by chunk"""
+
+    def __init__(self, bank):
+        self.bank = bank
+        self._zi = None
+        self._envelope_tail = None
+
+    def reset(self):
+        self._zi = None
+        self._envelope_tail = None
+
+    def process(self, chunk):
+        """Filter an (n, channels) chunk, returning float64 samples of the same shape"""
+        from scipy.signal import sosfilt, sosfilt_zi
+
+        signal = np.asarray(chunk, dtype=np.float64)
+        if signal.ndim == 1:
+            signal = signal.reshape(-1, 1)
+        if len(signal) == 0:
+            return signal
+        bank = self.bank
+        if bank.sos is not None:
+            if self._zi is None:
+                # (sections, 2, channels): steady state for a constant input at the first sample
+                self._zi = sosfilt_zi(bank.sos)[:, :, None] * signal[0][None, None, :]
+            signal, self._zi = sosfilt(bank.sos, signal, axis=0, zi=self._zi)
+        if bank.rectify:
+            signal = np.abs(signal)
+        if bank.envelope_samples:
+            signal = self._rms_envelope(signal)
+        return signal
+
+    def _rms_envelope(self, signal):
+        """Moving RMS over the last envelope_samples samples, carrying the tail between chunks"""
+        window = self.bank.envelope_samples
+        squared = signal * signal
+        if self._envelope_tail is None:
+            # Before the first window fills, average over what has arrived
+            self._envelope_tail = np.empty((0, signal.shape[1]))
+        joined = np.concatenate((self._envelope_tail, squared))
+        cumulative = np.concatenate((np.zeros((1, joined.shape[1])), np.cumsum(joined, axis=0)))
+        ends = np.arange(len(joined) - len(squared), len(joined)) + 1
+        starts = np.maximum(ends - window, 0)
+        envelope = np.sqrt(np.maximum(cumulative[ends] - cumulative[starts], 0) / (ends - starts)[:, None])
+        self._envelope_tail = joined[-(window - 1):] if window > 1 else joined[:0]
+        return envelope
+
+
+def filters_path(model_name):
+    """The filter settings saved alongside <model_name>.pkl"""
+    return f'{model_name}_filters.json'
+
+
+def load_filters(model_name):
+    """The model's FilterBank, or None for models trained before filtering existed"""
+    path = filters_path(model_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return FilterBank(**json.load(f))
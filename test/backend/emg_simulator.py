@@ -0,0 +1,341 @@
+"""Synthetic EMG amplifier for benchmarking the real acquisition paths.
+
+Emits multichannel samples in real time on a virtual serial port (pty) or a TCP socket,
+in the ASCII "a,b" format or binary frames (see serial_source.py), following a script
+of labelled segments such as GO:2,STOP:3. Every segment start is logged with the
+wall clock time its first sample went out, so the decisions of record_emg_data,
+inference_loop or the Nyan_AI car/wheelchair scripts can be scored against ground truth.
+
+    python emg_simulator.py --rate 5000 --channels 2 --script GO:2,STOP:3
+    python emg_simulator.py --socket 7000 --format binary --truth truth.json
+
+A pty prints its path (e.g. /dev/pts/4), pass it as the serial port. pyserial opens a
+socket device as socket://localhost:7000 through serial.serial_for_url.
+"""
+import argparse
+import errno
+import json
+import os
+import pty
+import select
+import socket
+import threading
+import time
+import tty
+
+import numpy as np
+
+from serial_source import SAMPLE_FORMATS, encode_ascii, encode_frames, frame_size
+
+ADC_MIDSCALE = 2048
+ADC_MAX = 4095
+# Noise standard deviation per label, in ADC counts. Contraction labels are loud.
+LEVELS = {'GO': 400, 'YES': 400, 'STOP': 40, 'NO': 40}
+DEFAULT_LEVEL = 100
+DEFAULT_SCRIPT = 'GO:2,STOP:2'
+
+
+def parse_script(script):
+    """'GO:2,STOP:3' or 'GO:2:250,...' (with a level) -> [(label, seconds, level), ...]"""
+    segments = []
+    for part in script.split(','):
+        fields = part.strip().split(':')
+        if len(fields) not in (2, 3):
+            raise ValueError(f"Bad segment '{part}', expected LABEL:SECONDS[:LEVEL]")
+        label, seconds = fields[0], float(fields[1])
+        level = float(fields[2]) if len(fields) == 3 else LEVELS.get(label, DEFAULT_LEVEL)
+        if seconds <= 0:
+            raise ValueError(f"Segment '{part}' must last more than 0 s")
+        segments.append((label, seconds, level))
+    return segments
+
+
+def synthetic_emg(rng, n_samples, n_channels, label, level=None):
+    """Noise around mid-scale, louder for GO"""
+    std = level if level is not None else LEVELS.get(label, DEFAULT_LEVEL)
+    samples = ADC_MIDSCALE + rng.normal(0, std, (n_samples, n_channels))
+    return np.clip(samples, 0, ADC_MAX).astype(np.int16)
+
+
+class EmgSimulator:
+    """Sample generator following a segment script, paced in real time by run()"""
+
+    def __init__(self, rate=1000, n_channels=2, sample_format='ascii', script=DEFAULT_SCRIPT,
+                 seed=None, loop=True, hum=0.0, mains_hz=50.0):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unknown sample format '{sample_format}', expected one of {SAMPLE_FORMATS}")
+        self.rate = rate
+        self.n_channels = n_channels
+        self.sample_format = sample_format
+        self.segments = parse_script(script) if isinstance(script, str) else list(script)
+        self.loop = loop
+        self.hum = hum
+        self.mains_hz = mains_hz
+        self.rng = np.random.default_rng(seed)
+        self.sent = 0
+        self.dropped = 0
+        self.timeline = []  # (wall time, first sample index, label)
+        self._segment = 0
+        self._segment_left = self._segment_samples(0)
+
+    def _segment_samples(self, index):
+        return max(1, int(round(self.segments[index][1] * self.rate)))
+
+    @property
+    def generated(self):
+        """Samples produced so far, sent or not: the index of the next sample"""
+        return self.sent + self.dropped
+
+    @property
+    def finished(self):
+        return self._segment is None
+
+    def label(self):
+        return None if self.finished else self.segments[self._segment][0]
+
+    def next_chunk(self, n_samples):
+        """Up to n_samples of the current segment as an (n, channels) int16 array,
+        never crossing a segment boundary"""
+        if self.finished:
+            return np.empty((0, self.n_channels), dtype=np.int16)
+        label, _, level = self.segments[self._segment]
+        n = min(n_samples, self._segment_left)
+        samples = synthetic_emg(self.rng, n, self.n_channels, label, level)
+        if self.hum:
+            t = (self.generated + np.arange(n)) / self.rate
+            samples = np.clip(samples + self.hum * np.sin(2 * np.pi * self.mains_hz * t)[:, None],
+                              0, ADC_MAX).astype(np.int16)
+        self._segment_left -= n
+        if self._segment_left == 0:
+            following = self._segment + 1
+            if following == len(self.segments):
+                following = 0 if self.loop else None
+            self._segment = following
+            if following is not None:
+                self._segment_left = self._segment_samples(following)
+        return samples
+
+    def encode(self, samples):
+        if self.sample_format == 'binary':
+            # Counters keep counting over dropped frames, so a reader sees the gap
+            return encode_frames(samples, start_counter=self.generated)
+        return encode_ascii(samples)
+
+    def samples_in(self, data):
+        """Number of whole samples in the start of an encoded chunk"""
+        if self.sample_format == 'binary':
+            return len(data) // frame_size(self.n_channels)
+        return data.count(b'\n')
+
+    def sample_end(self, data, offset):
+        """Offset just past the sample the byte at offset belongs to"""
+        if self.sample_format == 'binary':
+            size = frame_size(self.n_channels)
+            return -(-offset // size) * size
+        return data.index(b'\n', offset) + 1 if data[offset - 1:offset] != b'\n' else offset
+
+    def run(self, write, stop_event, duration=None, chunk_seconds=0.01):
+        """Generate samples at the configured rate and pass the encoded bytes to
+        write(data, deadline), until stop_event, duration or the end of a non-looping
+        script. write returns how many bytes it managed to send by deadline; samples
+        it couldn't send count as dropped, as on a real device nobody is draining."""
+        chunk = max(1, int(self.rate * chunk_seconds))
+        start = time.time()
+        last_label = None
+        while not stop_event.is_set() and not self.finished:
+            elapsed = time.time() - start
+            if duration is not None and elapsed >= duration:
+                break
+            due = int(elapsed * self.rate) - self.generated
+            if due < chunk:
+                time.sleep((chunk - due) / self.rate)
+                continue
+            label = self.label()
+            samples = self.next_chunk(due)
+            if label != last_label:
+                self.timeline.append((time.time(), self.generated, label))
+                last_label = label
+            data = self.encode(samples)
+            written = write(data, time.time() + chunk_seconds)
+            if 0 < written < len(data):
+                # Finish the sample in progress, a torn line or frame would reach the
+                # reader as one corrupt sample rather than a gap
+                end = self.sample_end(data, written)
+                written += write(data[written:end], time.time() + 1.0)
+            complete = len(samples) if written == len(data) else self.samples_in(data[:written])
+            self.sent += complete
+            self.dropped += len(samples) - complete
+
+    def truth(self):
+        """Ground truth segments as dicts with start (wall time), first_sample and label"""
+        return {
+            "rate": self.rate,
+            "n_channels": self.n_channels,
+            "format": self.sample_format,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "segments": [{"start": start, "first_sample": first, "label": label}
+                         for start, first, label in self.timeline]
+        }
+
+    def label_at(self, timestamp):
+        """The label being emitted at a wall clock time, None before the first sample"""
+        current = None
+        for start, _, label in self.timeline:
+            if start > timestamp:
+                break
+            current = label
+        return current
+
+
+def _write_fd(fd, data, deadline):
+    """Write to a non-blocking fd until done or deadline, returns bytes written"""
+    view = memoryview(data)
+    written = 0
+    while written < len(view):
+        try:
+            written += os.write(fd, view[written:])
+        except BlockingIOError:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+                break
+    return written
+
+
+class PtyDevice:
+    """Virtual serial port, open .path with serial.Serial like a USB amplifier"""
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.path = os.ttyname(self.slave_fd)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _write(self, data, deadline):
+        try:
+            return _write_fd(self.master_fd, data, deadline)
+        except OSError as e:
+            if e.errno != errno.EIO:
+                raise
+            return 0
+
+    def start(self, duration=None):
+        self.thread = threading.Thread(target=self.simulator.run, args=(self._write, self.stop_event, duration),
+                                       daemon=True, name=f'emg-sim-{self.path}')
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def close(self):
+        self.stop()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+
+class SocketDevice:
+    """TCP amplifier, open socket://host:port with serial.serial_for_url. Serves one
+    client at a time; samples are dropped while nobody is connected."""
+
+    def __init__(self, simulator, host='127.0.0.1', port=0):
+        self.simulator = simulator
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.1)
+        self.host, self.port = self.server.getsockname()[:2]
+        self.path = f'socket://{self.host}:{self.port}'
+        self.stop_event = threading.Event()
+        self.client = None
+        self.thread = None
+        self._accept_thread = None
+
+    def _accept(self):
+        while not self.stop_event.is_set():
+            try:
+                client, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            previous, self.client = self.client, client
+            if previous is not None:
+                previous.close()
+
+    def _write(self, data, deadline):
+        client = self.client
+        if client is None:
+            return 0
+        try:
+            return _write_fd(client.fileno(), data, deadline)
+        except OSError:
+            if self.client is client:
+                self.client = None
+            client.close()
+            return 0
+
+    def start(self, duration=None):
+        self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+        self._accept_thread.start()
+        self.thread = threading.Thread(target=self.simulator.run, args=(self._write, self.stop_event, duration),
+                                       daemon=True, name=f'emg-sim-{self.port}')
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        for thread in (self.thread, self._accept_thread):
+            if thread is not None:
+                thread.join(timeout)
+
+    def close(self):
+        self.stop()
+        if self.client is not None:
+            self.client.close()
+        self.server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=1000, help='samples per second (1000-10000)')
+    parser.add_argument('--channels', type=int, default=2, help='1-8')
+    parser.add_argument('--format', choices=SAMPLE_FORMATS, default='ascii')
+    parser.add_argument('--script', default=DEFAULT_SCRIPT, help='LABEL:SECONDS[:LEVEL],... segments')
+    parser.add_argument('--once', action='store_true', help='stop at the end of the script instead of looping')
+    parser.add_argument('--seconds', type=float, help='stop after this long')
+    parser.add_argument('--hum', type=float, default=0.0, help='mains hum amplitude in ADC counts')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--socket', type=int, metavar='PORT', help='serve on a TCP port instead of a pty')
+    parser.add_argument('--truth', help='write the ground truth segments to this JSON file on exit')
+    args = parser.parse_args()
+    if not 1 <= args.channels <= 8:
+        parser.error('--channels must be between 1 and 8')
+
+    simulator = EmgSimulator(args.rate, args.channels, args.format, args.script, seed=args.seed,
+                             loop=not args.once, hum=args.hum)
+    device = SocketDevice(simulator, port=args.socket) if args.socket is not None else PtyDevice(simulator)
+    print(f"Simulated amplifier on {device.path}: {args.rate} Hz x {args.channels} ch, {args.format}, "
+          f"script {args.script}")
+    device.start(args.seconds)
+    try:
+        while device.thread.is_alive():
+            device.thread.join(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.close()
+    print(f"Sent {simulator.sent} samples, dropped {simulator.dropped}")
+    if args.truth:
+        with open(args.truth, 'w') as f:
+            json.dump(simulator.truth(), f, indent=2)
+        print(f"Ground truth written to {args.truth}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Window level EMG features.
+
+A window is cut into fixed size blocks. Each block is reduced to additive statistics
+(sums of squares, absolute values, absolute differences, zero crossings, slope sign
+changes and FFT band powers), and a window's features are the sum of its blocks'
+statistics, normalised. Training computes every window of a session at once with a
+cumulative sum over blocks; streaming inference only computes the statistics of each
+new block and reuses the rest, and both give the same numbers.
+"""
+import json
+import os
+from collections import deque
+
+import numpy as np
+
+WINDOW_SECONDS = 1.0
+BLOCK_SECONDS = 0.05
+BANDS_HZ = ((0, 20), (20, 50), (50, 100), (100, 250), (250, 500))
+TIME_FEATURES = ('rms', 'mav', 'wl', 'zc', 'ssc')
+
+
+def estimate_sample_rate(timestamps):
+    """Samples per second from evenly spread timestamps"""
+    timestamps = np.asarray(timestamps)
+    return (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+
+
+def emg_signals(raw_data, unmixing):
+    """The signals features are computed on: centred raw channels followed by the ICs"""
+    raw_data = np.asarray(raw_data, dtype=np.float64)
+    return np.hstack((raw_data - unmixing.mean, unmixing.transform(raw_data)))
+
+
+class FeatureExtractor:
+    """Turn (n_samples, n_signals) arrays into fixed length window feature vectors"""
+
+    def __init__(self, sample_rate, block_samples, window_blocks, signal_names):
+        self.sample_rate = float(sample_rate)
+        self.block_samples = int(block_samples)
+        self.window_blocks = int(window_blocks)
+        self.signal_names = list(signal_names)
+
+        nyquist = self.sample_rate / 2
+        freqs = np.fft.rfftfreq(self.block_samples, 1 / self.sample_rate)
+        self.bands = [(lo, min(hi, nyquist)) for lo, hi in BANDS_HZ if lo < nyquist]
+        self._band_masks = np.array(
+            [(freqs >= lo) & (freqs < hi) for lo, hi in self.bands], dtype=np.float64
+        )
+        # The last band is closed so the Nyquist bin is counted
+        self._band_masks[-1, freqs >= self.bands[-1][0]] = 1.0
+
+    @classmethod
+    def for_rate(cls, sample_rate, signal_names, window_seconds=WINDOW_SECONDS, block_seconds=BLOCK_SECONDS):
+        block_samples = max(4, int(round(block_seconds * sample_rate)))
+        window_blocks = max(1, int(round(window_seconds / block_seconds)))
+        return cls(sample_rate, block_samples, window_blocks, signal_names)
+
+    @property
+    def window_samples(self):
+        return self.block_samples * self.window_blocks
+
+    def feature_names(self):
+        names = list(TIME_FEATURES) + [f'band_{lo:.0f}_{hi:.0f}' for lo, hi in self.bands]
+        return [f'{signal}_{name}' for signal in self.signal_names for name in names]
+
+    def split_blocks(self, signals):
+        """Reshape to (n_blocks, block_samples, n_signals), dropping an incomplete tail"""
+        signals = np.asarray(signals, dtype=np.float64)
+        n_blocks = len(signals) // self.block_samples
+        return signals[:n_blocks * self.block_samples].reshape(n_blocks, self.block_samples, signals.shape[1])
+
+    def block_stats(self, blocks):
+        """Additive statistics per block: (n_blocks, n_signals, n_stats)"""
+        diffs = np.diff(blocks, axis=1)
+        sum_sq = np.einsum('bts,bts->bs', blocks, blocks)
+        sum_abs = np.abs(blocks).sum(axis=1)
+        sum_wl = np.abs(diffs).sum(axis=1)
+        zc = (np.signbit(blocks[:, 1:]) != np.signbit(blocks[:, :-1])).sum(axis=1)
+        ssc = (diffs[:, 1:] * diffs[:, :-1] < 0).sum(axis=1)
+        spectrum = np.abs(np.fft.rfft(blocks, axis=1)) ** 2 / self.block_samples
+        band_power = np.einsum('bfs,kf->bsk', spectrum, self._band_masks)
+        time_stats = np.stack((sum_sq, sum_abs, sum_wl, zc, ssc), axis=-1)
+        return np.concatenate((time_stats, band_power), axis=-1)
+
+    def combine(self, stats_sum, n_blocks):
+        """Normalise summed block statistics into flat feature vectors"""
+        n_blocks = np.asarray(n_blocks, dtype=np.float64)[..., None, None]
+        n_samples = n_blocks * self.block_samples
+        features = np.empty_like(stats_sum)
+        features[..., 0] = np.sqrt(stats_sum[..., 0] / n_samples[..., 0])
+        features[..., 1:5] = stats_sum[..., 1:5] / n_samples
+        features[..., 5:] = stats_sum[..., 5:] / n_blocks
+        return features.reshape(*features.shape[:-2], -1)
+
+    def window_features(self, signals, hop_blocks=1):
+        """Features of every window in a recording, sliding by hop_blocks: (n_windows, n_features)"""
+        stats = self.block_stats(self.split_blocks(signals))
+        if len(stats) < self.window_blocks:
+            return np.empty((0, len(self.feature_names())))
+        cumulative = np.concatenate((np.zeros_like(stats[:1]), np.cumsum(stats, axis=0)))
+        window_sums = cumulative[self.window_blocks:] - cumulative[:-self.window_blocks]
+        return self.combine(window_sums[::hop_blocks], self.window_blocks)
+
+    def transform(self, signals):
+        """A single feature vector over all complete blocks of signals"""
+        stats = self.block_stats(self.split_blocks(signals))
+        if len(stats) == 0:
+            return None
+        return self.combine(stats.sum(axis=0), len(stats))
+
+    def save(self, model_name):
+        with open(extractor_path(model_name), 'w') as f:
+            json.dump({
+                "sample_rate": self.sample_rate,
+                "block_samples": self.block_samples,
+                "window_blocks": self.window_blocks,
+                "signal_names": self.signal_names
+            }, f, indent=2)
+
+
+class StreamingFeatures:
+    """Keep the statistics of the last window_blocks blocks of a live stream"""
+
+    def __init__(self, extractor, window_blocks=None):
+        self.extractor = extractor
+        self._stats = deque(maxlen=window_blocks or extractor.window_blocks)
+        self._pending = np.empty((0, len(extractor.signal_names)))
+
+    def push(self, signals):
+        """Add new samples, returning how many blocks were completed"""
+        self._pending = np.concatenate((self._pending, signals))
+        blocks = self.extractor.split_blocks(self._pending)
+        if len(blocks):
+            self._pending = self._pending[len(blocks) * self.extractor.block_samples:]
+            self._stats.extend(self.extractor.block_stats(blocks))
+        return len(blocks)
+
+    @property
+    def ready(self):
+        return len(self._stats) == self._stats.maxlen
+
+    def features(self):
+        """Features of the current window"""
+        return self.extractor.combine(np.sum(self._stats, axis=0), len(self._stats))
+
+
+def extractor_path(model_name):
+    """The feature settings saved alongside <model_name>.pkl"""
+    return f'{model_name}_features.json'
+
+
+def load_extractor(model_name):
+    path = extractor_path(model_name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No feature settings found at {path}. Retrain the model.")
+    with open(path) as f:
+        return FeatureExtractor(**json.load(f))
@@ -0,0 +1,188 @@
+import bisect
+
+import numpy as np
+
+# Stages of a decision as (stage, from, to) over the wall clock times in its "timing" dict
+STAGE_BOUNDS = [('acquire', 'arrival', 'read'), ('filter', 'read', 'filter'), ('unmix', 'filter', 'unmix'),
+                ('features', 'unmix', 'features'), ('predict', 'features', 'predict'), ('publish', 'predict', 'dispatch')]
+# Seconds, from 100 us up; a decision slower than a few hundred ms is already broken
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+WS_COUNTERS = [('broadcasts', 'Decisions broadcast to WebSocket clients'),
+               ('sent', 'Messages delivered to WebSocket clients'),
+               ('dropped', 'Messages dropped because a client queue was full'),
+               ('coalesced', 'Queued messages superseded by a newer state'),
+               ('evicted', 'Clients disconnected for not keeping up')]
+
+
+class LatencyTracker:
+    """Collect per-decision latencies and summarise their distribution"""
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return {"count": 0}
+        ms = np.array(self.samples) * 1000
+        return {
+            "count": len(ms),
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "max_ms": float(ms.max())
+        }
+
+
+class Histogram:
+    """Fixed bucket histogram, a bisect and three additions per observation.
+
+    Not locked: each histogram has a single writer (an inference thread or the
+    WebSocket event loop) and a scrape that races it is off by one observation at most.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsText:
+    """Build a Prometheus text format page, grouping samples by metric name"""
+
+    def __init__(self):
+        self._families = {}
+
+    def _family(self, name, kind, help_text):
+        if name not in self._families:
+            self._families[name] = (kind, help_text, [])
+        return self._families[name][2]
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                   for value in labels.values())
+        return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+    def add(self, name, kind, help_text, value, labels=None):
+        self._family(name, kind, help_text).append(f"{name}{self._labels(labels)} {value}")
+
+    def histogram(self, name, help_text, histogram, labels=None):
+        lines = self._family(name, 'histogram', help_text)
+        labels = labels or {}
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{name}_bucket{self._labels({**labels, 'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self._families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+
+class PipelineMetrics:
+    """Counters and histograms of one acquisition and inference pipeline.
+
+    On the hot path only decisions are counted and their stage durations observed.
+    Totals the pipeline's parts keep anyway (bytes and samples read, parse errors,
+    ring buffer overruns, WebSocket delivery) are read from them at scrape time.
+    """
+
+    def __init__(self, hub=None):
+        self.hub = hub
+        self.source = None
+        self.buffer = None
+        self.stages = {stage: Histogram() for stage, _, _ in STAGE_BOUNDS}
+        self.decision_latency = Histogram()
+        self.decisions = {}
+        self.skipped_windows = 0
+        # Totals of sources and buffers from earlier runs, so counters never go down
+        self._retired = {}
+
+    def _source_totals(self):
+        totals = {}
+        if self.source is not None:
+            decoder = self.source.decoder
+            totals['bytes'] = self.source.bytes_read
+            totals['samples'] = self.source.samples_read
+            totals['parse_errors'] = getattr(decoder, 'parse_errors', 0) + getattr(decoder, 'checksum_errors', 0)
+            totals['resyncs'] = getattr(decoder, 'resyncs', 0)
+            totals['dropped_frames'] = getattr(decoder, 'dropped_frames', 0)
+        if self.buffer is not None:
+            totals['overruns'] = self.buffer.overruns
+        return totals
+
+    def attach(self, source=None, buffer=None):
+        """Start reading totals from a new run's source and ring buffer"""
+        for key, value in self._source_totals().items():
+            self._retired[key] = self._retired.get(key, 0) + value
+        self.source = source
+        self.buffer = buffer
+
+    def observe_decision(self, prediction, timing=None):
+        self.decisions[prediction] = self.decisions.get(prediction, 0) + 1
+        if not timing:
+            return
+        for stage, begin, end in STAGE_BOUNDS:
+            if timing.get(begin) is not None and end in timing:
+                self.stages[stage].observe(timing[end] - timing[begin])
+        if timing.get('arrival') is not None and 'dispatch' in timing:
+            self.decision_latency.observe(timing['dispatch'] - timing['arrival'])
+
+    def collect(self, text, labels=None):
+        """Add this pipeline's metrics to a MetricsText page"""
+        labels = labels or {}
+        totals = dict(self._retired)
+        for key, value in self._source_totals().items():
+            totals[key] = totals.get(key, 0) + value
+        counters = [
+            ('emg_serial_bytes_total', 'Bytes read from the amplifier', 'bytes'),
+            ('emg_samples_total', 'Samples decoded from the amplifier', 'samples'),
+            ('emg_parse_errors_total', 'Malformed ASCII lines and binary frames with a bad checksum', 'parse_errors'),
+            ('emg_resyncs_total', 'Times the binary decoder had to look for the next sync word', 'resyncs'),
+            ('emg_dropped_frames_total', 'Binary frames missing from the sample counter sequence', 'dropped_frames'),
+            ('emg_ring_buffer_overruns_total', 'Samples overwritten before inference read them', 'overruns'),
+        ]
+        for name, help_text, key in counters:
+            text.add(name, 'counter', help_text, totals.get(key, 0), labels)
+        if self.buffer is not None:
+            metrics = self.buffer.metrics()
+            text.add('emg_ring_buffer_fill', 'gauge', 'Fraction of the ring buffer not yet read', metrics['fill'], labels)
+
+        for prediction, count in list(self.decisions.items()):
+            text.add('emg_decisions_total', 'counter', 'Windows classified, by prediction', count,
+                     {**labels, 'prediction': prediction})
+        text.add('emg_skipped_windows_total', 'counter', 'Windows without enough data to classify',
+                 self.skipped_windows, labels)
+        for stage, histogram in self.stages.items():
+            text.histogram('emg_stage_seconds', 'Time spent in each stage of a decision', histogram,
+                           {**labels, 'stage': stage})
+        text.histogram('emg_decision_latency_seconds', 'Newest sample read to decision dispatched',
+                       self.decision_latency, labels)
+
+        if self.hub is not None:
+            stats = self.hub.summary()
+            text.add('emg_ws_clients', 'gauge', 'Connected WebSocket clients', stats['clients'], labels)
+            for key, help_text in WS_COUNTERS:
+                text.add(f'emg_ws_{key}_total', 'counter', help_text, stats[key], labels)
+            text.histogram('emg_ws_send_seconds', 'Broadcast to a client until its send completed',
+                           self.hub.send_latency, labels)
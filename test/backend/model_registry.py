@@ -0,0 +1,150 @@
+"""Per-user model versions, a cache of loaded models and hot swapping.
+
+Each training run for a user writes a new version under models/<user>/v<N>/ with the
+usual artifacts (model.pkl, model_ica.npz, model_features.json, model_predictor.pkl).
+ModelRegistry.load() keeps the most recently used models in memory, so switching the
+operator of a rig back and forth doesn't reload from disk. A running inference loop
+reads its model from a ModelSlot once per decision; swap() replaces it with a single
+reference assignment, and the acquisition thread never stops in the meantime.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from unmixing import load_unmixing, unmixing_path
+from features import load_extractor, extractor_path
+from predictor import load_classifier, predictor_path
+from dsp import load_filters, filters_path
+
+MODEL_FILE = 'model'
+USER_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def validate_user(user):
+    """user as given, or ValueError unless it is a plain name: users become folders under
+    models/ and sessions/, so '../x' must not get that far"""
+    if user is None:
+        return None
+    if not isinstance(user, str) or not USER_PATTERN.fullmatch(user):
+        raise ValueError(f"Invalid user {user!r}, use only letters, digits, '_' and '-'")
+    return user
+
+
+class LoadedModel:
+    """Everything a decision needs: classifier, filters, unmixing and feature extractor"""
+
+    def __init__(self, name, model, unmixing, extractor, user=None, version=None, filters=None):
+        self.name = name
+        self.model = model
+        self.unmixing = unmixing
+        self.extractor = extractor
+        self.filters = filters
+        self.user = user
+        self.version = version
+        self.loaded_at = time.time()
+
+    def describe(self):
+        return {"name": self.name, "user": self.user, "version": self.version}
+
+
+def load_bundle(model_name, user=None, version=None):
+    """Load a model and the preprocessing it was trained with"""
+    return LoadedModel(model_name, load_classifier(model_name), load_unmixing(model_name),
+                       load_extractor(model_name), user, version, load_filters(model_name))
+
+
+def _artifacts(model_name):
+    return [f'{model_name}.pkl', unmixing_path(model_name), extractor_path(model_name), predictor_path(model_name),
+            filters_path(model_name)]
+
+
+class ModelRegistry:
+    def __init__(self, root='models', cache_size=4):
+        self.root = root
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def model_name(self, user, version):
+        return os.path.join(self.root, validate_user(user), f'v{version}', MODEL_FILE)
+
+    def _version_dirs(self, user):
+        folder = os.path.join(self.root, validate_user(user))
+        if not os.path.isdir(folder):
+            return []
+        return sorted(int(match.group(1)) for match in
+                      (re.fullmatch(r'v(\d+)', entry) for entry in os.listdir(folder)) if match)
+
+    def versions(self, user):
+        """Versions of user's model that finished training"""
+        return [version for version in self._version_dirs(user)
+                if all(os.path.exists(path) for path in _artifacts(self.model_name(user, version))[:3])]
+
+    def latest(self, user):
+        versions = self.versions(user)
+        return versions[-1] if versions else None
+
+    def users(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(entry for entry in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, entry)))
+
+    def next_model_name(self, user):
+        """The model name of user's next version. Its folder is only made when the model is
+        saved, so a failed training run leaves nothing behind"""
+        with self._lock:
+            versions = self._version_dirs(user)
+            version = versions[-1] + 1 if versions else 1
+            return self.model_name(user, version)
+
+    def publish(self, user, model_name):
+        """Copy an existing model (e.g. nbest) into a new version for user, returns the version"""
+        target = self.next_model_name(user)
+        os.makedirs(os.path.dirname(target))
+        for source, destination in zip(_artifacts(model_name), _artifacts(target)):
+            if os.path.exists(source):
+                shutil.copy2(source, destination)
+        return int(os.path.basename(os.path.dirname(target))[1:])
+
+    def load(self, user, version=None):
+        """Loaded model for user (latest version by default), from the cache when possible"""
+        version = version or self.latest(user)
+        if version is None:
+            raise FileNotFoundError(f"No trained model for user '{user}'")
+        key = (user, int(version))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        # Load outside the lock, a slow disk mustn't block lookups of cached models
+        bundle = load_bundle(self.model_name(user, version), user, int(version))
+        with self._lock:
+            self._cache[key] = bundle
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return bundle
+
+    def cached(self):
+        with self._lock:
+            return [bundle.describe() for bundle in self._cache.values()]
+
+    def summary(self):
+        return {"users": {user: self.versions(user) for user in self.users()}, "cached": self.cached()}
+
+
+class ModelSlot:
+    """The model a running inference loop uses"""
+
+    def __init__(self, bundle=None):
+        self.bundle = bundle
+        self.swaps = 0
+
+    def swap(self, bundle):
+        """Make bundle the active model from the next decision on, returns the previous one"""
+        previous, self.bundle = self.bundle, bundle
+        self.swaps += 1
+        return previous
@@ -0,0 +1,177 @@
+"""Fast model search for calibration retraining.
+
+Instead of PyCaret's compare_models over every estimator, train an explicit list of
+candidates in parallel across cores, drop the ones that are clearly losing after the
+first fold, kill the fits still running once the wall clock budget is spent, and time how
+long each model takes to classify a single window. The chosen model is the most accurate one
+that fits the real-time latency budget.
+"""
+import time
+
+import numpy as np
+
+DEFAULT_CANDIDATES = ('lr', 'ridge', 'lda', 'knn', 'dt', 'rf', 'et', 'lightgbm')
+
+
+def make_estimator(model_id):
+    """Estimators under the same ids PyCaret uses"""
+    from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression, RidgeClassifier
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    if model_id == 'lightgbm':
+        from lightgbm import LGBMClassifier
+        return LGBMClassifier(random_state=123, n_jobs=1, verbose=-1)
+    factories = {
+        'lr': lambda: LogisticRegression(max_iter=1000),
+        'ridge': lambda: RidgeClassifier(random_state=123),
+        'lda': lambda: LinearDiscriminantAnalysis(),
+        'nb': lambda: GaussianNB(),
+        'knn': lambda: KNeighborsClassifier(n_jobs=1),
+        'dt': lambda: DecisionTreeClassifier(random_state=123),
+        'rf': lambda: RandomForestClassifier(random_state=123, n_jobs=1),
+        'et': lambda: ExtraTreesClassifier(random_state=123, n_jobs=1),
+    }
+    if model_id not in factories:
+        raise ValueError(f"Unknown candidate '{model_id}', expected one of {sorted(factories) + ['lightgbm']}")
+    return factories[model_id]()
+
+
+def make_pipeline(model_id):
+    """Standardise then classify, matching setup(normalize=True)"""
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    return Pipeline([('normalize', StandardScaler()), ('actual_estimator', make_estimator(model_id))])
+
+
+def make_saved_pipeline(estimator):
+    """The same steps as PyCaret's own pipeline (labels encoded, features standardised).
+    Fitted on the feature DataFrame, it loads with load_model, works with predict_model
+    and exports to a LeanPredictor like a model saved after setup()"""
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+    from pycaret.internal.pipeline import Pipeline
+    from pycaret.internal.preprocess.transformers import TransformerWrapper, TransformerWrapperWithInverse
+    return Pipeline([('label_encoding', TransformerWrapperWithInverse(LabelEncoder())),
+                     ('normalize', TransformerWrapper(StandardScaler())),
+                     ('actual_estimator', estimator)])
+
+
+def _single_window_latency(pipeline, X, repeats=50):
+    """Seconds to classify one window, the way the real-time loop calls the model"""
+    from predictor import export_predictor
+    try:
+        predict = export_predictor(pipeline, [str(i) for i in range(X.shape[1])]).predict
+    except ValueError:
+        predict = pipeline.predict
+    rows = X[:repeats]
+    start = time.perf_counter()
+    for i in range(repeats):
+        predict(rows[i % len(rows)][None, :])
+    return (time.perf_counter() - start) / repeats
+
+
+def _run_fold(model_id, X, y, train_idx, test_idx):
+    pipeline = make_pipeline(model_id)
+    start = time.perf_counter()
+    pipeline.fit(X[train_idx], y[train_idx])
+    fit_time = time.perf_counter() - start
+    accuracy = float(np.mean(pipeline.predict(X[test_idx]) == y[test_idx]))
+    return {"accuracy": accuracy, "fit_time": fit_time,
+            "predict_latency": _single_window_latency(pipeline, X[test_idx])}
+
+
+def search_models(X, y, candidates=DEFAULT_CANDIDATES, time_budget=60.0, latency_budget_ms=None,
+                  n_folds=3, early_stop_margin=0.05, n_jobs=-1, progress=None):
+    """Cross-validate candidates and return (best_model_id, results)"""
+    from concurrent.futures import wait
+    from joblib.externals.loky import cpu_count, get_reusable_executor
+    from sklearn.model_selection import StratifiedKFold
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    # Windows overlap, so keep folds contiguous rather than shuffled
+    folds = list(StratifiedKFold(n_splits=n_folds).split(X, y))
+    results = {model_id: {"folds": [], "early_stopped": False, "error": None} for model_id in candidates}
+    start = time.time()
+
+    def run_round(fold_index, model_ids):
+        """Run one fold of every model, False if the budget ran out before they all finished"""
+        if progress:
+            for model_id in model_ids:
+                progress("estimator", estimator=model_id, fold=fold_index + 1, folds=n_folds)
+        train_idx, test_idx = folds[fold_index]
+        executor = get_reusable_executor(max_workers=cpu_count() if n_jobs == -1 else n_jobs)
+        futures = {executor.submit(_run_fold, model_id, X, y, train_idx, test_idx): model_id
+                   for model_id in model_ids}
+        done, running = wait(futures, timeout=max(0.0, time_budget - (time.time() - start)))
+        for future in done:
+            results[futures[future]]["folds"].append(future.result())
+        if running:
+            # A single slow fit (a forest on a long session) mustn't hold the search past the budget
+            executor.shutdown(wait=True, kill_workers=True)
+            for future in running:
+                results[futures[future]]["error"] = f"fold {fold_index + 1} not done within the time budget"
+            print(f"Time budget of {time_budget}s spent during fold {fold_index + 1}, "
+                  f"stopped {', '.join(futures[f] for f in running)}")
+            return False
+        return True
+
+    # First fold for everyone, then only the candidates still in the running
+    alive = []
+    for model_id in candidates:
+        try:
+            make_estimator(model_id)
+            alive.append(model_id)
+        except (ValueError, ImportError) as e:
+            results[model_id]["error"] = str(e)
+    if not alive:
+        raise ValueError(f"None of the candidates {list(candidates)} can be trained")
+    in_time = run_round(0, alive)
+    alive = [m for m in alive if results[m]["folds"]]
+    if not alive:
+        raise ValueError(f"No candidate finished a fold within the {time_budget}s time budget")
+
+    best_first = max(results[m]["folds"][0]["accuracy"] for m in alive)
+    for model_id in list(alive):
+        if results[model_id]["folds"][0]["accuracy"] < best_first - early_stop_margin:
+            results[model_id]["early_stopped"] = True
+            alive.remove(model_id)
+
+    for fold_index in range(1, n_folds):
+        if not in_time:
+            break
+        if time.time() - start > time_budget:
+            print(f"Time budget of {time_budget}s spent after {fold_index} fold(s)")
+            break
+        in_time = run_round(fold_index, alive)
+
+    summary = {}
+    for model_id, result in results.items():
+        if not result["folds"]:
+            summary[model_id] = {"error": result["error"]}
+            continue
+        folds_done = result["folds"]
+        summary[model_id] = {
+            "accuracy": float(np.mean([f["accuracy"] for f in folds_done])),
+            "fit_time": float(np.mean([f["fit_time"] for f in folds_done])),
+            "predict_latency_ms": float(np.mean([f["predict_latency"] for f in folds_done]) * 1000),
+            "folds": len(folds_done),
+            "early_stopped": result["early_stopped"]
+        }
+
+    # Only compare candidates on an equal number of folds
+    scored = {m: r for m, r in summary.items() if "accuracy" in r and not r["early_stopped"]}
+    max_folds = max(r["folds"] for r in scored.values())
+    scored = {m: r for m, r in scored.items() if r["folds"] == max_folds}
+    eligible = {m: r for m, r in scored.items()
+                if latency_budget_ms is None or r["predict_latency_ms"] <= latency_budget_ms}
+    if not eligible:
+        print(f"No candidate meets the {latency_budget_ms} ms latency budget, taking the fastest")
+        best = min(scored, key=lambda m: scored[m]["predict_latency_ms"])
+    else:
+        # Ties go to the faster model
+        best = max(eligible, key=lambda m: (eligible[m]["accuracy"], -eligible[m]["predict_latency_ms"]))
+    return best, summary
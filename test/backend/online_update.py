@@ -0,0 +1,216 @@
+"""Incremental model updates from new calibration sessions.
+
+A full retrain re-reads every data_* recording, refits ICA and cross-validates every candidate.
+Recalibrating in the field only needs the new session: its windows are featurised with
+the unmixing and feature extractor the model was trained with, and the model's estimator
+is updated with partial_fit on them plus a small sample kept from every earlier session.
+Every session gets a weight; its windows share it, so a long recording doesn't drown out
+the short ones before it.
+
+The state (pipeline, session weights, replay sample) lives in <model>_online.pkl. The
+first update starts it from the deployed model, keeping a sample of the data files on disk
+for replay. Models without partial_fit (QDA, forests, ...) are only replaced by a new SGD
+logistic regression trained on those files when the update asks for it (replace=True).
+"""
+import os
+import pickle
+import time
+
+import joblib
+import numpy as np
+
+from unmixing import load_unmixing
+from features import load_extractor
+from dsp import load_filters
+from predictor import export_predictor
+from recording_store import find_sessions, load_session
+from dataset_catalog import DatasetCatalog
+from training import _report, commit_artifacts, discard_staged, session_features, staging_name
+
+
+class OnlineModel:
+    """A fitted pipeline whose estimator has partial_fit, plus the sessions it has seen"""
+
+    def __init__(self, pipeline, feature_names, replay_windows=200):
+        estimator = pipeline.steps[-1][1]
+        if not hasattr(estimator, 'partial_fit'):
+            raise ValueError(f"{type(estimator).__name__} can't be updated incrementally, a full retrain is needed")
+        self.pipeline = pipeline
+        self.estimator = estimator
+        # The pipeline's fitted imputation and scaling, replayed on arrays. They stay fixed;
+        # rescaling later would silently change what the learned coefficients mean
+        self.scaler = export_predictor(pipeline, feature_names)
+        self.classes = np.asarray(self.scaler.classes)
+        # PyCaret fits the estimator on the label encoder's codes
+        self._targets = dict(zip(self.classes, estimator.classes_))
+        self.replay_windows = replay_windows
+        self.sessions = {}
+        self._replay = {}
+
+    @classmethod
+    def from_pipeline(cls, pipeline, feature_names, feature_sets):
+        """Carry on from a fitted pipeline, feature_sets maps the names of the sessions it
+        was trained on to their feature DataFrames, kept as replay samples"""
+        model = cls(pipeline, feature_names)
+        for name, features in feature_sets.items():
+            model._add_session(name, features, weight=1.0)
+        return model
+
+    @classmethod
+    def bootstrap(cls, feature_sets):
+        """A new SGD logistic regression trained on the given sessions"""
+        import pandas as pd
+        from sklearn.linear_model import SGDClassifier
+        from model_search import make_saved_pipeline
+
+        data = pd.concat(feature_sets.values(), ignore_index=True)
+        pipeline = make_saved_pipeline(SGDClassifier(loss='log_loss', alpha=1e-4, random_state=123))
+        pipeline.fit(data.drop(columns='Label'), data['Label'])
+        model = cls.from_pipeline(pipeline, list(data.columns.drop('Label')), feature_sets)
+        model._fit()
+        return model
+
+    def _add_session(self, name, features, weight):
+        labels = features['Label'].unique()
+        unknown = set(labels) - set(self.classes)
+        if unknown:
+            raise ValueError(f"Label(s) {sorted(unknown)} not in the model, a full retrain is needed")
+        X = self.scaler.transform(features.drop(columns='Label').to_numpy())
+        y = np.array([self._targets[label] for label in features['Label']])
+        # Recording the same feature again replaces the old session
+        self.sessions[name] = {"windows": len(X), "weight": weight, "updated": time.time(),
+                               "labels": [str(label) for label in labels]}
+        keep = np.linspace(0, len(X) - 1, min(len(X), self.replay_windows)).astype(int)
+        self._replay[name] = (X[keep], y[keep])
+        return X, y
+
+    def _fit(self, new=None, epochs=5):
+        """partial_fit over the new windows mixed with a sample of every other session.
+
+        Recordings hold a single label each, so training on the new session alone would
+        pull the model towards that label.
+        """
+        parts = [(name, X, y) for name, (X, y) in self._replay.items() if new is None or name != new[0]]
+        if new is not None:
+            parts.append(new)
+        # Each session's windows share its weight, whatever its length
+        X = np.vstack([X for _, X, _ in parts])
+        y = np.concatenate([y for _, _, y in parts])
+        sample_weight = np.concatenate(
+            [np.full(len(X_s), self.sessions[name]["weight"] * len(X) / (len(parts) * len(X_s)))
+             for name, X_s, _ in parts])
+
+        rng = np.random.default_rng(123)
+        for _ in range(epochs):
+            order = rng.permutation(len(X))
+            self.estimator.partial_fit(X[order], y[order], classes=self.estimator.classes_,
+                                       sample_weight=sample_weight[order])
+
+    def update(self, name, features, weight=1.0, epochs=5):
+        """Fold one new session into the model, returns the accuracy on it before the update"""
+        X, y = self._add_session(name, features, weight)
+        before = float(np.mean(self.estimator.predict(X) == y))
+        self._fit((name, X, y), epochs)
+        return before
+
+    def save(self, model_name):
+        with open(online_path(model_name), 'wb') as f:
+            pickle.dump(self, f)
+
+
+def online_path(model_name):
+    """Incremental training state saved alongside <model_name>.pkl"""
+    return f'{model_name}_online.pkl'
+
+
+def load_online_model(model_name):
+    """Load the incremental state, or None if the model has never been updated"""
+    path = online_path(model_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _session_name(data_file):
+    # data_go.csv and data_go.rec are the same session
+    return os.path.splitext(os.path.basename(data_file))[0]
+
+
+def update_model(progress=None, model_name='nbest', data_file=None, weight=1.0, replace=False,
+                 base_model=None, user=None):
+    """Update model_name with the windows of one new recording. A model without
+    partial_fit is only replaced by a new SGD model with replace=True. With base_model
+    (a user's current version) the update starts from that model and is saved as a new
+    one, model_name, the way a retrain adds a version. user's catalog sessions are then
+    replayed instead of the data_* files."""
+    try:
+        start = time.time()
+        base_model = base_model or model_name
+        # Features must be computed exactly as the model was trained
+        unmixing = load_unmixing(base_model)
+        extractor = load_extractor(base_model)
+        filters = load_filters(base_model)
+
+        session = load_session(data_file)
+        _report(progress, "features", file=data_file, samples=len(session))
+        features = session_features(session, unmixing, extractor, filters)
+
+        model = load_online_model(base_model)
+        bootstrapped = False
+        if model is None:
+            # First update: the model's training recordings are replayed alongside the new one
+            deployed = joblib.load(f'{base_model}.pkl')
+            estimator = type(deployed.steps[-1][1]).__name__
+            incremental = hasattr(deployed.steps[-1][1], 'partial_fit')
+            if not incremental and not replace:
+                raise ValueError(f"{base_model}.pkl ({estimator}) can't be updated incrementally: retrain it, "
+                                 f"or update with replace to swap it for an SGD logistic regression")
+            if user is not None:
+                recorded = [row['path'] for row in DatasetCatalog().query(user=user)]
+            else:
+                recorded = find_sessions('data_*')
+            others = [f for f in recorded if _session_name(f) != _session_name(data_file)]
+            feature_sets = {_session_name(f): session_features(load_session(f), unmixing, extractor, filters) for f in others}
+            if incremental:
+                _report(progress, "seed", estimator=estimator, files=len(others))
+                model = OnlineModel.from_pipeline(deployed, extractor.feature_names(), feature_sets)
+            else:
+                _report(progress, "bootstrap", files=len(others), replaces=estimator)
+                feature_sets[_session_name(data_file)] = features
+                model = OnlineModel.bootstrap(feature_sets)
+                bootstrapped = True
+        accuracy_before = None
+        if not bootstrapped:
+            _report(progress, "update", windows=len(features), sessions=len(model.sessions))
+            accuracy_before = model.update(_session_name(data_file), features, weight=weight)
+
+        _report(progress, "saving", accuracy_before=accuracy_before)
+        from pycaret.internal.persistence import save_model
+        # A new registry version's folder only exists once it has a model
+        if os.path.dirname(model_name):
+            os.makedirs(os.path.dirname(model_name), exist_ok=True)
+        staging = staging_name(model_name)
+        try:
+            save_model(model.pipeline, staging, verbose=False)
+            export_predictor(model.pipeline, extractor.feature_names()).save(staging)
+            model.save(staging)
+            if base_model != model_name:
+                unmixing.save(staging)
+                extractor.save(staging)
+                if filters is not None:
+                    filters.save(staging)
+            # Otherwise the unmixing, features and filters stay the model's own
+            commit_artifacts(staging, model_name, replace_all=False)
+        finally:
+            discard_staged(staging)
+
+        print(f"Model updated from {data_file} in {time.time() - start:.2f}s")
+        return True
+
+    except Exception as e:
+        print(f"Error in update_model: {str(e)}")
+        _report(progress, "error", message=str(e))
+        import traceback
+        traceback.print_exc()
+        return False
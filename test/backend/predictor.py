@@ -0,0 +1,205 @@
+"""Lean predictor exported from a fitted PyCaret pipeline.
+
+predict_model validates and copies a DataFrame, runs every pipeline step through
+PyCaret's column wrappers and scores all the columns on every call. For the real-time
+path we only need: feature array in, label and probabilities out. export_predictor
+pulls the fitted imputation/scaling parameters and the estimator out of the pipeline
+saved by save_model, and LeanPredictor replays them with plain NumPy.
+
+Linear models (logistic regression, LDA, SGD with log loss) and QDA are kept as their
+coefficients only, so loading them doesn't import sklearn, let alone PyCaret, which
+takes seconds on the rig. To export a model trained in the notebooks:
+    python predictor.py nbest
+"""
+import os
+import pickle
+import sys
+
+import numpy as np
+
+
+class LeanPredictor:
+    """Array in, label/probabilities out"""
+
+    def __init__(self, feature_names, classes, fill_values, mean, scale, estimator, coef=None, intercept=None,
+                 quadratic=None):
+        self.feature_names = list(feature_names)
+        self.classes = np.asarray(classes)
+        self.fill_values = fill_values
+        self.mean = mean
+        self.scale = scale
+        self.estimator = estimator
+        self.coef = coef
+        self.intercept = intercept
+        # QDA as (class means, per class projections, per class offsets)
+        self.quadratic = quadratic
+
+    def _prepare(self, X):
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        if self.fill_values is not None:
+            missing = np.isnan(X)
+            if missing.any():
+                X[missing] = np.broadcast_to(self.fill_values, X.shape)[missing]
+        if self.mean is not None:
+            X = (X - self.mean) / self.scale
+        return X
+
+    def transform(self, X):
+        """Features imputed and scaled as the estimator sees them"""
+        return self._prepare(X)
+
+    def decision(self, X):
+        """Per class scores, probabilities where the model provides them"""
+        X = self._prepare(X)
+        if self.coef is not None:
+            scores = X @ self.coef.T + self.intercept
+            if scores.shape[1] == 1:
+                # Binary linear models score the positive class only
+                positive = 1 / (1 + np.exp(-scores[:, 0]))
+                return np.column_stack((1 - positive, positive))
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return scores / scores.sum(axis=1, keepdims=True)
+        if getattr(self, 'quadratic', None) is not None:
+            means, projections, offsets = self.quadratic
+            # (n, classes, features): each sample centred on each class mean, then whitened
+            whitened = np.einsum('nkf,kfg->nkg', X[:, None, :] - means[None], projections)
+            scores = offsets - 0.5 * np.sum(whitened * whitened, axis=2)
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return scores / scores.sum(axis=1, keepdims=True)
+        if hasattr(self.estimator, 'predict_proba'):
+            return self.estimator.predict_proba(X)
+        # No probabilities (e.g. SVM with hinge loss): one-hot the predicted class
+        predicted = self.estimator.predict(X)
+        return (np.asarray(predicted)[:, None] == self.estimator.classes_).astype(np.float64)
+
+    def predict_proba(self, X):
+        return self.decision(X)
+
+    def predict(self, X):
+        """Return (labels, scores) where scores is the winning class probability"""
+        proba = self.decision(X)
+        best = proba.argmax(axis=1)
+        return self.classes[best], proba[np.arange(len(best)), best]
+
+    def save(self, model_name):
+        with open(predictor_path(model_name), 'wb') as f:
+            pickle.dump(self, f)
+
+
+def _unwrap(step):
+    """PyCaret wraps sklearn transformers to select columns, return the inner one"""
+    return getattr(step, 'transformer', step)
+
+
+def export_predictor(pipeline, feature_names):
+    """Build a LeanPredictor from a fitted PyCaret pipeline, or raise ValueError if a step
+    can't be replayed outside PyCaret"""
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    feature_names = list(feature_names)
+    n_features = len(feature_names)
+    fill_values = None
+    mean = None
+    scale = None
+    classes = None
+
+    for name, step in pipeline.steps[:-1]:
+        inner = _unwrap(step)
+        include = getattr(step, 'include', None)
+        if include is not None and len(include) == 0:
+            # Wrapper with no columns to act on, e.g. the categorical imputer
+            continue
+        if include is not None and list(include) != feature_names:
+            raise ValueError(f"Step '{name}' only applies to some columns, can't export")
+
+        if type(inner).__name__ == 'CleanColumnNames':
+            # Only renames DataFrame columns, nothing to do for arrays
+            continue
+        if isinstance(inner, LabelEncoder):
+            classes = inner.classes_
+        elif isinstance(inner, SimpleImputer):
+            fill_values = np.asarray(inner.statistics_, dtype=np.float64)
+        elif isinstance(inner, StandardScaler):
+            mean = np.asarray(inner.mean_ if inner.with_mean else np.zeros(n_features), dtype=np.float64)
+            scale = np.asarray(inner.scale_ if inner.with_std else np.ones(n_features), dtype=np.float64)
+        else:
+            raise ValueError(f"Pipeline step '{name}' ({type(inner).__name__}) is not supported")
+
+    estimator = pipeline.steps[-1][1]
+    if classes is None:
+        classes = estimator.classes_
+
+    coef = intercept = quadratic = None
+    kind = type(estimator).__name__
+    if kind in ('LogisticRegression', 'LinearDiscriminantAnalysis') or (
+            kind == 'SGDClassifier' and estimator.loss == 'log_loss'):
+        coef = np.asarray(estimator.coef_, dtype=np.float64)
+        intercept = np.asarray(estimator.intercept_, dtype=np.float64)
+    elif kind == 'QuadraticDiscriminantAnalysis':
+        # sklearn's _decision_function with the per class terms worked out once
+        projections = np.stack([rotation * scaling ** -0.5
+                                for rotation, scaling in zip(estimator.rotations_, estimator.scalings_)])
+        offsets = np.array([-0.5 * np.sum(np.log(scaling)) for scaling in estimator.scalings_])
+        offsets += np.log(estimator.priors_)
+        quadratic = (np.asarray(estimator.means_, dtype=np.float64), projections, offsets)
+
+    # The estimator itself is only kept when there is no NumPy replay of it
+    if coef is not None or quadratic is not None:
+        estimator = None
+    return LeanPredictor(feature_names, classes, fill_values, mean, scale, estimator, coef, intercept, quadratic)
+
+
+def predictor_path(model_name):
+    """The lean predictor saved alongside <model_name>.pkl"""
+    return f'{model_name}_predictor.pkl'
+
+
+def load_predictor(model_name):
+    """Load the exported predictor, or None if the model was never exported"""
+    path = predictor_path(model_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_classifier(model_name):
+    """The exported predictor if there is one, else the PyCaret pipeline (importing
+    PyCaret takes seconds, see main() to export the predictor once)"""
+    model = load_predictor(model_name)
+    if model is None:
+        print(f"No {predictor_path(model_name)}, loading the PyCaret pipeline")
+        from pycaret.classification import load_model
+        model = load_model(model_name, verbose=False)
+    return model
+
+
+def predict_labels(model, X, feature_names):
+    """Labels for the rows of X, from a LeanPredictor or a PyCaret pipeline"""
+    if isinstance(model, LeanPredictor):
+        return model.predict(X)[0]
+    import pandas as pd
+    return np.asarray(model.predict(pd.DataFrame(X, columns=feature_names)))
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    model_name = sys.argv[1]
+    from pycaret.classification import load_model
+    # Pickle the class as predictor.LeanPredictor, not __main__.LeanPredictor
+    from predictor import export_predictor
+
+    pipeline = load_model(model_name, verbose=False)
+    # PyCaret's pipeline takes the training frame's columns, the target last
+    feature_names = list(pipeline.feature_names_in_[:-1])
+    predictor = export_predictor(pipeline, feature_names)
+    predictor.save(model_name)
+    replay = 'NumPy' if predictor.estimator is None else type(predictor.estimator).__name__
+    print(f"Saved {predictor_path(model_name)}: {feature_names} -> {list(predictor.classes)} ({replay})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+"""Compact binary recordings.
+
+A recording is a directory <name>.rec holding
+    meta.json        sample rate, channel names, label, session id, sample count
+    raw.npy          int16 ADC samples, one column per channel
+    ics.npy          float32 independent components (optional)
+    timestamps.npy   float64 seconds since the start (optional, else derived from the rate)
+
+The .npy files are memory-mapped when opened, so training reads only what it touches
+and no text is parsed. RecordingWriter streams a recording to disk while it is being
+recorded, add_ics() fills in the ICs afterwards. To convert existing CSV recordings:
+    python recording_store.py data_go.csv data_stop.csv
+"""
+import glob
+import io
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import numpy as np
+
+RECORDING_SUFFIX = '.rec'
+PARTIAL_SUFFIX = '.partial'
+FORMAT_VERSION = 1
+
+
+def recording_path(name):
+    """<name>.rec, unless name already is one"""
+    return name if name.endswith(RECORDING_SUFFIX) else name + RECORDING_SUFFIX
+
+
+class Recording:
+    """One labelled session: raw samples plus optional ICs and timestamps"""
+
+    def __init__(self, meta, raw, ics=None, timestamps=None):
+        self.meta = meta
+        self.raw = raw
+        self.ics = ics
+        self._timestamps = timestamps
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def label(self):
+        return self.meta.get('label')
+
+    @property
+    def sample_rate(self):
+        if not self.meta.get('sample_rate'):
+            raise ValueError(f"Recording {self.meta.get('session_id')} has no sample rate, it ended before one "
+                             f"could be measured")
+        return self.meta['sample_rate']
+
+    @property
+    def usable(self):
+        """False for recordings too short to measure their sample rate, see finalize()"""
+        return bool(self.meta.get('sample_rate'))
+
+    @property
+    def n_channels(self):
+        return self.raw.shape[1]
+
+    @property
+    def timestamps(self):
+        if self._timestamps is not None:
+            return self._timestamps
+        return np.arange(len(self.raw)) / self.sample_rate
+
+    @classmethod
+    def from_frame(cls, df, label=None, session_id=None):
+        """Recording from a DataFrame in the CSV layout (Raw_EMG*, IC*/Independent_Component)"""
+        from features import estimate_sample_rate
+
+        raw_columns = [col for col in df.columns if col.startswith('Raw_EMG')]
+        ic_columns = [col for col in df.columns if col.startswith('IC') or col == 'Independent_Component']
+        if not raw_columns:
+            raise ValueError("No Raw_EMG columns found")
+        if label is None and 'Label' in df:
+            label = df['Label'].iloc[0]
+        timestamps = df['Timestamp'].to_numpy(dtype=np.float64) if 'Timestamp' in df else None
+        meta = {
+            "channels": raw_columns,
+            "ic_channels": ic_columns,
+            "label": None if label is None else str(label),
+            "session_id": session_id or uuid.uuid4().hex[:12],
+            "sample_rate": float(estimate_sample_rate(timestamps)) if timestamps is not None else None,
+        }
+        return cls(meta, df[raw_columns].to_numpy(), df[ic_columns].to_numpy() if ic_columns else None, timestamps)
+
+    def to_frame(self):
+        """DataFrame in the CSV layout the notebooks and older scripts expect"""
+        import pandas as pd
+
+        columns = {'Timestamp': self.timestamps}
+        for index, name in enumerate(self.meta['channels']):
+            columns[name] = self.raw[:, index]
+        if self.ics is not None:
+            for index, name in enumerate(self.meta['ic_channels']):
+                columns[name] = self.ics[:, index]
+        columns['Label'] = self.label
+        return pd.DataFrame(columns)
+
+
+def _default_channels(n_channels):
+    return [f'Raw_EMG{i + 1}' for i in range(n_channels)] if n_channels > 1 else ['Raw_EMG']
+
+
+def _check_int16(raw):
+    if raw.size and (raw.min() < np.iinfo(np.int16).min or raw.max() > np.iinfo(np.int16).max):
+        raise ValueError("Raw samples don't fit in int16")
+
+
+def _write_meta(path, meta):
+    # Replace, never rewrite in place, so a crash leaves the old or the new version
+    tmp_file = os.path.join(path, 'meta.json.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_file, os.path.join(path, 'meta.json'))
+
+
+def _swap_in(tmp_path, path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def write_recording(name, raw, ics=None, timestamps=None, sample_rate=None, label=None, session_id=None,
+                    channels=None, ic_channels=None):
+    """Write a recording and return its path. Replaces an existing one of the same name."""
+    raw = np.asarray(raw)
+    if raw.ndim == 1:
+        raw = raw[:, None]
+    _check_int16(raw)
+    if sample_rate is None:
+        if timestamps is None:
+            raise ValueError("Either sample_rate or timestamps is required")
+        from features import estimate_sample_rate
+        sample_rate = estimate_sample_rate(timestamps)
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "label": None if label is None else str(label),
+        "session_id": session_id or uuid.uuid4().hex[:12],
+        "sample_rate": float(sample_rate),
+        "n_samples": len(raw),
+        "channels": list(channels or _default_channels(raw.shape[1])),
+        "ic_channels": [],
+        "created": time.time(),
+    }
+
+    # Write next to the target and swap in at the end, readers never see half a recording
+    path = recording_path(name)
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:6]}'
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'raw.npy'), raw.astype(np.int16))
+    if ics is not None:
+        ics = np.asarray(ics, dtype=np.float32)
+        if ics.ndim == 1:
+            ics = ics[:, None]
+        meta["ic_channels"] = list(ic_channels or [f'IC{i + 1}' for i in range(ics.shape[1])])
+        np.save(os.path.join(tmp_path, 'ics.npy'), ics)
+    if timestamps is not None:
+        np.save(os.path.join(tmp_path, 'timestamps.npy'), np.asarray(timestamps, dtype=np.float64))
+    _write_meta(tmp_path, meta)
+
+    _swap_in(tmp_path, path)
+    return path
+
+
+def _npy_header(n_samples, n_channels):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header, {'descr': np.dtype(np.int16).str, 'fortran_order': False, 'shape': (n_samples, n_channels)})
+    return header.getvalue()
+
+
+class RecordingWriter:
+    """Append samples to a recording on disk while it is being recorded.
+
+    Samples go straight into <name>.rec.partial/raw.npy. Every flush_interval seconds
+    the file is synced and its header rewritten with the sample count, so raw.npy is
+    always a valid array of everything flushed so far. finalize() moves the folder into
+    place; a folder left behind by a crash is picked up by recover_recordings().
+    """
+
+    def __init__(self, name, n_channels, label=None, session_id=None, channels=None, flush_interval=1.0, user=None):
+        self.path = recording_path(name)
+        self.partial_path = self.path + PARTIAL_SUFFIX
+        self.n_channels = n_channels
+        self.flush_interval = flush_interval
+        self.n_samples = 0
+        if os.path.exists(self.partial_path):
+            print(f"Discarding unfinished recording {self.partial_path}")
+            shutil.rmtree(self.partial_path)
+        os.makedirs(self.partial_path)
+
+        self.started = time.time()
+        self._last_sample_time = self.started
+        self._last_flush = self.started
+        self.meta = {
+            "version": FORMAT_VERSION,
+            "label": None if label is None else str(label),
+            "user": user,
+            "session_id": session_id or uuid.uuid4().hex[:12],
+            "sample_rate": None,
+            "n_samples": 0,
+            "channels": list(channels or _default_channels(n_channels)),
+            "ic_channels": [],
+            "created": self.started,
+            "status": "recording",
+        }
+        _write_meta(self.partial_path, self.meta)
+        self._file = open(os.path.join(self.partial_path, 'raw.npy'), 'wb')
+        self._file.write(_npy_header(0, n_channels))
+
+    def append(self, samples):
+        samples = np.asarray(samples).reshape(-1, self.n_channels)
+        _check_int16(samples)
+        self._file.write(samples.astype('<i2').tobytes())
+        self.n_samples += len(samples)
+        self._last_sample_time = time.time()
+        if self._last_sample_time - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Make every sample so far durable and visible in the header"""
+        self._file.flush()
+        end = self._file.tell()
+        self._file.seek(0)
+        self._file.write(_npy_header(self.n_samples, self.n_channels))
+        self._file.seek(end)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_flush = time.time()
+        self.meta.update(n_samples=self.n_samples, updated=self._last_sample_time)
+        _write_meta(self.partial_path, self.meta)
+
+    def finalize(self, sample_rate=None):
+        """Close the file and move the recording into place, returns its path. If the
+        samples arrived too fast to measure their rate, the recording is kept but marked
+        "unusable" with no sample rate: nothing can be timed or trained on it."""
+        self.flush()
+        self._file.close()
+        if sample_rate is None:
+            elapsed = self._last_sample_time - self.started
+            sample_rate = self.n_samples / elapsed if elapsed > 0 else None
+        if sample_rate:
+            self.meta.update(sample_rate=float(sample_rate), status="complete")
+        else:
+            print(f"No sample rate for {self.path}, marking it unusable")
+            self.meta.update(sample_rate=None, status="unusable")
+        _write_meta(self.partial_path, self.meta)
+        _swap_in(self.partial_path, self.path)
+        return self.path
+
+    def abort(self):
+        """Throw the recording away"""
+        self._file.close()
+        shutil.rmtree(self.partial_path, ignore_errors=True)
+
+
+def recover_recordings(pattern='data_*'):
+    """Finalize recordings left unfinished by a crash, returns their paths"""
+    recovered = []
+    for partial_path in glob.glob(pattern + RECORDING_SUFFIX + PARTIAL_SUFFIX):
+        with open(os.path.join(partial_path, 'meta.json')) as f:
+            meta = json.load(f)
+        n_channels = len(meta['channels'])
+        raw_file = os.path.join(partial_path, 'raw.npy')
+        header_size = len(_npy_header(0, n_channels))
+        # Samples written after the last flush are usually on disk too
+        n_samples = (os.path.getsize(raw_file) - header_size) // (2 * n_channels)
+        if n_samples <= 0:
+            shutil.rmtree(partial_path)
+            continue
+        with open(raw_file, 'r+b') as f:
+            f.write(_npy_header(n_samples, n_channels))
+            f.truncate(header_size + n_samples * 2 * n_channels)
+        elapsed = meta.get('updated', meta['created']) - meta['created']
+        flushed = meta.get('n_samples', 0)
+        # The rate is measured over what was flushed, without a flush there's none to go by
+        if elapsed > 0 and flushed > 0:
+            meta.update(n_samples=int(n_samples), status="recovered", sample_rate=float(flushed / elapsed))
+        else:
+            print(f"No sample rate for {partial_path}, marking it unusable")
+            meta.update(n_samples=int(n_samples), status="unusable", sample_rate=None)
+        _write_meta(partial_path, meta)
+        path = partial_path[:-len(PARTIAL_SUFFIX)]
+        _swap_in(partial_path, path)
+        print(f"Recovered {n_samples} samples into {path}")
+        recovered.append(path)
+    return recovered
+
+
+def add_ics(path, n_components=None, max_fit_samples=200000, chunk_samples=1000000):
+    """Fit ICA on a recording after the fact and store its components as ics.npy.
+
+    ICA is fitted on at most max_fit_samples evenly spaced samples and applied chunk by
+    chunk, so the recording is never loaded into memory as a whole.
+    """
+    from unmixing import FixedUnmixing
+
+    recording = open_recording(path)
+    step = max(1, len(recording) // max_fit_samples)
+    unmixing = FixedUnmixing.fit(np.asarray(recording.raw[::step], dtype=np.float64), n_components)
+
+    n_ics = unmixing.components.shape[0]
+    tmp_file = os.path.join(recording_path(path), 'ics.npy.tmp')
+    ics = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.float32, shape=(len(recording), n_ics))
+    for start in range(0, len(recording), chunk_samples):
+        ics[start:start + chunk_samples] = unmixing.transform(np.asarray(recording.raw[start:start + chunk_samples]))
+    ics.flush()
+    del ics
+    os.replace(tmp_file, os.path.join(recording_path(path), 'ics.npy'))
+
+    recording.meta["ic_channels"] = [f'IC{i + 1}' for i in range(n_ics)]
+    _write_meta(recording_path(path), recording.meta)
+    return unmixing
+
+
+def open_recording(path, mmap_mode='r'):
+    """Open a recording with its arrays memory-mapped"""
+    path = recording_path(path)
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+
+    def load(filename):
+        file = os.path.join(path, filename)
+        return np.load(file, mmap_mode=mmap_mode) if os.path.exists(file) else None
+
+    return Recording(meta, load('raw.npy'), load('ics.npy'), load('timestamps.npy'))
+
+
+def load_session(path):
+    """A Recording from either a .rec directory or a CSV file"""
+    if path.endswith('.csv'):
+        import pandas as pd
+        return Recording.from_frame(pd.read_csv(path))
+    return open_recording(path)
+
+
+def find_sessions(pattern='data_*'):
+    """Recordings matching pattern, the binary one when a CSV of the same name also exists.
+    Unusable recordings (no sample rate) are left out."""
+    found = {}
+    for path in sorted(glob.glob(pattern + '.csv')):
+        found[path[:-len('.csv')]] = path
+    for path in sorted(glob.glob(pattern + RECORDING_SUFFIX)):
+        if not open_recording(path).usable:
+            print(f"Skipping {path}, it has no sample rate")
+            continue
+        found[path[:-len(RECORDING_SUFFIX)]] = path
+    return [found[stem] for stem in sorted(found)]
+
+
+def convert_csv(csv_path, name=None):
+    """Convert a CSV recording, one .rec per label. Returns the paths written."""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    stem = name or os.path.splitext(csv_path)[0]
+    labels = list(df['Label'].unique()) if 'Label' in df else [None]
+    paths = []
+    for label in labels:
+        part = df if label is None else df[df['Label'] == label]
+        recording = Recording.from_frame(part.reset_index(drop=True))
+        target = stem if len(labels) == 1 else f'{stem}_{str(label).lower()}'
+        paths.append(write_recording(
+            target, recording.raw, recording.ics, recording._timestamps,
+            sample_rate=recording.sample_rate, label=recording.label,
+            channels=recording.meta['channels'], ic_channels=recording.meta['ic_channels']
+        ))
+    return paths
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for csv_path in sys.argv[1:]:
+        for path in convert_csv(csv_path):
+            print(f"{csv_path} ({_size(csv_path)} bytes) -> {path} ({_size(path)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
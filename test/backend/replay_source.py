@@ -0,0 +1,128 @@
+"""Feed a recorded session to the backend as if it came off the amplifier.
+
+A ReplaySource stands in for SerialSampleSource: the acquisition thread, ring buffer,
+filters, inference and WebSocket dispatch downstream of it are the live ones. Samples
+are released at the times they were recorded (the CSV's Timestamp column, or the
+sample rate of a .rec), divided by the speed, so gaps and jitter in the original
+session are kept. Any port given to the backend as
+
+    replay://<recording>[?speed=<N>&loop=1]
+
+is replayed, e.g. EMG_PORT=replay://data_go.rec?speed=10 python app.py, or
+{"port": "replay://../../Nyan_AI/ndata.csv?loop=1"} POSTed to /api/sessions.
+speed=max replays as fast as the pipeline consumes the samples, never running more
+than MAX_LEAD_SECONDS (or two windows) of signal ahead of the inference thread.
+Inference on a replay takes each window or hop as a count of samples rather than
+wall clock time: decisions come speed times as often, and replaying a recording
+twice gives the same windows.
+Without loop=1 the session ends once the recording has been played.
+"""
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from recording_store import load_session
+from serial_source import SerialSampleSource
+
+REPLAY_SCHEME = 'replay://'
+MAX_LEAD_SECONDS = 2.0
+ASAP_CHUNK_SECONDS = 0.1  # signal time per read when replaying as fast as possible
+
+
+def is_replay(port):
+    return isinstance(port, str) and port.startswith(REPLAY_SCHEME)
+
+
+class ReplayFinished(EOFError):
+    """The recording has been played to the end"""
+
+
+class ReplaySource(SerialSampleSource):
+    """Release a recording's samples on its original timeline, speed times faster.
+
+    speed=None replays as fast as possible. Reads block for at most timeout seconds,
+    like a port, and return at least chunk_seconds (wall time) of samples at once.
+    """
+
+    def __init__(self, recording, speed=1.0, loop=False, chunk_seconds=0.01, timeout=1.0, name=None):
+        self.recording = recording
+        self.name = name
+        self.raw = recording.raw
+        self.sample_rate = float(recording.sample_rate)
+        # Seconds from the first sample, never going backwards
+        times = np.asarray(recording.timestamps, dtype=np.float64)
+        self.times = np.maximum.accumulate(times - times[0])
+        self.duration = self.times[-1] + 1 / self.sample_rate
+        self.speed = float(speed) if speed and np.isfinite(speed) else None
+        self.loop = loop
+        self.chunk_seconds = chunk_seconds
+        self.timeout = timeout
+        self.decoder = None
+        self.bytes_read = 0
+        self.samples_read = 0
+        self.position = 0
+        self.passes = 0
+        self._pending = np.empty((0, self.n_channels), dtype=self.raw.dtype)
+        self._origin = None
+        self._last_read = 0.0
+        self._consumer = None
+        self._lead = int(MAX_LEAD_SECONDS * self.sample_rate)
+
+    @classmethod
+    def from_url(cls, url):
+        """replay://<recording>[?speed=10&loop=1], speed=max for as fast as possible"""
+        path, _, query = url[len(REPLAY_SCHEME):].partition('?')
+        options = {key: values[-1] for key, values in parse_qs(query).items()}
+        speed = options.get('speed', '1')
+        speed = None if speed in ('max', '0', 'inf') else float(speed)
+        loop = options.get('loop', '0').lower() in ('1', 'true', 'yes')
+        return cls(load_session(path), speed=speed, loop=loop, name=path)
+
+    @property
+    def n_channels(self):
+        return self.raw.shape[1]
+
+    def follow(self, buffer, window_seconds=0.0):
+        """Hold an as-fast-as-possible replay back to what the buffer's reader keeps up with"""
+        self._consumer = buffer
+        self._lead = int(max(MAX_LEAD_SECONDS, 2 * window_seconds) * self.sample_rate)
+
+    def read(self):
+        if self.position >= len(self.raw):
+            if not self.loop:
+                raise ReplayFinished(f"Replay of {self.name or 'recording'} finished")
+            self.position = 0
+            self.passes += 1
+            if self._origin is not None:
+                self._origin += self.duration / self.speed if self.speed else 0.0
+        if self.speed is None:
+            return self._read_asap()
+
+        now = time.time()
+        if self._origin is None:
+            self._origin = now - self.times[self.position] / self.speed
+        # Wake for the next sample due, but no sooner than a chunk after the last read
+        wake = max(self._origin + self.times[self.position] / self.speed, self._last_read + self.chunk_seconds)
+        if wake > now:
+            time.sleep(min(wake - now, self.timeout))
+        self._last_read = time.time()
+        due = (self._last_read - self._origin) * self.speed
+        return self._take(int(np.searchsorted(self.times, due, side='right')))
+
+    def _read_asap(self):
+        buffer = self._consumer
+        if buffer is not None and buffer.write_index - buffer.read_index >= self._lead:
+            time.sleep(0.0005)
+            return self._pending[:0]
+        return self._take(self.position + max(1, int(ASAP_CHUNK_SECONDS * self.sample_rate)))
+
+    def _take(self, end):
+        end = min(max(end, self.position), len(self.raw))
+        samples = np.asarray(self.raw[self.position:end])
+        self.position = end
+        self.samples_read += len(samples)
+        return samples
+
+    def close(self):
+        pass
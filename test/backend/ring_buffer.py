@@ -0,0 +1,129 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SampleRingBuffer:
+    """Preallocated per-channel ring buffer written by a single acquisition thread.
+
+    Samples are addressed by a monotonically increasing sample index. Before copying a
+    chunk in, the writer advances ``reserved_index`` past it, and only publishes
+    ``write_index`` once the data is in place. Readers never read past ``write_index`` and
+    re-check ``reserved_index`` after copying, so a copy the writer raced with is detected
+    (and counted as an overrun) without either side taking a lock.
+    """
+
+    def __init__(self, capacity, n_channels, dtype=np.int32):
+        self.capacity = capacity
+        self.n_channels = n_channels
+        self.data = np.zeros((capacity, n_channels), dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.write_index = 0
+        self.reserved_index = 0
+        self.read_index = 0
+        self.overruns = 0
+        self.last_write_time = None
+
+    def write(self, samples, timestamp=None):
+        """Append an (n, channels) chunk, spreading host timestamps since the previous chunk"""
+        n = len(samples)
+        if n == 0:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        previous = self.last_write_time if self.last_write_time is not None else timestamp
+        stamps = np.linspace(previous, timestamp, n + 1)[1:]
+
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            stamps = stamps[-self.capacity:]
+        # Slots about to be overwritten are claimed before the copy starts
+        self.reserved_index = self.write_index + n
+        start = (self.write_index + n - len(samples)) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.timestamps[start:start + first] = stamps[:first]
+        if first < len(samples):
+            self.data[:len(samples) - first] = samples[first:]
+            self.timestamps[:len(samples) - first] = stamps[first:]
+
+        self.last_write_time = timestamp
+        self.write_index += n
+
+    def _copy(self, start, stop):
+        """Copy samples with indices [start, stop) out of the ring"""
+        idx = np.arange(start, stop) % self.capacity
+        return self.data[idx], self.timestamps[idx]
+
+    def read_window(self, n_samples, end=None):
+        """Return (start_index, samples, timestamps) for the n_samples ending at end, or None"""
+        if end is None:
+            end = self.write_index
+        start = end - n_samples
+        if start < 0 or start < self.reserved_index - self.capacity:
+            return None
+        samples, stamps = self._copy(start, end)
+        # The writer may have lapped us while copying
+        if start < self.reserved_index - self.capacity:
+            return None
+        return start, samples, stamps
+
+    def read_new(self, max_samples=None):
+        """Consume every sample written since the last call (at most max_samples of them),
+        counting any that were overwritten"""
+        end = self.write_index
+        start = self.read_index
+        oldest = self.reserved_index - self.capacity
+        if start < oldest:
+            self.overruns += oldest - start
+            start = oldest
+        if max_samples is not None:
+            end = min(end, start + max_samples)
+        # A chunk larger than the ring can be reserved past everything written so far
+        end = max(end, start)
+        samples, stamps = self._copy(start, end)
+        oldest = self.reserved_index - self.capacity
+        if start < oldest:
+            # Lost the race with the writer, drop the overwritten prefix
+            lost = oldest - start
+            self.overruns += lost
+            samples, stamps = samples[lost:], stamps[lost:]
+            start = oldest
+            end = max(end, start)
+        self.read_index = end
+        return start, samples, stamps
+
+    def metrics(self):
+        """Buffer fill, overrun count and reader lag"""
+        now = time.time()
+        pending = self.write_index - self.read_index
+        return {
+            "written": int(self.write_index),
+            "fill": min(pending, self.capacity) / self.capacity,
+            "overruns": int(self.overruns),
+            "consumer_lag_samples": int(pending),
+            "reader_lag_ms": (now - self.last_write_time) * 1000 if self.last_write_time else None
+        }
+
+
+class AcquisitionThread(threading.Thread):
+    """Continuously drain a sample source into a ring buffer until stopped"""
+
+    def __init__(self, source, buffer, stop_event):
+        super().__init__(daemon=True)
+        self.source = source
+        self.buffer = buffer
+        self.stop_event = stop_event
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                chunk = self.source.read()
+                if len(chunk):
+                    self.buffer.write(chunk, time.time())
+        except Exception as e:
+            print(f"Acquisition error: {e}")
+            self.error = e
+            self.stop_event.set()
@@ -0,0 +1,202 @@
+"""Switch latency against false switches of the decision layer, on recorded sessions.
+
+The label runs of the recordings are cut into --chunk-seconds pieces and strung together
+taking the labels in turn (pieces shuffled with --seed), so a few recordings give many
+command changes. The sequence is scored as one signal by score_sessions.py's scorers
+(window models every --hop-ms, per-sample models voted over --window-samples), and every
+window's label and score is then fed through the decision layer (decisions.py) for every
+combination of --methods, --time-constants, --enter and --dwell, and without it ("raw").
+
+For every change of the true label, the switch latency runs from the change to the
+decision switching to the new label; a change the decision doesn't follow before the
+next one is missed (one it was already on when it came isn't timed). Every other
+switch is a false switch. Per setting we report median
+and p90 latency, missed changes, false switches per minute and the share of windows
+decided right. * marks the settings no other setting beats on both latency and false
+switches without missing more changes.
+
+Run from test/backend:
+    python score_decisions.py nbest data_go.rec data_stop.rec --hop-ms 50
+    python score_decisions.py ../../Nyan_AI/nbest ../../Nyan_AI/ndata.csv --window-samples 250 --stop-label NO
+"""
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+
+from decisions import DecisionPolicy, DEFAULT_SMOOTHING, model_classes
+from recording_store import Recording
+from score_sessions import LEGACY_WINDOW_SAMPLES, load_segments, make_scorer
+
+
+def interleave(paths, chunk_seconds, seed=0):
+    """One Recording of the label runs' pieces, labels taken in turn, and each sample's label"""
+    pieces = {}
+    for path in paths:
+        for _, recording in load_segments(path):
+            if recording.label is None:
+                raise ValueError(f"{path} has no labels")
+            step = max(1, int(chunk_seconds * (recording.sample_rate or 1000)))
+            for start in range(0, len(recording), step):
+                pieces.setdefault(recording.label, []).append((recording, start, min(start + step, len(recording))))
+    if len(pieces) < 2:
+        raise ValueError(f"Need recordings of at least two labels, got {', '.join(pieces) or 'none'}")
+
+    rng = np.random.default_rng(seed)
+    for label_pieces in pieces.values():
+        rng.shuffle(label_pieces)
+    order = [piece for turn in itertools.zip_longest(*pieces.values()) for piece in turn if piece is not None]
+    first = order[0][0]
+    if len({recording.n_channels for recording, _, _ in order}) > 1:
+        raise ValueError("The recordings have different numbers of channels")
+    raw = np.concatenate([recording.raw[start:end] for recording, start, end in order])
+    with_ics = all(recording.ics is not None for recording, _, _ in order)
+    ics = np.concatenate([recording.ics[start:end] for recording, start, end in order]) if with_ics else None
+    truth = np.concatenate([np.full(end - start, recording.label, dtype=object) for recording, start, end in order])
+    meta = {**first.meta, "label": None, "sample_rate": first.sample_rate or 1000}
+    return Recording(meta, raw, ics), truth
+
+
+def decide(policy, labels, scores, times, classes=None):
+    """The decision after every window"""
+    stream = policy.stream(classes)
+    return np.array([stream.update(label, score, t)[0] for label, score, t in zip(labels, scores, times)],
+                    dtype=object)
+
+
+def switch_stats(decided, times, truth_windows, change_times, change_labels):
+    """Latency of following each true change, missed changes and false switches"""
+    switches = [i for i in range(1, len(decided)) if decided[i] != decided[i - 1]]
+    followed = set()
+    latencies = []
+    missed = 0
+    for index, (change, label) in enumerate(zip(change_times, change_labels)):
+        until = change_times[index + 1] if index + 1 < len(change_times) else np.inf
+        # Already on the new label at the change: nothing to follow, that switch came early and was false
+        at_change = np.searchsorted(times, change, side='left')
+        if 0 < at_change <= len(decided) and decided[at_change - 1] == label:
+            continue
+        hit = next((i for i in switches if change <= times[i] < until and decided[i] == label), None)
+        if hit is None:
+            missed += 1
+        else:
+            followed.add(hit)
+            latencies.append(times[hit] - change)
+    return {
+        "latencies": latencies,
+        "missed": missed,
+        "false_switches": len(switches) - len(followed),
+        "accuracy": float(np.mean(decided == truth_windows)) if len(decided) else None,
+    }
+
+
+def summarize(name, settings, stats, minutes):
+    latencies = np.asarray(stats['latencies'])
+    return {
+        "name": name,
+        "settings": settings,
+        "median_latency_s": float(np.median(latencies)) if len(latencies) else None,
+        "p90_latency_s": float(np.percentile(latencies, 90)) if len(latencies) else None,
+        "missed": stats['missed'],
+        "false_switches": stats['false_switches'],
+        "false_per_min": stats['false_switches'] / minutes,
+        "accuracy": stats['accuracy'],
+    }
+
+
+def mark_frontier(results):
+    """Settings no other setting beats on latency and false switches, missing no more changes"""
+    def key(result):
+        return (result['missed'], result['median_latency_s'] if result['median_latency_s'] is not None else np.inf,
+                result['false_per_min'])
+    for result in results:
+        mine = key(result)
+        result['frontier'] = not any(
+            other is not result and all(a <= b for a, b in zip(key(other), mine)) and key(other) != mine
+            for other in results)
+
+
+def policies(args):
+    """(name, policy) for the raw labels and every combination of the settings on the command line"""
+    yield 'raw', DecisionPolicy.raw()
+    grid = itertools.product(args.methods.split(','), _floats(args.time_constants), _floats(args.enter),
+                             _floats(args.dwell))
+    for method, time_constant, enter, dwell in grid:
+        policy = DecisionPolicy(method, time_constant, enter, dwell, args.stop_label, args.stop_threshold)
+        yield f"{method} tc={time_constant:g} enter={enter:g} dwell={dwell:g}", policy
+
+
+def _floats(text):
+    return [float(value) for value in text.split(',')]
+
+
+def print_results(results):
+    print(f"\n  {'setting':<36} {'median s':>9} {'p90 s':>7} {'missed':>7} {'false/min':>10} {'accuracy':>9}")
+    for result in results:
+        median = '-' if result['median_latency_s'] is None else f"{result['median_latency_s']:.3f}"
+        p90 = '-' if result['p90_latency_s'] is None else f"{result['p90_latency_s']:.3f}"
+        accuracy = '-' if result['accuracy'] is None else f"{result['accuracy']:.3f}"
+        print(f"{'*' if result['frontier'] else ' '} {result['name']:<36} {median:>9} {p90:>7} {result['missed']:>7} "
+              f"{result['false_per_min']:>10.2f} {accuracy:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', help='model name, e.g. nbest or ../../Nyan_AI/nbest (without .pkl)')
+    parser.add_argument('files', nargs='+', help='.rec folders or CSV recordings, at least two labels between them')
+    parser.add_argument('--hop-ms', type=float, default=50, help='window hop for window models')
+    parser.add_argument('--window-samples', type=int, default=LEGACY_WINDOW_SAMPLES,
+                        help='samples per vote for per-sample models')
+    parser.add_argument('--chunk-seconds', type=float, default=3.0, help='seconds between label changes')
+    parser.add_argument('--seed', type=int, default=0, help='order of the pieces')
+    parser.add_argument('--methods', default='ema,bayes', help='comma separated: ema, bayes, none')
+    parser.add_argument('--time-constants', default='0.1,0.3,1', help='comma separated seconds')
+    parser.add_argument('--enter', default='0.5,0.7,0.9', help='comma separated hysteresis thresholds')
+    parser.add_argument('--dwell', default='0,0.5', help='comma separated minimum dwell seconds')
+    parser.add_argument('--stop-label', default=DEFAULT_SMOOTHING['stop_label'], help='label that stops at once')
+    parser.add_argument('--stop-threshold', type=float, default=DEFAULT_SMOOTHING['stop_threshold'],
+                        help='window probability of the stop label that overrides smoothing')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+    model_name = args.model[:-4] if args.model.endswith('.pkl') else args.model
+
+    recording, truth = interleave(args.files, args.chunk_seconds, args.seed)
+    rate = recording.sample_rate
+    scorer = make_scorer(model_name, args.hop_ms, args.window_samples)
+    started = time.perf_counter()
+    labels, scores = scorer.score(recording)
+    labels = labels.astype(str)
+    print(f"{len(labels)} windows over {len(recording) / rate:.1f} s of signal scored in "
+          f"{time.perf_counter() - started:.2f} s")
+
+    # A decision is made once its window's last sample is in
+    ends = np.arange(len(labels)) * scorer.hop_samples + scorer.window_samples
+    times = ends / rate
+    truth_windows = truth[ends - 1]
+    boundaries = np.flatnonzero(truth[1:] != truth[:-1]) + 1
+    change_times = boundaries / rate
+    change_labels = truth[boundaries]
+    minutes = len(recording) / rate / 60
+    print(f"{len(boundaries)} label changes, one every {args.chunk_seconds:g} s")
+
+    classes = model_classes(scorer.bundle.model if hasattr(scorer, 'bundle') else scorer.model)
+    results = []
+    for name, policy in policies(args):
+        decided = decide(policy, labels, scores, times, classes)
+        stats = switch_stats(decided, times, truth_windows, change_times, change_labels)
+        results.append(summarize(name, policy.settings(), stats, minutes))
+    mark_frontier(results)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"model": model_name, "files": args.files, "chunk_seconds": args.chunk_seconds,
+                       "hop_samples": scorer.hop_samples, "window_samples": scorer.window_samples,
+                       "changes": len(boundaries), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Score a saved model against recorded sessions, offline and in bulk.
+
+Replays recordings (.rec folders or CSVs, which are split into their label runs)
+through the same steps as live inference, a whole segment at a time:
+
+  window models (trained by the backend, with <model>_features.json): filters,
+    unmixing, window features and one model call per window. Windows don't overlap,
+    like block inference, unless --hop-ms gives the hop of streaming inference.
+  per-sample models (Nyan_AI/nbest.pkl, Director's_AI/bestzj.pkl): every sample of a
+    --window-samples window is classified and the window decided by the vote in
+    infrence.py (YES if more samples say YES than NO). ICs come from <model>_ica.npz,
+    or, when the model has none, from FastICA refitted on each window as the live
+    scripts do (unmixing.WindowICA).
+
+Files are scored in parallel, one per worker process, and the report gives accuracy,
+a confusion matrix per file and overall, and throughput. --predictions writes every
+window's prediction as CSV, --output the report as JSON.
+
+Run from test/backend:
+    python score_sessions.py nbest data_go.rec data_stop.rec --hop-ms 50
+    python score_sessions.py ../../Nyan_AI/nbest ../../Nyan_AI/ndata.csv "../../Director's_AI/ZJYes.csv"
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import extractor_path, emg_signals
+from predictor import load_classifier, predict_labels
+from recording_store import Recording, load_session
+from unmixing import load_unmixing
+
+LEGACY_WINDOW_SAMPLES = 1000  # predict_emg(port, sample_rate=1000) reads 1000 samples per decision
+
+_scorer = None
+
+
+def load_segments(path):
+    """(name, Recording) for every label run of a recording file"""
+    name = os.path.basename(path.rstrip('/'))
+    if not path.endswith('.csv'):
+        return [(name, load_session(path))]
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    if 'Label' not in df:
+        return [(name, Recording.from_frame(df))]
+    runs = (df['Label'] != df['Label'].shift()).cumsum()
+    return [(f'{name}#{index}', Recording.from_frame(run.reset_index(drop=True)))
+            for index, (_, run) in enumerate(df.groupby(runs))]
+
+
+class WindowScorer:
+    """The backend's real-time path: filters, unmixing, window features, one call per window"""
+
+    def __init__(self, model_name, hop_ms=None):
+        from model_registry import load_bundle
+        self.bundle = load_bundle(model_name)
+        extractor = self.bundle.extractor
+        self.window_samples = extractor.window_samples
+        if hop_ms:
+            self.hop_blocks = max(1, int(round(hop_ms / 1000 * extractor.sample_rate / extractor.block_samples)))
+        else:
+            self.hop_blocks = extractor.window_blocks
+
+    @property
+    def hop_samples(self):
+        return self.hop_blocks * self.bundle.extractor.block_samples
+
+    def score(self, recording):
+        """(labels, scores) of every window of a recording"""
+        bundle = self.bundle
+        raw = recording.raw
+        if bundle.filters is not None:
+            raw = bundle.filters.apply(raw)
+        features = bundle.extractor.window_features(emg_signals(raw, bundle.unmixing), self.hop_blocks)
+        if len(features) == 0:
+            return np.empty(0, dtype=object), np.empty(0)
+        from predictor import LeanPredictor
+        if isinstance(bundle.model, LeanPredictor):
+            return bundle.model.predict(features)
+        import pandas as pd
+        from pycaret.classification import predict_model
+        predictions = predict_model(bundle.model, data=pd.DataFrame(features, columns=bundle.extractor.feature_names()))
+        pred_col = [col for col in predictions.columns if 'prediction' in col.lower()][0]
+        scores = predictions['prediction_score'].to_numpy() if 'prediction_score' in predictions else np.full(len(features), np.nan)
+        return predictions[pred_col].to_numpy(), scores
+
+
+class VoteScorer:
+    """The original scripts' path: classify every sample, then vote over the window"""
+
+    def __init__(self, model_name, window_samples=LEGACY_WINDOW_SAMPLES):
+        self.model = load_classifier(model_name)
+        # LeanPredictor keeps its feature names, PyCaret's pipeline has the target last
+        self.feature_names = list(getattr(self.model, 'feature_names', None) or self.model.feature_names_in_[:-1])
+        self.unmixing = load_unmixing(model_name, fallback=True)
+        self.window_samples = window_samples
+        self.hop_samples = window_samples
+
+    def _frame(self, recording, n_windows):
+        """The model's input columns for every sample of n_windows windows"""
+        import pandas as pd
+
+        n = n_windows * self.window_samples
+        raw = np.asarray(recording.raw[:n], dtype=np.float64)
+        # Window by window, a WindowICA refits on each one like the live scripts
+        ics = np.vstack([self.unmixing.transform(raw[start:start + self.window_samples])
+                         for start in range(0, n, self.window_samples)])
+        # Each window's timestamps restart at 0, as in predict_emg
+        timestamps = np.tile(np.linspace(0, self.window_samples / 1000, self.window_samples), n_windows)
+        columns = {'Timestamp': timestamps}
+        raw_names = recording.meta['channels']
+        ic_names = recording.meta.get('ic_channels') or []
+        if len(ic_names) != ics.shape[1]:
+            ic_names = ['Independent_Component'] if ics.shape[1] == 1 else [f'IC{i + 1}' for i in range(ics.shape[1])]
+        columns.update({name: raw[:, index] for index, name in enumerate(raw_names)})
+        columns.update({name: ics[:, index] for index, name in enumerate(ic_names)})
+        return pd.DataFrame(columns)[self.feature_names].to_numpy()
+
+    def score(self, recording):
+        n_windows = len(recording) // self.window_samples
+        if n_windows == 0:
+            return np.empty(0, dtype=object), np.empty(0)
+        # One predict call for every sample of every window
+        predicted = predict_labels(self.model, self._frame(recording, n_windows), self.feature_names).astype(str)
+        predicted = predicted.reshape(n_windows, self.window_samples)
+        classes = np.unique(predicted)
+        counts = np.stack([(predicted == label).sum(axis=1) for label in classes], axis=1)
+        if set(classes) <= {'YES', 'NO'}:
+            yes = (predicted == 'YES').sum(axis=1)
+            labels = np.where(yes > self.window_samples - yes, 'YES', 'NO')
+        else:
+            labels = classes[counts.argmax(axis=1)]
+        return labels, counts.max(axis=1) / self.window_samples
+
+
+def make_scorer(model_name, hop_ms=None, window_samples=LEGACY_WINDOW_SAMPLES):
+    if os.path.exists(extractor_path(model_name)):
+        return WindowScorer(model_name, hop_ms)
+    return VoteScorer(model_name, window_samples)
+
+
+def _init_worker(model_name, hop_ms, window_samples):
+    global _scorer
+    import warnings
+    warnings.filterwarnings('ignore')
+    _scorer = make_scorer(model_name, hop_ms, window_samples)
+
+
+def score_file(path, scorer=None):
+    """Per-window rows, samples, recorded seconds and scoring seconds of one file"""
+    scorer = scorer or _scorer
+    started = time.perf_counter()
+    rows = []
+    samples = 0
+    seconds = 0.0
+    for segment, recording in load_segments(path):
+        labels, scores = scorer.score(recording)
+        rate = recording.sample_rate or 1.0
+        samples += len(recording)
+        seconds += len(recording) / rate
+        for index, (label, score) in enumerate(zip(labels, scores)):
+            start = index * scorer.hop_samples
+            rows.append({
+                "file": path,
+                "segment": segment,
+                "window": index,
+                "start_s": start / rate,
+                "end_s": (start + scorer.window_samples) / rate,
+                "label": recording.label,
+                "prediction": str(label),
+                "score": None if score is None or np.isnan(score) else float(score),
+            })
+    return path, rows, samples, seconds, time.perf_counter() - started
+
+
+def confusion(rows):
+    """{"labels": [...], "matrix": [[...]]} with true labels as rows, over labelled windows"""
+    rows = [row for row in rows if row['label'] is not None]
+    labels = sorted({row['label'] for row in rows} | {row['prediction'] for row in rows})
+    index = {label: i for i, label in enumerate(labels)}
+    matrix = np.zeros((len(labels), len(labels)), dtype=int)
+    for row in rows:
+        matrix[index[row['label']], index[row['prediction']]] += 1
+    correct = int(np.trace(matrix))
+    return {"labels": labels, "matrix": matrix.tolist(), "windows": len(rows),
+            "accuracy": correct / len(rows) if rows else None}
+
+
+def print_confusion(title, result):
+    accuracy = '-' if result['accuracy'] is None else f"{result['accuracy']:.3f}"
+    print(f"\n{title}: {result['windows']} labelled windows, accuracy {accuracy}")
+    if not result['labels']:
+        return
+    width = max(8, *(len(label) for label in result['labels']))
+    corner = 'true/pred'
+    print(f"  {corner:<{width}} " + ' '.join(f"{label:>{width}}" for label in result['labels']))
+    for label, counts in zip(result['labels'], result['matrix']):
+        print(f"  {label:<{width}} " + ' '.join(f"{count:>{width}}" for count in counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', help='model name, e.g. nbest or ../../Nyan_AI/nbest (without .pkl)')
+    parser.add_argument('files', nargs='+', help='.rec folders or CSV recordings')
+    parser.add_argument('--hop-ms', type=float, help='window hop for window models, default one window')
+    parser.add_argument('--window-samples', type=int, default=LEGACY_WINDOW_SAMPLES,
+                        help='samples per vote for per-sample models')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='1 scores in this process')
+    parser.add_argument('--predictions', help='write every window prediction to this CSV')
+    parser.add_argument('--output', help='write the report as JSON')
+    args = parser.parse_args()
+    model_name = args.model[:-4] if args.model.endswith('.pkl') else args.model
+
+    start = time.perf_counter()
+    workers = max(1, min(args.workers, len(args.files)))
+    results = []
+    if workers == 1:
+        _init_worker(model_name, args.hop_ms, args.window_samples)
+        results = [score_file(path) for path in args.files]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(model_name, args.hop_ms, args.window_samples)) as pool:
+            results = list(pool.map(score_file, args.files))
+    elapsed = time.perf_counter() - start
+
+    report = {"model": model_name, "files": {}, "workers": workers}
+    all_rows = []
+    total_samples = 0
+    total_seconds = 0.0
+    scoring = 0.0
+    for path, rows, samples, seconds, busy in results:
+        result = confusion(rows)
+        report["files"][path] = result
+        print_confusion(path, result)
+        all_rows.extend(rows)
+        total_samples += samples
+        total_seconds += seconds
+        scoring += busy
+    report["overall"] = confusion(all_rows)
+    if len(results) > 1:
+        print_confusion("All files", report["overall"])
+
+    report["throughput"] = {
+        "seconds": elapsed,
+        "scoring_seconds": scoring,
+        "windows": len(all_rows),
+        "samples": total_samples,
+        "recorded_seconds": total_seconds,
+        "windows_per_s": len(all_rows) / elapsed,
+        "samples_per_s": total_samples / elapsed,
+        "realtime_factor": total_seconds / elapsed,
+    }
+    print(f"\n{len(all_rows)} windows, {total_samples:,} samples ({total_seconds / 60:.1f} min recorded) in "
+          f"{elapsed:.2f} s with {workers} worker(s): {len(all_rows) / elapsed:,.0f} windows/s, "
+          f"{total_samples / elapsed:,.0f} samples/s, {total_seconds / elapsed:,.0f}x real time")
+    if scoring > 0:
+        print(f"Excluding model loading: {total_samples / scoring:,.0f} samples/s, "
+              f"{total_seconds / scoring:,.0f}x real time per worker")
+
+    if args.predictions:
+        import pandas as pd
+        pd.DataFrame(all_rows).to_csv(args.predictions, index=False)
+        print(f"Window predictions written to {args.predictions}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import select
+import time
+
+import numpy as np
+
+# Binary frame layout (little endian):
+#   sync word (2 bytes) | sample counter (uint16) | N x int16 channels | checksum (uint8)
+# The checksum is the low byte of the sum of the counter and channel bytes.
+FRAME_SYNC = b'\xa5\x5a'
+SAMPLE_FORMATS = ('ascii', 'binary')
+
+
+def frame_size(n_channels):
+    """Size in bytes of one binary frame carrying n_channels samples"""
+    return len(FRAME_SYNC) + 2 + 2 * n_channels + 1
+
+
+def encode_frames(samples, start_counter=0):
+    """Encode an (n, channels) array of samples into binary frames"""
+    samples = np.asarray(samples, dtype='<i2')
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+    n, n_channels = samples.shape
+    frames = np.empty((n, frame_size(n_channels)), dtype=np.uint8)
+    frames[:, 0] = FRAME_SYNC[0]
+    frames[:, 1] = FRAME_SYNC[1]
+    counters = (np.arange(n, dtype=np.uint32) + start_counter) & 0xFFFF
+    frames[:, 2:4] = counters.astype('<u2').view(np.uint8).reshape(n, 2)
+    frames[:, 4:-1] = np.ascontiguousarray(samples).view(np.uint8).reshape(n, 2 * n_channels)
+    frames[:, -1] = frames[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF
+    return frames.tobytes()
+
+
+def encode_ascii(samples):
+    """Encode an (n, channels) array of samples as the legacy "a,b" text lines"""
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+    return ''.join(','.join(str(int(v)) for v in row) + '\n' for row in samples).encode()
+
+
+class AsciiDecoder:
+    """Decode the legacy newline separated "a,b" text format in bulk"""
+
+    def __init__(self, n_channels=2):
+        self.n_channels = n_channels
+        self.parse_errors = 0
+        self._tail = b''
+
+    def feed(self, data):
+        """Consume raw bytes and return an (n, channels) int32 array of complete samples"""
+        data = self._tail + data
+        end = data.rfind(b'\n')
+        if end < 0:
+            self._tail = data
+            return np.empty((0, self.n_channels), dtype=np.int32)
+        self._tail = data[end + 1:]
+
+        lines = data[:end].replace(b'\r', b'').split(b'\n')
+        commas = self.n_channels - 1
+        good = [line for line in lines if line and line.count(b',') == commas]
+        self.parse_errors += sum(1 for line in lines if line) - len(good)
+        if not good:
+            return np.empty((0, self.n_channels), dtype=np.int32)
+
+        try:
+            values = np.array(b','.join(good).split(b','), dtype=np.bytes_).astype(np.int32)
+            return values.reshape(-1, self.n_channels)
+        except ValueError:
+            # A corrupted line somewhere in the chunk, fall back to parsing line by line
+            rows = []
+            for line in good:
+                try:
+                    rows.append([int(v) for v in line.split(b',')])
+                except ValueError:
+                    self.parse_errors += 1
+            if not rows:
+                return np.empty((0, self.n_channels), dtype=np.int32)
+            return np.array(rows, dtype=np.int32)
+
+
+class BinaryFrameDecoder:
+    """Decode fixed size binary frames in bulk, resynchronising on the sync word"""
+
+    def __init__(self, n_channels=2):
+        self.n_channels = n_channels
+        self.frame_size = frame_size(n_channels)
+        self.checksum_errors = 0
+        self.resyncs = 0
+        self.dropped_frames = 0
+        self._last_counter = None
+        self._buf = bytearray()
+
+    def feed(self, data):
+        """Consume raw bytes and return an (n, channels) int16 array of valid samples"""
+        self._buf += data
+        chunks = []
+        while True:
+            start = self._buf.find(FRAME_SYNC)
+            if start < 0:
+                # Keep a trailing byte in case it is the first half of a sync word
+                del self._buf[:-1]
+                break
+            if start > 0:
+                del self._buf[:start]
+                self.resyncs += 1
+
+            n = len(self._buf) // self.frame_size
+            if n == 0:
+                break
+
+            frames = np.frombuffer(bytes(self._buf[:n * self.frame_size]), dtype=np.uint8)
+            frames = frames.reshape(n, self.frame_size)
+
+            # Only the leading run of aligned frames can be trusted, the rest is resynced
+            in_sync = (frames[:, 0] == FRAME_SYNC[0]) & (frames[:, 1] == FRAME_SYNC[1])
+            lost = np.flatnonzero(~in_sync)
+            aligned = n if lost.size == 0 else int(lost[0])
+            frames = frames[:aligned]
+            del self._buf[:aligned * self.frame_size]
+
+            checksum = frames[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF
+            valid = checksum == frames[:, -1]
+            self.checksum_errors += int(aligned - np.count_nonzero(valid))
+            frames = frames[valid]
+            if len(frames):
+                self._track_counters(np.ascontiguousarray(frames[:, 2:4]).view('<u2').ravel())
+                chunks.append(np.ascontiguousarray(frames[:, 4:-1]).view('<i2'))
+
+        if not chunks:
+            return np.empty((0, self.n_channels), dtype=np.int16)
+        return np.concatenate(chunks)
+
+    def _track_counters(self, counters):
+        """Count frames missing from the sample counter sequence"""
+        if self._last_counter is not None:
+            counters = np.concatenate(([self._last_counter], counters))
+        gaps = (np.diff(counters.astype(np.int32)) - 1) % 0x10000
+        self.dropped_frames += int(gaps.sum())
+        self._last_counter = int(counters[-1])
+
+
+def make_decoder(sample_format='ascii', n_channels=2):
+    """Create the decoder for the given wire format"""
+    if sample_format == 'ascii':
+        return AsciiDecoder(n_channels)
+    if sample_format == 'binary':
+        return BinaryFrameDecoder(n_channels)
+    raise ValueError(f"Unknown sample format '{sample_format}', expected one of {SAMPLE_FORMATS}")
+
+
+class SerialSampleSource:
+    """Read samples from a serial port in bulk chunks instead of one line at a time"""
+
+    def __init__(self, ser, decoder):
+        self.ser = ser
+        self.decoder = decoder
+        self.bytes_read = 0
+        self.samples_read = 0
+        self._pending = np.empty((0, decoder.n_channels), dtype=np.int32)
+        # pyserial's socket:// ports only report whether anything is waiting, not how
+        # much, so read() would fetch one byte at a time. Those are read directly.
+        self._socket = getattr(ser, '_socket', None) if type(ser).__module__.endswith('protocol_socket') else None
+
+    @property
+    def n_channels(self):
+        return self.decoder.n_channels
+
+    def read(self):
+        """Read whatever is waiting (blocking up to the port timeout) and decode it"""
+        data = self._read_socket() if self._socket is not None else self.ser.read(max(self.ser.in_waiting, 1))
+        self.bytes_read += len(data)
+        samples = self.decoder.feed(data)
+        self.samples_read += len(samples)
+        return samples
+
+    def _read_socket(self, max_bytes=65536):
+        if not select.select([self._socket], [], [], self.ser.timeout)[0]:
+            return b''
+        data = self._socket.recv(max_bytes)
+        if not data:
+            raise ConnectionError(f"{self.ser.port} disconnected")
+        return data
+
+    def read_samples(self, n_samples, timeout=5.0, stop_event=None):
+        """Block until n_samples have been decoded, keeping any surplus for the next call.
+        Raises TimeoutError if the port goes quiet for timeout seconds (None waits forever),
+        and returns the samples so far, possibly fewer, once stop_event is set."""
+        chunks = [self._pending]
+        collected = len(self._pending)
+        last_data = time.time()
+        while collected < n_samples:
+            if stop_event is not None and stop_event.is_set():
+                break
+            chunk = self.read()
+            if len(chunk):
+                chunks.append(chunk)
+                collected += len(chunk)
+                last_data = time.time()
+            elif timeout is not None and time.time() - last_data >= timeout:
+                # Keep what did arrive for the next call
+                self._pending = np.concatenate(chunks)
+                raise TimeoutError(f"No samples from {self.ser.port} for {timeout} s")
+        samples = np.concatenate(chunks)
+        self._pending = samples[n_samples:]
+        return samples[:n_samples]
+
+    def read_for(self, duration, stop_event=None):
+        """Collect samples for duration seconds, returning an (n, channels) array"""
+        chunks = [self._pending]
+        self._pending = self._pending[:0]
+        start_time = time.time()
+        while (time.time() - start_time) < duration:
+            if stop_event is not None and stop_event.is_set():
+                break
+            chunk = self.read()
+            if len(chunk):
+                chunks.append(chunk)
+        return np.concatenate(chunks)
+
+    def stream_for(self, duration, sink, stop_event=None):
+        """Like read_for, but hand every chunk to sink as it arrives instead of keeping
+        it. Returns the number of samples read."""
+        total = 0
+        if len(self._pending):
+            sink(self._pending)
+            total += len(self._pending)
+            self._pending = self._pending[:0]
+        start_time = time.time()
+        while (time.time() - start_time) < duration:
+            if stop_event is not None and stop_event.is_set():
+                break
+            chunk = self.read()
+            if len(chunk):
+                sink(chunk)
+                total += len(chunk)
+        return total
+
+    def close(self):
+        self.ser.close()
@@ -0,0 +1,121 @@
+"""One backend process driving several amplifiers at once.
+
+Each DeviceSession owns one serial port and everything downstream of it: the worker
+thread recording from it or running inference on it, its stop event, its model slot,
+its status feed, its WebSocket broadcast hub and its metrics. Sessions don't share state, so one
+operator recording doesn't hold up another's inference. The worker functions are
+passed in (record_emg_data and inference_loop in app.py), like TrainingJobRunner's
+target.
+"""
+import threading
+import time
+import uuid
+
+from status_feed import StatusFeed
+from broadcast_hub import BroadcastHub
+from model_registry import ModelSlot, validate_user
+from metrics import PipelineMetrics
+
+
+class DeviceSession:
+    def __init__(self, session_id, port, record_target, inference_target, user=None,
+                 status_feed=None, hub=None):
+        self.id = session_id
+        self.port = port
+        # Recordings and models of the session's user are folders named after it
+        self.user = validate_user(user)
+        self.record_target = record_target
+        self.inference_target = inference_target
+        self.status_feed = status_feed if status_feed is not None else StatusFeed()
+        self.hub = hub if hub is not None else BroadcastHub(queue_size=8, policy='coalesce', send_timeout=1.0)
+        self.model = ModelSlot()
+        self.metrics = PipelineMetrics(self.hub)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.mode = 'idle'
+        self.created = time.time()
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _start(self, mode, target, args, kwargs):
+        if self.busy():
+            raise RuntimeError(f"Session {self.id} is already {self.mode}")
+        self.stop_event.clear()
+        self.mode = mode
+        self.thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True,
+                                       name=f'{mode}-{self.id}')
+        self.thread.start()
+
+    def start_recording(self, feature, duration=15, on_saved=None, user=None):
+        self._start('recording', self.record_target,
+                    (self.port, duration, feature, self.status_feed, self.stop_event),
+                    {"on_saved": on_saved, "user": user or self.user, "metrics": self.metrics})
+
+    def start_inference(self, window_seconds=1.0, hop_seconds=None, smoothing=None):
+        self._start('inference', self.inference_target,
+                    (self.port, self.status_feed, self.stop_event, window_seconds, hop_seconds),
+                    {"slot": self.model, "hub": self.hub, "metrics": self.metrics, "smoothing": smoothing})
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if timeout is not None and self.thread is not None:
+            self.thread.join(timeout)
+
+    def describe(self):
+        latest = self.status_feed.latest()
+        return {
+            "id": self.id,
+            "port": self.port,
+            "user": self.user,
+            "mode": self.mode if self.busy() else 'idle',
+            "model": self.model.bundle.describe() if self.model.bundle else None,
+            "clients": len(self.hub),
+            "created": self.created,
+            "latest": latest
+        }
+
+
+class SessionManager:
+    """Sessions by id, at most one per serial port"""
+
+    def __init__(self, record_target, inference_target):
+        self.record_target = record_target
+        self.inference_target = inference_target
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, port, user=None, session_id=None, **options):
+        with self._lock:
+            for session in self._sessions.values():
+                if session.port == port:
+                    raise ValueError(f"Port {port} already belongs to session {session.id}")
+            session_id = session_id or uuid.uuid4().hex[:8]
+            if session_id in self._sessions:
+                raise ValueError(f"Session {session_id} already exists")
+            session = DeviceSession(session_id, port, self.record_target, self.inference_target, user, **options)
+            self._sessions[session_id] = session
+            return session
+
+    def get(self, session_id):
+        """The session, raises KeyError if there is none"""
+        with self._lock:
+            return self._sessions[session_id]
+
+    def find(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id, timeout=5.0):
+        with self._lock:
+            session = self._sessions.pop(session_id)
+        session.stop(timeout)
+        return session
+
+    def list(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stop_all(self, timeout=5.0):
+        for session in self.list():
+            session.stop(timeout)
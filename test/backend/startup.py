@@ -0,0 +1,54 @@
+"""Where the time to the first prediction goes.
+
+A StartupTimer is created as early as possible in an entry script and marked after each
+step (imports, model, port, first window, first prediction). The first step is counted
+from the moment the process was started, read from /proc where there is one, so the
+interpreter's own start up is included. report() prints the breakdown, e.g.
+
+    Startup of infrence.py: interpreter 0.04 s, imports 0.15 s, model 0.01 s, port 2.00 s,
+    first window 1.00 s, first prediction 0.00 s = 3.20 s
+"""
+import os
+import time
+
+
+def process_start_time():
+    """Wall clock time this process was started, or None where /proc isn't available"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name, which may itself contain spaces; starttime is the 22nd field
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTimer:
+    def __init__(self, name):
+        self.name = name
+        now = time.time()
+        started = process_start_time()
+        self.started = started if started is not None and started <= now else now
+        self.steps = []
+        self._last = self.started
+        if started is not None:
+            self.mark('interpreter')
+
+    def mark(self, step, at=None):
+        """Record the time since the previous mark as step, ending now or at the given time"""
+        now = time.time() if at is None else at
+        self.steps.append((step, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+    def summary(self):
+        return {"steps": {step: seconds for step, seconds in self.steps}, "total": self.total}
+
+    def report(self):
+        steps = ', '.join(f"{step} {seconds:.2f} s" for step, seconds in self.steps)
+        print(f"Startup of {self.name}: {steps} = {self.total:.2f} s")
@@ -0,0 +1,51 @@
+import json
+import threading
+from collections import deque
+
+
+class StatusFeed:
+    """Fan out status messages to any number of readers.
+
+    Every published message gets a sequence number and is kept in a short history.
+    Readers never consume messages, so any number of viewers see the same stream, and
+    latest() answers status requests immediately.
+    """
+
+    def __init__(self, history=256):
+        self._history = deque(maxlen=history)
+        self._condition = threading.Condition()
+        self._seq = 0
+
+    def publish(self, data):
+        """Stamp a message with the next sequence number and wake every subscriber"""
+        with self._condition:
+            self._seq += 1
+            message = {"seq": self._seq, **data}
+            self._history.append(message)
+            self._condition.notify_all()
+        return message
+
+    def latest(self):
+        with self._condition:
+            return self._history[-1] if self._history else None
+
+    def since(self, seq, timeout=None):
+        """Messages newer than seq, waiting up to timeout for one to arrive"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > seq, timeout=timeout)
+            return [message for message in self._history if message["seq"] > seq]
+
+    def subscribe(self, last_seq=None, heartbeat=15.0, stop_event=None):
+        """Yield Server-Sent Events for every new message, starting after last_seq"""
+        if last_seq is None:
+            latest = self.latest()
+            last_seq = latest["seq"] - 1 if latest else 0
+        while stop_event is None or not stop_event.is_set():
+            messages = self.since(last_seq, timeout=heartbeat)
+            if not messages:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            for message in messages:
+                yield f"id: {message['seq']}\ndata: {json.dumps(message)}\n\n"
+            last_seq = messages[-1]["seq"]
@@ -0,0 +1,86 @@
+"""DecisionStream must hold commands against noise but never hold up a stop.
+
+Run from test/backend:
+    python -m pytest -q test_decisions.py
+"""
+import pytest
+
+from decisions import DecisionPolicy, make_policy
+
+HOP = 0.05
+
+
+def _stream(**settings):
+    """Unsmoothed probabilities, so each test controls them window by window"""
+    return DecisionPolicy.from_settings({"method": "none", **settings}).stream(['GO', 'STOP'])
+
+
+def test_first_window_decides():
+    stream = _stream()
+    assert stream.update('GO', 0.6, 0.0) == ('GO', False)
+    assert stream.reason == 'start'
+
+
+def test_hysteresis_holds_below_enter():
+    stream = _stream(enter=0.7)
+    stream.update('STOP', 1.0, 0.0)
+    assert stream.update('GO', 0.65, 1.0) == ('STOP', False)
+    assert stream.reason == 'hold'
+    assert stream.update('GO', 0.75, 1.05) == ('GO', True)
+
+
+def test_dwell_holds_a_new_decision():
+    stream = _stream(min_dwell=0.5, stop_threshold=None)
+    stream.update('GO', 1.0, 0.0)
+    stream.update('OTHER', 0.9, 1.0)
+    assert stream.decision == 'OTHER'
+    # Back to GO within the dwell is held off, after it goes through
+    assert stream.update('GO', 0.9, 1.0 + HOP) == ('OTHER', False)
+    assert stream.reason == 'dwell'
+    assert stream.update('GO', 0.9, 1.6) == ('GO', True)
+
+
+def test_stop_skips_the_dwell():
+    stream = _stream(min_dwell=0.5, stop_threshold=None)
+    stream.update('STOP', 1.0, 0.0)
+    stream.update('GO', 0.9, 1.0)
+    assert stream.update('STOP', 0.8, 1.0 + HOP) == ('STOP', True)
+    assert stream.reason == 'switch'
+
+
+def test_confident_stop_window_overrides_smoothing():
+    stream = DecisionPolicy.from_settings({"method": "ema", "time_constant": 2.0, "min_dwell": 0.5,
+                                          "stop_threshold": 0.9}).stream(['GO', 'STOP'])
+    t = 0.0
+    for _ in range(40):
+        stream.update('GO', 0.95, t)
+        t += HOP
+    assert stream.decision == 'GO'
+    # One window sure of STOP stops at once, however much GO the smoothing remembers
+    assert stream.update('STOP', 0.92, t) == ('STOP', True)
+    assert stream.reason == 'stop'
+    # and GO has to build up its evidence again from that window on
+    assert stream.confidence == pytest.approx(0.92)
+
+
+def test_take_over_keeps_the_decision_and_dwell():
+    policy = _stream(min_dwell=0.5, stop_threshold=None).policy
+    old = policy.stream(['GO', 'STOP'])
+    old.update('STOP', 1.0, 0.0)
+    old.update('GO', 0.9, 1.0)
+    new = policy.stream(['STOP', 'GO', 'LEFT'], previous=old)
+    assert new.decision == 'GO'
+    assert new.confidence == pytest.approx(0.9)
+    assert new.update('LEFT', 0.9, 1.0 + HOP) == ('GO', False)
+    assert new.reason == 'dwell'
+
+
+def test_raw_policy_follows_every_window():
+    stream = make_policy(False).stream()
+    labels = ['GO', 'STOP', 'GO', 'GO', 'STOP']
+    assert [stream.update(label, 0.51, i * HOP)[0] for i, label in enumerate(labels)] == labels
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        make_policy({"method": "kalman"})
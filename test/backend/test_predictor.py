@@ -0,0 +1,56 @@
+"""LeanPredictor must label every row as PyCaret's predict_model does.
+
+Run from test/backend:
+    python -m pytest -q test_predictor.py
+"""
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from predictor import export_predictor
+
+pytest.importorskip('pycaret')
+
+NYAN_AI = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Nyan_AI')
+NOTEBOOK_FEATURES = ['Timestamp', 'Raw_EMG', 'Independent_Component']
+
+
+@pytest.fixture(scope='module')
+def ndata():
+    return pd.read_csv(os.path.join(NYAN_AI, 'ndata.csv'))
+
+
+def _predict_model(pipeline, X):
+    from pycaret.classification import predict_model
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return predict_model(pipeline, data=X, verbose=False)['prediction_label'].to_numpy()
+
+
+def test_notebook_model_matches_predict_model(ndata):
+    from pycaret.classification import load_model
+    pipeline = load_model(os.path.join(NYAN_AI, 'nbest'), verbose=False)
+    lean = export_predictor(pipeline, NOTEBOOK_FEATURES)
+    # QDA is replayed with NumPy, not by the sklearn estimator
+    assert lean.estimator is None
+
+    X = ndata[NOTEBOOK_FEATURES]
+    labels, scores = lean.predict(X.to_numpy())
+    expected = _predict_model(pipeline, X)
+    mismatches = np.flatnonzero(labels != expected)
+    assert len(mismatches) == 0, f"{len(mismatches)} of {len(X)} rows differ, first at {mismatches[:5]}"
+    assert np.all((scores >= 0.5) & (scores <= 1.0))
+
+
+@pytest.mark.parametrize('model_id', ['lr', 'lda', 'nb'])
+def test_saved_pipeline_matches_predict_model(ndata, model_id):
+    from model_search import make_estimator, make_saved_pipeline
+    data = ndata[NOTEBOOK_FEATURES + ['Label']]
+    pipeline = make_saved_pipeline(make_estimator(model_id)).fit(data[NOTEBOOK_FEATURES], data['Label'])
+    lean = export_predictor(pipeline, NOTEBOOK_FEATURES)
+
+    labels, _ = lean.predict(data[NOTEBOOK_FEATURES].to_numpy())
+    np.testing.assert_array_equal(labels, _predict_model(pipeline, data[NOTEBOOK_FEATURES]))
@@ -0,0 +1,131 @@
+"""SampleRingBuffer must hand out every sample once, in order, and count the ones lost.
+
+Run from test/backend:
+    python -m pytest -q test_ring_buffer.py
+"""
+import threading
+
+import numpy as np
+
+from ring_buffer import AcquisitionThread, SampleRingBuffer
+
+
+def _samples(start, n):
+    """n samples whose value is their index, on two channels"""
+    values = np.arange(start, start + n)
+    return np.column_stack((values, -values))
+
+
+def test_read_new_across_wraparound():
+    buffer = SampleRingBuffer(8, 2)
+    buffer.write(_samples(0, 5), timestamp=1.0)
+    start, samples, _ = buffer.read_new()
+    assert start == 0 and len(samples) == 5
+
+    # Indices 5..10 land in slots 5, 6, 7, 0, 1, 2
+    buffer.write(_samples(5, 6), timestamp=2.0)
+    start, samples, stamps = buffer.read_new()
+    assert start == 5
+    np.testing.assert_array_equal(samples, _samples(5, 6))
+    np.testing.assert_allclose(stamps, np.linspace(1.0, 2.0, 7)[1:])
+    assert buffer.overruns == 0
+
+
+def test_overwritten_samples_are_counted_once():
+    buffer = SampleRingBuffer(8, 2)
+    buffer.write(_samples(0, 20))
+    start, samples, _ = buffer.read_new()
+    assert start == 12
+    np.testing.assert_array_equal(samples, _samples(12, 8))
+    assert buffer.overruns == 12
+
+    buffer.write(_samples(20, 3))
+    start, samples, _ = buffer.read_new()
+    assert start == 20 and len(samples) == 3
+    assert buffer.overruns == 12
+
+
+def test_max_samples_leaves_the_rest_for_later():
+    buffer = SampleRingBuffer(16, 2)
+    buffer.write(_samples(0, 10))
+    assert buffer.read_new(max_samples=4)[0] == 0
+    start, samples, _ = buffer.read_new()
+    assert start == 4
+    np.testing.assert_array_equal(samples, _samples(4, 6))
+    assert buffer.metrics()["consumer_lag_samples"] == 0
+
+
+def test_read_window_refuses_overwritten_samples():
+    buffer = SampleRingBuffer(8, 2)
+    buffer.write(_samples(0, 11))
+    start, samples, _ = buffer.read_window(6)
+    assert start == 5
+    np.testing.assert_array_equal(samples, _samples(5, 6))
+    assert buffer.read_window(4, end=6) is None
+    assert buffer.read_window(20) is None
+
+
+class _RacingBuffer(SampleRingBuffer):
+    """Lets the writer overwrite the ring while the reader is halfway through a copy"""
+
+    def __init__(self, *args, race=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.race = race
+
+    def _copy(self, start, stop):
+        idx = np.arange(start, stop) % self.capacity
+        head = self.data[idx[:len(idx) // 2]].copy()
+        if self.race is not None:
+            race, self.race = self.race, None
+            race(self)
+        tail = self.data[idx[len(idx) // 2:]].copy()
+        return np.concatenate((head, tail)), self.timestamps[idx]
+
+
+def test_a_copy_the_writer_raced_with_is_not_returned_torn():
+    buffer = _RacingBuffer(8, 2, race=lambda b: b.write(_samples(8, 5)))
+    buffer.write(_samples(0, 8))
+    start, samples, _ = buffer.read_new()
+    # Indices 0..4 were overwritten mid-copy by 8..12, only 5..7 are still intact
+    assert start == 5
+    np.testing.assert_array_equal(samples, _samples(5, 3))
+    assert buffer.overruns == 5
+
+    buffer.race = lambda b: b.write(_samples(13, 6))
+    assert buffer.read_window(8) is None
+
+
+def test_a_write_in_progress_counts_as_lost_for_readers():
+    buffer = SampleRingBuffer(8, 2)
+    buffer.write(_samples(0, 8))
+    # The writer has reserved 8..10 but not published them yet
+    buffer.reserved_index = 11
+    start, samples, _ = buffer.read_new()
+    assert start == 3
+    np.testing.assert_array_equal(samples, _samples(3, 5))
+    assert buffer.overruns == 3
+
+
+class _ChunkSource:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self):
+        if not self.chunks:
+            raise ConnectionError("port closed")
+        return self.chunks.pop(0)
+
+
+def test_acquisition_thread_drains_the_source_and_stops_on_error():
+    buffer = SampleRingBuffer(64, 2)
+    stop_event = threading.Event()
+    thread = AcquisitionThread(_ChunkSource([_samples(0, 10), _samples(10, 0), _samples(10, 5)]),
+                               buffer, stop_event)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert isinstance(thread.error, ConnectionError)
+    assert stop_event.is_set()
+    start, samples, _ = buffer.read_new()
+    assert start == 0
+    np.testing.assert_array_equal(samples, _samples(0, 15))
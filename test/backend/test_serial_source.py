@@ -0,0 +1,133 @@
+"""The serial decoders must recover from torn and garbled input and count what they lose.
+
+Run from test/backend:
+    python -m pytest -q test_serial_source.py
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from serial_source import (AsciiDecoder, BinaryFrameDecoder, SerialSampleSource, encode_ascii, encode_frames,
+                           frame_size, make_decoder)
+
+
+def _samples(n, n_channels=2, seed=0):
+    return np.random.default_rng(seed).integers(-2000, 2000, size=(n, n_channels)).astype(np.int16)
+
+
+def _feed_in_pieces(decoder, data, sizes):
+    """Feed data cut at the given piece sizes, returning everything decoded"""
+    out, offset = [], 0
+    for size in sizes:
+        out.append(decoder.feed(data[offset:offset + size]))
+        offset += size
+    out.append(decoder.feed(data[offset:]))
+    return np.concatenate(out)
+
+
+def test_binary_frames_split_anywhere_decode_whole():
+    samples = _samples(50)
+    data = encode_frames(samples)
+    decoder = BinaryFrameDecoder(2)
+    decoded = _feed_in_pieces(decoder, data, [1, 2, 3, 7, 11, 1, 40])
+    np.testing.assert_array_equal(decoded, samples)
+    assert (decoder.checksum_errors, decoder.resyncs, decoder.dropped_frames) == (0, 0, 0)
+
+
+def test_binary_resyncs_after_garbage():
+    samples = _samples(10)
+    frames = encode_frames(samples)
+    size = frame_size(2)
+    # Noise before the first frame and half a frame torn out of the middle
+    data = b'\x00\x13\xa5' + frames[:3 * size] + frames[3 * size:3 * size + 4] + frames[4 * size:]
+    decoder = BinaryFrameDecoder(2)
+    decoded = decoder.feed(data)
+    # The torn frame swallows the start of the next one, which fails its checksum; the
+    # decoder resyncs on the frame after that
+    np.testing.assert_array_equal(decoded, np.delete(samples, [3, 4], axis=0))
+    assert decoder.checksum_errors == 1
+    assert decoder.resyncs == 2
+    assert decoder.dropped_frames == 2
+
+
+def test_binary_drops_frames_with_a_bad_checksum():
+    samples = _samples(5)
+    data = bytearray(encode_frames(samples))
+    size = frame_size(2)
+    data[2 * size + 5] ^= 0xFF
+    decoder = BinaryFrameDecoder(2)
+    decoded = decoder.feed(bytes(data))
+    np.testing.assert_array_equal(decoded, np.delete(samples, 2, axis=0))
+    assert decoder.checksum_errors == 1
+
+
+def test_binary_counts_counter_gaps_across_wraparound():
+    decoder = BinaryFrameDecoder(1)
+    decoder.feed(encode_frames(_samples(3, 1), start_counter=0xFFFD))
+    assert decoder.dropped_frames == 0
+    # 0xFFFD..0xFFFF, then 0x0000 and 0x0001 never arrive
+    decoder.feed(encode_frames(_samples(2, 1), start_counter=2))
+    assert decoder.dropped_frames == 2
+
+
+def test_ascii_keeps_partial_lines_for_the_next_chunk():
+    samples = _samples(20).astype(np.int32)
+    data = encode_ascii(samples).replace(b'\n', b'\r\n')
+    decoder = AsciiDecoder(2)
+    decoded = _feed_in_pieces(decoder, data, [3, 5, 17, 2, 30])
+    np.testing.assert_array_equal(decoded, samples)
+    assert decoder.parse_errors == 0
+
+
+def test_ascii_skips_garbled_lines():
+    decoder = AsciiDecoder(2)
+    decoded = decoder.feed(b'1,2\n3\n4,x5\n,\n6,7,8\n9,10\n')
+    np.testing.assert_array_equal(decoded, [[1, 2], [9, 10]])
+    assert decoder.parse_errors == 4
+
+
+def test_make_decoder_rejects_unknown_formats():
+    with pytest.raises(ValueError):
+        make_decoder('hex')
+
+
+class _FakePort:
+    """Returns the given chunks, then nothing, waiting up to timeout on every read"""
+    port = 'fake'
+    timeout = 0.02
+    in_waiting = 0
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self, size):
+        if self.chunks:
+            return self.chunks.pop(0)
+        time.sleep(self.timeout)
+        return b''
+
+
+def test_read_samples_keeps_the_surplus():
+    source = SerialSampleSource(_FakePort([b'1\n2\n3\n', b'4\n5\n']), make_decoder('ascii', 1))
+    np.testing.assert_array_equal(source.read_samples(2).ravel(), [1, 2])
+    np.testing.assert_array_equal(source.read_samples(3).ravel(), [3, 4, 5])
+
+
+def test_read_samples_times_out_on_a_silent_port():
+    source = SerialSampleSource(_FakePort([b'1\n2\n']), make_decoder('ascii', 1))
+    started = time.time()
+    with pytest.raises(TimeoutError):
+        source.read_samples(5, timeout=0.1)
+    assert time.time() - started < 1.0
+    # What did arrive isn't lost
+    source.ser.chunks = [b'3\n4\n5\n']
+    np.testing.assert_array_equal(source.read_samples(5, timeout=0.1).ravel(), [1, 2, 3, 4, 5])
+
+
+def test_read_samples_returns_early_when_stopped():
+    source = SerialSampleSource(_FakePort([b'1\n']), make_decoder('ascii', 1))
+    stop_event = threading.Event()
+    threading.Timer(0.1, stop_event.set).start()
+    np.testing.assert_array_equal(source.read_samples(5, timeout=None, stop_event=stop_event).ravel(), [1])
@@ -0,0 +1,244 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from unmixing import FixedUnmixing, unmixing_path
+from features import FeatureExtractor, emg_signals, extractor_path
+from dsp import FilterBank, filters_path
+from predictor import export_predictor, predictor_path
+from recording_store import find_sessions, load_session
+from dataset_catalog import DatasetCatalog
+from training_jobs import uninterruptible
+
+
+def signal_names(n_channels):
+    """The raw channels followed by as many ICs, the signals features are computed on"""
+    return [f'Raw_EMG{i + 1}' for i in range(n_channels)] + [f'IC{i + 1}' for i in range(n_channels)]
+
+
+def _report(progress, stage, **info):
+    """Print a training step and pass it on to the job runner, if any"""
+    details = ', '.join(f"{k}={v}" for k, v in info.items())
+    print(f"[train] {stage}" + (f" ({details})" if details else ""))
+    if progress is not None:
+        progress(stage, **info)
+
+
+def train_model_with_features(progress=None, model_name='nbest', candidates=None, time_budget=None,
+                              latency_budget_ms=None, user=None, labels=None, since=None, filters=None):
+    """Train on every data_* recording, or on the sessions in the catalog matching user,
+    labels and since. With candidates, run the fast search over just those estimators
+    instead of PyCaret's full comparison. filters are the FilterBank settings, by default
+    dsp.DEFAULT_FILTERS; {} trains on the unfiltered signal"""
+    try:
+        # Every recorded session, memory-mapped when stored in the binary format
+        if user is not None or labels is not None or since is not None:
+            data_files = [row['path'] for row in DatasetCatalog().query(user=user, label=labels, since=since)]
+        else:
+            data_files = find_sessions('data_*')
+
+        if not data_files:
+            raise Exception("No training data files found!")
+
+        _report(progress, "loading", files=len(data_files))
+
+        sessions = []
+        for file in data_files:
+            session = load_session(file)
+            print(f"Loaded {file}: {len(session)} samples, label {session.label}")
+            sessions.append(session)
+        print(f"Unique labels: {sorted(set(session.label for session in sessions))}")
+        # ICA and the features are per channel, every session must have the same number
+        channel_counts = {file: session.n_channels for file, session in zip(data_files, sessions)}
+        if len(set(channel_counts.values())) > 1:
+            raise Exception(f"Sessions with different channel counts can't be trained together: "
+                            f"{', '.join(f'{file} ({count} ch)' for file, count in channel_counts.items())}")
+        n_channels = sessions[0].n_channels
+
+        # Filter each session from its first sample, as inference does with a live stream
+        sample_rate = np.median([session.sample_rate for session in sessions])
+        filter_bank = FilterBank.from_settings(sample_rate, filters)
+        _report(progress, "filters", **{k: v for k, v in filter_bank.settings().items() if v})
+
+        # Fit ICA once over every session so IC1, IC2, ... mean the same thing in all of
+        # them, and at inference time
+        _report(progress, "ica", channels=n_channels)
+        unmixing = FixedUnmixing.fit(np.vstack([filter_bank.apply(session.raw) for session in sessions]),
+                                     n_components=n_channels)
+
+        # One feature row per window, windows never straddle two sessions
+        extractor = FeatureExtractor.for_rate(sample_rate, signal_names(n_channels))
+        _report(progress, "features", sample_rate=round(float(sample_rate)))
+        feature_df = pd.concat(
+            [session_features(session, unmixing, extractor, filter_bank) for session in sessions],
+            ignore_index=True
+        )
+        print(f"Feature data shape: {feature_df.shape}")
+
+        if candidates:
+            final_model, search = _fast_search(feature_df, progress, candidates, time_budget, latency_budget_ms)
+        else:
+            final_model, search = _compare_all(feature_df, progress), None
+
+        _report(progress, "saving")
+        # A registry version's folder, models/<user>/v<N>, only exists once it has a model
+        if os.path.dirname(model_name):
+            os.makedirs(os.path.dirname(model_name), exist_ok=True)
+        from pycaret.internal.persistence import save_model
+        staging = staging_name(model_name)
+        try:
+            save_model(final_model, staging, verbose=False)
+            if search is not None:
+                with open(search_results_path(staging), 'w') as f:
+                    json.dump(search, f, indent=2)
+            unmixing.save(staging)
+            extractor.save(staging)
+            filter_bank.save(staging)
+            try:
+                export_predictor(final_model, extractor.feature_names()).save(staging)
+            except ValueError as e:
+                print(f"Lean predictor not exported, inference will use predict_model: {e}")
+            # Incremental updates were relative to the old unmixing/features: the online
+            # state isn't staged, so it goes
+            commit_artifacts(staging, model_name)
+        finally:
+            discard_staged(staging)
+
+        print("Model training completed successfully!")
+        return True
+
+    except Exception as e:
+        print(f"Error in train_model_with_features: {str(e)}")
+        _report(progress, "error", message=str(e))
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def _compare_all(feature_df, progress):
+    """PyCaret's turbo estimators, best cross-validated accuracy wins. The folds of
+    setup()'s fold generator are run here rather than in create_model, so progress is
+    reported per fold"""
+    from sklearn.base import clone
+    from pycaret.classification import setup, models, create_model, get_config, finalize_model
+    from model_search import make_saved_pipeline
+
+    # Setup pycaret with simplified parameters
+    _report(progress, "setup")
+    exp = setup(
+        data=feature_df,
+        target='Label',
+        verbose=False,
+        fold=3,
+        normalize=True,
+        session_id=123,
+        html=False,
+        preprocess=True
+    )
+
+    # Same candidates as compare_models(), one at a time so progress can be reported
+    candidates = models()
+    candidates = list(candidates[candidates['Turbo']].index)
+    X, y = get_config('X_train'), get_config('y_train')
+    folds = list(get_config('fold_generator').split(X, y))
+    best_model = None
+    best_accuracy = -1.0
+    for index, model_id in enumerate(candidates):
+        try:
+            # Configured as create_model would, fitted on the whole training split
+            model = create_model(model_id, cross_validation=False, verbose=False)
+            scores = []
+            for fold, (train_idx, test_idx) in enumerate(folds):
+                _report(progress, "estimator", estimator=model_id, index=index + 1, total=len(candidates),
+                        fold=fold + 1, folds=len(folds))
+                fold_model = make_saved_pipeline(clone(model)).fit(X.iloc[train_idx], y.iloc[train_idx])
+                scores.append(np.mean(fold_model.predict(X.iloc[test_idx]) == y.iloc[test_idx].to_numpy()))
+        except Exception as e:
+            print(f"Skipping {model_id}: {e}")
+            continue
+        accuracy = float(np.mean(scores))
+        if accuracy > best_accuracy:
+            best_model, best_accuracy = model, accuracy
+
+    if best_model is None:
+        raise Exception("No estimator could be trained!")
+
+    _report(progress, "finalizing", estimator=type(best_model).__name__, accuracy=round(best_accuracy, 4))
+    return finalize_model(best_model)
+
+
+def _fast_search(feature_df, progress, candidates, time_budget, latency_budget_ms):
+    """Cross-validate only the given candidates within the time budget, see model_search.
+    Returns the chosen model fitted on all windows and the search results"""
+    from model_search import make_estimator, make_saved_pipeline, search_models
+
+    _report(progress, "search", candidates=','.join(candidates), time_budget=time_budget,
+            latency_budget_ms=latency_budget_ms)
+    X = feature_df.drop(columns='Label').to_numpy()
+    y = feature_df['Label'].to_numpy()
+    best, results = search_models(X, y, candidates, time_budget=time_budget or 60.0,
+                                  latency_budget_ms=latency_budget_ms,
+                                  progress=lambda stage, **info: _report(progress, stage, **info))
+    for model_id, result in results.items():
+        print(f"  {model_id}: {result}")
+
+    _report(progress, "finalizing", estimator=best, accuracy=round(results[best]["accuracy"], 4),
+            predict_latency_ms=round(results[best]["predict_latency_ms"], 3))
+    # Fitted like a PyCaret model so load_model/predict_model users can read nbest.pkl too
+    final_model = make_saved_pipeline(make_estimator(best)).fit(feature_df.drop(columns='Label'), feature_df['Label'])
+    return final_model, {"best": best, "latency_budget_ms": latency_budget_ms, "results": results}
+
+
+def search_results_path(model_name):
+    """Per-candidate accuracy and latency of the last fast search"""
+    return f'{model_name}_search.json'
+
+
+def model_artifacts(model_name):
+    """Every file that belongs to model_name"""
+    from online_update import online_path
+    return [f'{model_name}.pkl', unmixing_path(model_name), extractor_path(model_name), filters_path(model_name),
+            predictor_path(model_name), search_results_path(model_name), online_path(model_name)]
+
+
+def staging_name(model_name):
+    """A run writes its artifacts under this name, then commit_artifacts moves them in place"""
+    return f'{model_name}.staging'
+
+
+def commit_artifacts(staging, model_name, replace_all=True):
+    """Move the files staged under staging over model_name's, with a cancel held off until
+    they all are, so a model is never left with some of its files from another run. With
+    replace_all the old model's files the run didn't write (a predictor that couldn't be
+    exported, the online state) are removed too."""
+    with uninterruptible():
+        for staged, final in zip(model_artifacts(staging), model_artifacts(model_name)):
+            if os.path.exists(staged):
+                os.replace(staged, final)
+            elif replace_all and os.path.exists(final):
+                os.remove(final)
+
+
+def discard_staged(staging):
+    """Remove what a failed or cancelled run staged, and the folders made for it if nothing
+    else is in them (models/<user>/v<N>)"""
+    for path in model_artifacts(staging):
+        if os.path.exists(path):
+            os.remove(path)
+    folder = os.path.dirname(staging)
+    if folder and os.path.isdir(folder) and not os.listdir(folder):
+        try:
+            os.removedirs(folder)
+        except OSError:
+            pass
+
+
+def session_features(session, unmixing, extractor, filters=None):
+    """Window features of one recording session, labelled"""
+    raw = filters.apply(session.raw) if filters is not None else session.raw
+    signals = emg_signals(raw, unmixing)
+    features = pd.DataFrame(extractor.window_features(signals), columns=extractor.feature_names())
+    features['Label'] = session.label
+    return features
@@ -0,0 +1,176 @@
+"""Run model training in a separate process so the server stays responsive.
+
+Training (PyCaret setup plus one create_model per candidate) takes minutes and holds the
+GIL for most of it, so it runs in its own process rather than a thread. Progress events
+come back over a multiprocessing queue; cancelling terminates the process, except while
+it moves its results into place (uninterruptible), so a model is never half replaced. Inference
+keeps using the model it already loaded until on_finished swaps in the new one.
+
+Targets can be given as 'module:function', so the server doesn't import training
+(pandas, PyCaret) until a job's own process does.
+"""
+import atexit
+import contextlib
+import importlib
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+
+def _resolve(target):
+    if isinstance(target, str):
+        module, _, name = target.partition(':')
+        return getattr(importlib.import_module(module), name)
+    return target
+
+
+def _cancelled(signum, frame):
+    # Unwind rather than die, so the target's finally blocks remove what it half wrote
+    sys.exit(1)
+
+
+@contextlib.contextmanager
+def uninterruptible():
+    """Ignore cancel() inside the block. A job cancelled meanwhile runs to the end and
+    counts as succeeded, its results are in place."""
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+def _run_job(target, events, options):
+    """Entry point of the training process"""
+    signal.signal(signal.SIGTERM, _cancelled)
+
+    def progress(stage, **info):
+        events.put({"stage": stage, "time": time.time(), **info})
+
+    try:
+        target = _resolve(target)
+        success = target(progress=progress, **options)
+    except Exception as e:
+        events.put({"stage": "error", "time": time.time(), "message": str(e)})
+        success = False
+    events.put({"stage": "done", "time": time.time(), "success": bool(success)})
+
+
+class TrainingJob:
+    def __init__(self, job_id, process, events, options=None):
+        self.id = job_id
+        self.process = process
+        self.events = events
+        self.options = options or {}
+        self.state = 'running'
+        self.started = time.time()
+        self.finished = None
+        self.progress = {}
+        self.history = deque(maxlen=100)
+        self.error = None
+
+    def status(self):
+        end = self.finished or time.time()
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "elapsed": round(end - self.started, 1),
+            "progress": self.progress,
+            "events": list(self.history),
+            "error": self.error
+        }
+
+
+class TrainingJobRunner:
+    """Start, track and cancel training jobs, one at a time"""
+
+    def __init__(self, target, on_finished=None):
+        self.target = target
+        self.on_finished = on_finished
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context('spawn')
+        atexit.register(self.shutdown)
+
+    def active_job(self):
+        with self._lock:
+            for job in self.jobs.values():
+                if job.state == 'running':
+                    return job
+        return None
+
+    def submit(self, target=None, **options):
+        """Start a training job and return its id, target defaults to the runner's"""
+        target = target or self.target
+        # Checked and started under the lock, so two requests can't both start a job
+        with self._lock:
+            if any(job.state == 'running' for job in self.jobs.values()):
+                raise RuntimeError("Training already in progress")
+            events = self._context.Queue()
+            # Not a daemon: the fast model search fans out to worker processes of its own,
+            # which daemonic processes can't start. shutdown() still stops it on exit.
+            process = self._context.Process(target=_run_job, args=(target, events, options))
+            job = TrainingJob(uuid.uuid4().hex[:12], process, events, options)
+            process.start()
+            self.jobs[job.id] = job
+        threading.Thread(target=self._monitor, args=(job,), daemon=True).start()
+        return job.id
+
+    def _monitor(self, job):
+        """Collect progress events until the process finishes"""
+        while True:
+            try:
+                event = job.events.get(timeout=0.5)
+            except Exception:
+                if not job.process.is_alive():
+                    break
+                continue
+            if event["stage"] == "done":
+                if event["success"]:
+                    # Also after a cancel that came while the results were moved in place
+                    job.state = 'succeeded'
+                elif job.state == 'running':
+                    job.state = 'failed'
+                break
+            if event["stage"] == "error":
+                job.error = event.get("message")
+            job.history.append(event)
+            job.progress = {**event, "elapsed": round(event["time"] - job.started, 1)}
+
+        job.process.join(timeout=5)
+        if job.state == 'running':
+            job.state = 'failed'
+            job.error = job.error or f"Training process exited with code {job.process.exitcode}"
+        job.finished = time.time()
+        if self.on_finished:
+            self.on_finished(job)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job.state == 'running':
+            job.state = 'cancelled'
+            job.process.terminate()
+        return job.status()
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job.status()
+
+    def shutdown(self):
+        """Terminate any running job, called when the server exits"""
+        job = self.active_job()
+        if job is not None:
+            self.cancel(job.id)
@@ -0,0 +1,125 @@
+"""Fixed ICA unmixing fitted once on the calibration data.
+
+Fitting FastICA on every inference window is slow and gives components whose sign and
+order change from window to window, so they never line up with the IC columns the model
+was trained on. Instead the unmixing matrix and mean are fitted once at training time,
+saved next to the model as <model>_ica.npz and applied as a single matrix multiply.
+
+To fit it for an existing training CSV (writing a copy with IC columns to match, here
+ndata_ica.csv, to retrain on):
+    python unmixing.py ndata.csv nbest
+
+Models trained on per-window ICs and never refitted have no <model>_ica.npz. Scripts that
+still run them load the unmixing with fallback=True, which refits ICA on every window as
+they were trained.
+"""
+import os
+import sys
+
+import numpy as np
+
+RANDOM_STATE = 123
+
+
+class FixedUnmixing:
+    """ICA as a constant affine map: (X - mean) @ components.T"""
+
+    def __init__(self, components, mean):
+        self.components = np.asarray(components, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self._unmix_t = np.ascontiguousarray(self.components.T)
+        self._offset = self.mean @ self._unmix_t
+
+    @classmethod
+    def fit(cls, raw_data, n_components=None):
+        """Fit FastICA on the whole calibration set"""
+        from sklearn.decomposition import FastICA
+
+        raw_data = np.asarray(raw_data, dtype=np.float64)
+        if raw_data.ndim == 1:
+            raw_data = raw_data.reshape(-1, 1)
+        ica = FastICA(n_components=n_components or raw_data.shape[1], random_state=RANDOM_STATE)
+        ica.fit(raw_data)
+
+        # Pin down the sign so refits on similar data give comparable components
+        components = ica.components_.copy()
+        signs = np.sign(components[np.arange(len(components)), np.abs(components).argmax(axis=1)])
+        components *= signs[:, None]
+        return cls(components, ica.mean_)
+
+    def transform(self, raw_data):
+        """Project an (n, channels) window onto the calibration components"""
+        raw_data = np.asarray(raw_data, dtype=np.float64)
+        if raw_data.ndim == 1:
+            raw_data = raw_data.reshape(-1, 1)
+        return raw_data @ self._unmix_t - self._offset
+
+    def save(self, model_name):
+        np.savez(unmixing_path(model_name), components=self.components, mean=self.mean)
+
+
+class WindowICA:
+    """The notebooks' ICA: FastICA fitted on each window on its own, then centred. Slow, and
+    the components change from window to window, but it is what models without a saved
+    unmixing were trained on."""
+
+    def __init__(self, n_components=None):
+        self.n_components = n_components
+
+    def transform(self, raw_data):
+        from sklearn.decomposition import FastICA
+
+        raw_data = np.asarray(raw_data, dtype=np.float64)
+        if raw_data.ndim == 1:
+            raw_data = raw_data.reshape(-1, 1)
+        ics = FastICA(n_components=self.n_components or raw_data.shape[1]).fit_transform(raw_data)
+        return ics - ics.mean(axis=0)
+
+
+def unmixing_path(model_name):
+    """The unmixing file saved alongside <model_name>.pkl"""
+    return f'{model_name}_ica.npz'
+
+
+def load_unmixing(model_name, fallback=False):
+    """The model's fixed unmixing. Without one, fallback=True refits ICA per window
+    (WindowICA) instead of raising FileNotFoundError"""
+    path = unmixing_path(model_name)
+    if not os.path.exists(path):
+        if fallback:
+            print(f"No {path}, refitting ICA on every window as the model was trained")
+            return WindowICA()
+        raise FileNotFoundError(
+            f"No ICA unmixing found at {path}. Retrain the model, or run "
+            f"'python unmixing.py <training csv> {model_name}' to fit one."
+        )
+    with np.load(path) as saved:
+        return FixedUnmixing(saved['components'], saved['mean'])
+
+
+def main():
+    import pandas as pd
+
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    csv_path, model_name = sys.argv[1], sys.argv[2]
+
+    df = pd.read_csv(csv_path)
+    raw_columns = [col for col in df.columns if col.startswith('Raw_EMG')]
+    if raw_columns == ['Raw_EMG']:
+        ic_columns = ['Independent_Component']
+    else:
+        ic_columns = [f'IC{i + 1}' for i in range(len(raw_columns))]
+
+    unmixing = FixedUnmixing.fit(df[raw_columns].to_numpy())
+    unmixing.save(model_name)
+    df[ic_columns] = unmixing.transform(df[raw_columns].to_numpy())
+    # The recording itself stays as it was, the copy is what to retrain on
+    output_path = f'{os.path.splitext(csv_path)[0]}_ica.csv'
+    df.to_csv(output_path, index=False)
+    print(f"Saved {unmixing_path(model_name)} and {output_path} with {ic_columns} to match, retrain the model on it")
+
+
+if __name__ == '__main__':
+    main()
@@ -33,13 +33,16 @@ export const stopRecording = async () => {
   }
 };
 
-export const trainModel = async () => {
+export const trainModel = async (
+  options: { candidates?: string[]; time_budget?: number; latency_budget_ms?: number } = {}
+) => {
   try {
     const response = await fetch(`${API_BASE_URL}/train`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
+      body: JSON.stringify(options),
     });
     return await response.json();
   } catch (error) {
@@ -48,13 +51,39 @@ export const trainModel = async () => {
   }
 };
 
-export const startInference = async () => {
+export const getTrainingStatus = async (jobId: string) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/train/${jobId}`);
+    return await response.json();
+  } catch (error) {
+    console.error('Training status error:', error);
+    return { status: 'error', message: 'Failed to get training status' };
+  }
+};
+
+export const cancelTraining = async (jobId: string) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/train/${jobId}/cancel`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+    });
+    return await response.json();
+  } catch (error) {
+    console.error('Cancel training error:', error);
+    return { status: 'error', message: 'Failed to cancel training' };
+  }
+};
+
+export const startInference = async (options: { window_ms?: number; hop_ms?: number } = {}) => {
   try {
     const response = await fetch(`${API_BASE_URL}/inference/start`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
+      body: JSON.stringify(options),
     });
     return await response.json();
   } catch (error) {
@@ -86,4 +115,27 @@ export const getStatus = async () => {
     console.error('Status error:', error);
     return { status: 'error', message: 'Failed to get status' };
   }
-};
\ No newline at end of file
+};
+export const subscribeStatus = (onStatus: (status: any) => void) => {
+  // Server pushes every status message; the browser reconnects with Last-Event-ID
+  const source = new EventSource(`${API_BASE_URL}/stream`, { withCredentials: true });
+  source.onmessage = (event) => onStatus(JSON.parse(event.data));
+  source.onerror = (error) => console.error('Status stream error:', error);
+  return () => source.close();
+};
+
+export const activateModel = async (user: string, version?: number) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/models/activate`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ user, version }),
+    });
+    return await response.json();
+  } catch (error) {
+    console.error('Activate model error:', error);
+    return { status: 'error', message: 'Failed to activate model' };
+  }
+};
@@ -6,7 +6,7 @@ import { Alert, AlertDescription, AlertTitle } from '@/components/ui/alert';
 import { Activity, AlertCircle, CheckCircle, XCircle, Loader2, Brain, Waves } from 'lucide-react';
 import { Input } from '@/components/ui/input';
 import { Button } from '@/components/ui/button';
-import { startRecording, stopRecording, startInference, stopInference, getStatus, trainModel } from '../api';
+import { startRecording, stopRecording, startInference, stopInference, subscribeStatus, trainModel, getTrainingStatus } from '../api';
 
 // Custom Button component with updated styling
 const MotionButton = ({ 
@@ -56,6 +56,7 @@ export default function Home() {
   const [isInferring, setIsInferring] = useState(false);
   const [calibratedFeatures, setCalibratedFeatures] = useState<Set<string>>(new Set());
   const [isTraining, setIsTraining] = useState(false);
+  const [trainingProgress, setTrainingProgress] = useState<string | null>(null);
   const [modelTrained, setModelTrained] = useState(false);
 
   const isCalibrated = features.length > 0 && calibratedFeatures.size === features.length;
@@ -78,34 +79,28 @@ export default function Home() {
     });
   };
 
-  // Status polling effect
+  // Status stream effect
   useEffect(() => {
-    let intervalId: NodeJS.Timeout;
+    let unsubscribe: (() => void) | undefined;
     
-    const pollStatus = async () => {
-      try {
-        const status = await getStatus();
-        
-        if (status.status === 'error') {
-          setError(status.message);
-          setRecordingStatus('idle');
-          setRecordingFeature(null);
-          setTimeLeft(15);
-        } else if (status.status === 'prediction') {
-          setPrediction(status.prediction);
-        }
-      } catch (err) {
-        console.error('Status polling error:', err);
+    const handleStatus = (status: any) => {
+      if (status.status === 'error') {
+        setError(status.message);
+        setRecordingStatus('idle');
+        setRecordingFeature(null);
+        setTimeLeft(15);
+      } else if (status.status === 'prediction') {
+        setPrediction(status.prediction);
       }
     };
 
     if (isInferring) {
-      intervalId = setInterval(pollStatus, 100);
+      unsubscribe = subscribeStatus(handleStatus);
     }
 
     return () => {
-      if (intervalId) {
-        clearInterval(intervalId);
+      if (unsubscribe) {
+        unsubscribe();
       }
     };
   }, [isInferring]);
@@ -177,16 +172,35 @@ export default function Home() {
       setIsTraining(true);
       setError(null);
       const response = await trainModel();
-      if (response.status === 'success') {
+      if (response.status !== 'success') {
+        setError(response.message);
+        return;
+      }
+
+      // Training runs as a background job on the server, follow it until it finishes
+      let job = response;
+      while (job.status === 'success' && (!job.state || job.state === 'running')) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = await getTrainingStatus(response.job_id);
+        const progress = job.progress || {};
+        if (progress.estimator && progress.total) {
+          setTrainingProgress(`${progress.estimator} (${progress.index}/${progress.total})`);
+        } else if (progress.stage) {
+          setTrainingProgress(progress.stage);
+        }
+      }
+
+      if (job.state === 'succeeded') {
         setModelTrained(true);
       } else {
-        setError(response.message);
+        setError(job.error || job.message || `Training ${job.state}`);
       }
     } catch (err) {
       setError('Failed to train model');
       console.error(err);
     } finally {
       setIsTraining(false);
+      setTrainingProgress(null);
     }
   };
 
@@ -366,7 +380,7 @@ export default function Home() {
                   {isTraining ? (
                     <span className="flex items-center gap-2 justify-center">
                       <Loader2 className="w-4 h-4 animate-spin" />
-                      Training Model...
+                      Training Model{trainingProgress ? `: ${trainingProgress}` : '...'}
                     </span>
                   ) : (
                     'Train Model'